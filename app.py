@@ -1,33 +1,60 @@
 # app.py (Bagian Atas)
 
+import hashlib
+
 import streamlit as st
 import pandas as pd
 import numpy as np
 from datetime import date
-import pydeck as pdk
 
 from config import HORIZONTAL_COLS, NAME_MAP
 from utils import (
     insert_rainfall_data,
-    read_csv_robust,
-    fetch_rainfall_data_from_db,
-    fetch_rainfall_data_timeseries,
-    compute_cdd_cwd_timeseries,
     get_latest_db_record_info,
     month_end_day,
     normalize_station_name,
     load_coords_from_repo,
     prepare_station_coordinates,
-    compute_cdd_cwd,
     join_names,
     to_csv_bytes,
     fmt_station_list,
-    dasarian_windows_to_build,
-    build_outputs,
-    build_dashboard,
     compute_data_completeness_summary,
-    run_quality_control,
+    get_rainfall_cube,
+    get_dasarian_normals,
+    get_neighbor_index,
+    get_station_thresholds,
+    get_idw_weights,
+    get_grid_weights,
+    get_areal_weights,
+    get_admin_index,
+    get_db_engine,
+    get_lookback_digest_token,
+    fetch_rainfall_data_from_db,
+    fetch_rainfall_data_timeseries,
+    get_job_runner,
+)
+from rainfall import build_daily_matrix
+from prefix_index import named_ranges
+from config import ARG_MIN_COMPLETENESS_PCT, OBS_DAY_CUTOFF_HOUR, SPI_SCALES
+from spi import classify_spi
+from qc_rules import QC_RULES, default_enabled_rules
+from ingest import ARCHIVE_SUFFIXES, DailyMatrixSink, ingest_files, stream_ingest
+from subdaily import completeness_summary, stream_subdaily
+from surface import surface_image
+from map_layers import build_station_table, layer_payload
+from hierarchy import ADMIN_LEVEL_LABELS, broadcast_to_stations
+from indices import (
+    PRECIP_INDEX_LABELS,
+    INTENSITY_COLS,
+    compute_precip_indices,
 )
+from pipeline import (
+    compute_cdd_cwd_range,
+    prepare_month_records,
+    run_month,
+    window_products,
+)
+from jobs import job_key
 
 st.set_page_config(
     page_title="SEGARA: Sistem Ekspor dan Generator Analisis Dasarian",
@@ -68,6 +95,7 @@ def goto(page: str):
 st.session_state.setdefault("outputs", None)
 st.session_state.setdefault("meta", None)
 st.session_state.setdefault("derived", None)
+st.session_state.setdefault("run_job", None)
 
 if "coords_final" not in st.session_state:
     st.session_state["coords_final"] = load_coords_from_repo("coords.csv")
@@ -76,6 +104,8 @@ def clear_results():
     st.session_state["outputs"] = None
     st.session_state["meta"] = None
     st.session_state["derived"] = None
+    st.session_state["map_payload_cache"] = {}
+    st.session_state["run_job"] = None
     goto("Input")
 
 def require_results():
@@ -92,7 +122,7 @@ def get_windows():
     d = st.session_state.get("derived", {})
     return d.get("windows", {})
 
-def window_selector_ui():
+def window_selector_ui(allow_custom: bool = False):
     windows = get_windows()
     if not windows:
         return None
@@ -100,6 +130,11 @@ def window_selector_ui():
     order = [k for k in ["das1", "das2", "das3", "monthly"] if k in windows]
     labels = {k: windows[k]["label"] for k in order}
 
+    prefix_idx = st.session_state.get("derived", {}).get("prefix_index")
+    if allow_custom and prefix_idx is not None and prefix_idx.start is not None:
+        order.append("custom")
+        labels["custom"] = "Rentang kustom"
+
     default_key = st.session_state.get("view_window", order[0])
     if default_key not in order:
         default_key = order[0]
@@ -114,15 +149,144 @@ def window_selector_ui():
     )
 
     st.session_state["view_window"] = sel
+    if sel == "custom":
+        custom_range_ui(prefix_idx)
     return sel
 
+def custom_range_ui(prefix_idx):
+    """Pilih rentang bebas (pentad/mingguan/musim/kustom) yang dijawab dari indeks prefix-sum."""
+    lo, hi = prefix_idx.start.date(), prefix_idx.end.date()
+    eval_end = min(pd.Timestamp(st.session_state.get("meta", {}).get("eval_date", hi)).date(), hi)
+    presets = named_ranges(eval_end)
+
+    cP, cR = st.columns([1, 2])
+    with cP:
+        preset = st.selectbox("Preset rentang", options=list(presets.keys()) + ["manual"], key="__custom_preset__")
+    if preset != "manual":
+        d0, d1 = presets[preset]
+        default_rng = (max(d0.date(), lo), d1.date())
+    else:
+        default_rng = st.session_state.get("custom_range", (max(lo, eval_end - pd.Timedelta(days=4)), eval_end))
+
+    with cR:
+        rng = st.date_input(
+            "Rentang tanggal",
+            value=default_rng,
+            min_value=lo,
+            max_value=hi,
+            disabled=(preset != "manual"),
+            key=f"__custom_range_{preset}__"
+        )
+
+    if isinstance(rng, (list, tuple)) and len(rng) == 2:
+        st.session_state["custom_range"] = (rng[0], rng[1])
+
+def build_custom_bundle(prefix_idx, d0, d1):
+    """Bundle window ad-hoc: total/valid/mean/hitungan threshold langsung dari prefix-sum."""
+    station_dash = prefix_idx.station_summary(d0, d1)
+    daily = prefix_idx.daily_values(d0, d1)
+    station_dash["max_mm"] = daily.max(axis=0, skipna=True).values
+    station_dash["tgl_max"] = [
+        daily[c].idxmax().strftime("%Y-%m-%d") if daily[c].notna().any() else pd.NA for c in daily.columns
+    ]
+    wet_pct = st.session_state.get("derived", {}).get("wet_pct") or {}
+    precip_idx = compute_precip_indices(
+        daily.to_numpy(dtype=float), p95=wet_pct.get(95), p99=wet_pct.get(99), stations=daily.columns
+    )
+    station_dash = station_dash.merge(precip_idx, on="station", how="left")
+    station_dash = station_dash.sort_values(["total_mm", "station"], ascending=[False, True]).reset_index(drop=True)
+
+    n_days = max(len(daily.index), 1)
+    qc_station = pd.DataFrame({
+        "station": prefix_idx.stations,
+        "completeness_pct": (prefix_idx.valid_days(d0, d1) / n_days * 100).round(1),
+    })
+    day_dash = pd.DataFrame({
+        "TGL": daily.index,
+        "total_mm_all_stations": daily.sum(axis=1, skipna=True).values,
+        "mean_mm_across_stations": daily.mean(axis=1, skipna=True).values,
+        "stations_valid": daily.notna().sum(axis=1).values,
+    })
+
+    # CDD/CWD current & CH max dihitung dari rentang kustom itu sendiri (bukan tabel bulanan)
+    rainy_thr = prefix_idx.thresholds.get("rainy", (st.session_state.get("meta") or {}).get("rainy_thr", 1.0))
+    label = f"Kustom ({pd.Timestamp(d0):%d %b %Y} – {pd.Timestamp(d1):%d %b %Y})"
+    return {
+        "key": "custom",
+        "label": label,
+        "start_day": int(pd.Timestamp(d0).day),
+        "end_day": int(pd.Timestamp(d1).day),
+        "outputs": {"qc_station": qc_station},
+        "station_dash": station_dash,
+        "day_dash": day_dash,
+        "hi": {},
+        "cdd_cwd_df": compute_cdd_cwd_range(daily, wet_threshold=rainy_thr),
+    }
+
 def get_active_bundle():
     windows = get_windows()
     key = st.session_state.get("view_window")
+    if key == "custom":
+        prefix_idx = st.session_state.get("derived", {}).get("prefix_index")
+        rng = st.session_state.get("custom_range")
+        if prefix_idx is None or not rng:
+            return None
+        return build_custom_bundle(prefix_idx, rng[0], rng[1])
     if not windows or key not in windows:
         return None
     return windows[key]
 
+def show_ingest_report(report: pd.DataFrame):
+    """Ringkasan ingest multi-file: peringatan untuk file gagal, tabel status & waktu per file."""
+    if report is None or report.empty:
+        return
+    bad = report[report["status"] != "ok"]
+    if not bad.empty:
+        st.warning(f"{len(bad)} dari {len(report)} file gagal dibaca: {join_names(bad['file'])}")
+    with st.expander(f"Laporan ingest ({len(report)} file, {int(report['rows'].sum())} baris)", expanded=not bad.empty):
+        st.dataframe(report, use_container_width=True)
+
+def apply_run_result(result: dict, das_n: int):
+    """Hasil pipeline.run_month -> session state (meta, window turunan, output window aktif)."""
+    windows_out = result["windows"]
+    st.session_state["meta"] = result["meta"]
+    st.session_state["derived"] = {
+        "windows": windows_out, "prefix_index": result["prefix_index"], "wet_pct": result["wet_pct"]
+    }
+    st.session_state["run_id"] = int(st.session_state.get("run_id") or 0) + 1
+    st.session_state["map_payload_cache"] = {}
+    st.session_state["view_window"] = f"das{das_n}"
+    st.session_state["outputs"] = windows_out[f"das{das_n}"]["outputs"]
+
+@st.fragment(run_every=1.0)
+def run_job_panel():
+    """Progres job Run latar belakang; hanya fragmen ini yang di-poll, halaman lain tetap responsif."""
+    info = st.session_state.get("run_job")
+    job = get_job_runner().get(info["id"]) if info else None
+    if job is None:
+        st.session_state["run_job"] = None
+        st.warning("Job Run tidak ditemukan lagi (server dimulai ulang atau hasil kedaluwarsa). Silakan Run ulang.")
+        return
+
+    snap = job.snapshot()
+    if snap["status"] == "done":
+        apply_run_result(job.result, info["das_n"])
+        st.session_state["run_job"] = None
+        goto("Hasil")
+        st.rerun()
+    if snap["status"] == "error":
+        st.session_state["run_error"] = snap["error"]
+        st.session_state["run_job"] = None
+        goto("Input")
+        st.rerun()
+
+    st.progress(snap["progress"], text=f"{snap['label']}: {snap['stage']} ({snap['elapsed']:.0f} s)")
+    with st.expander("Tahap job", expanded=False):
+        st.dataframe(
+            pd.DataFrame(snap["stages"], columns=["detik", "tahap"]).round({"detik": 1}),
+            use_container_width=True, hide_index=True,
+        )
+
 # ============================================================
 # Top navigation bar
 # ============================================================
@@ -152,6 +316,10 @@ with nav_cols[6]:
 with nav_cols[7]:
     st.write(f"**Halaman aktif:** {st.session_state.get('page', 'Input')}")
 
+# Job Run yang sedang berjalan ditampilkan di semua halaman; navigasi tidak membatalkannya
+if st.session_state.get("run_job"):
+    run_job_panel()
+
 st.divider()
 
 # ============================================================
@@ -193,23 +361,94 @@ if st.session_state["page"] == "Input":
         default_das_idx = 0
 
     up_rain = None
+    up_arg = None
+    stream_mode = False
+    delta_mode = False
+    stream_daily = None
     if data_source == "Upload File CSV Vertikal":
         up_rain = st.file_uploader(
             "Upload CSV vertikal (curah hujan)",
-            type=["csv"],
+            type=["csv", "gz", "zip"],
             accept_multiple_files=True,
             key="uploader_rain"
         )
+        stream_mode = st.checkbox(
+            "Mode streaming (file sangat besar / arsip .gz .zip)",
+            value=False,
+            help="File dibaca per chunk sehingga memori tetap terbatas; otomatis aktif untuk arsip .gz/.zip."
+        )
+        stream_mode = stream_mode or any(f.name.lower().endswith(ARCHIVE_SUFFIXES) for f in (up_rain or []))
+        up_arg = st.file_uploader(
+            "Upload data ARG sub-harian (opsional; kolom RAINFALL MM per interval)",
+            type=["csv", "gz", "zip"],
+            accept_multiple_files=True,
+            key="uploader_arg",
+            help=f"Diagregasi ke hari pengamatan BMKG (batas {OBS_DAY_CUTOFF_HOUR:02d}:00) untuk Run; tidak ikut Push."
+        )
+        delta_mode = st.checkbox(
+            "Push delta (kirim hanya pos-hari baru/berubah; koreksi memperbarui DB dan tercatat di audit)",
+            value=True,
+            disabled=stream_mode,
+            help="Hash isi per (pos, hari) bulan yang tersentuh diambil dari DB lalu dibandingkan dengan upload."
+        ) and not stream_mode
         
         # Fitur Push/Insert ke Supabase jika file diupload
         if up_rain and st.button("💾 Push / Save Uploaded CSV to Supabase DB", type="secondary"):
+            # Modul tulis database (SQLAlchemy/COPY) hanya dimuat saat Push
+            from db import RainfallCopySink
+            from delta import delta_upload
+            from digests import months_between, refresh_db_digests
+
             with st.spinner("Memproses dan menyimpan data ke Supabase PostgreSQL..."):
                 try:
-                    # Gabungkan file jika multi upload
-                    dfs_to_push = [read_csv_robust(f) for f in up_rain]
-                    df_push = pd.concat(dfs_to_push, ignore_index=True)
-                    rows_added = insert_rainfall_data(df_push)
+                    if stream_mode:
+                        # Streaming: setiap chunk langsung di-COPY ke staging, lalu dipindahkan sekali
+                        sink = RainfallCopySink(get_db_engine())
+                        try:
+                            with st.status("Streaming upload ke database...", expanded=False) as status:
+                                ingest_report = stream_ingest(
+                                    up_rain, [sink],
+                                    on_progress=lambda f, n: status.update(label=f"{f}: {n:,} baris di-stage")
+                                )
+                                rows_added = sink.close()
+                                status.update(label=f"Selesai: {int(ingest_report['rows'].sum()):,} baris dibaca", state="complete")
+                        except Exception:
+                            sink.abort()
+                            raise
+                        show_ingest_report(ingest_report)
+                    else:
+                        # Gabungkan file jika multi upload (parse + validasi paralel)
+                        df_push, ingest_report = ingest_files(up_rain)
+                        show_ingest_report(ingest_report)
+                        if df_push is None:
+                            raise ValueError("tidak ada file valid")
+                        if delta_mode:
+                            delta = delta_upload(get_db_engine(), df_push, source=join_names([f.name for f in up_rain]))
+                            rows_added = delta["inserted"]
+                            d1, d2, d3 = st.columns(3)
+                            d1.metric("Baris baru", delta["inserted"])
+                            d2.metric("Baris diperbarui", delta["updated"])
+                            d3.metric("Tidak berubah (tidak dikirim)", delta["unchanged"])
+                            if not delta["skipped_duplicates"].empty:
+                                st.warning(
+                                    f"{len(delta['skipped_duplicates'])} pos-hari tidak diperbarui karena di database sudah "
+                                    "tercatat lebih dari satu baris (lihat QC duplikat):"
+                                )
+                                st.dataframe(delta["skipped_duplicates"], use_container_width=True, height=200)
+                            if not delta["changes"].empty:
+                                st.caption("Perubahan nilai (tercatat di tabel rainfall_audit):")
+                                st.dataframe(delta["changes"], use_container_width=True, height=280)
+                        else:
+                            rows_added = insert_rainfall_data(df_push)
                     st.success(f"Berhasil menambahkan {rows_added} baris data baru ke database Supabase!")
+                    # Pelihara digest (stasiun, bulan) untuk bulan-bulan yang tersentuh upload
+                    try:
+                        refresh_db_digests(
+                            get_db_engine(),
+                            months_between(ingest_report["start"].min(), ingest_report["end"].max())
+                        )
+                    except Exception as e:
+                        st.warning(f"Digest bulan tidak diperbarui: {e}")
                 except Exception as e:
                     st.error(f"Gagal melakukan simpan ke database: {e}")
 
@@ -235,6 +474,31 @@ if st.session_state["page"] == "Input":
     with t2:
         heavy_thr = st.number_input("Batas hujan lebat (mm)", min_value=0.0, value=20.0, step=1.0)
 
+    g1, g2 = st.columns(2)
+    with g1:
+        fill_gaps = st.checkbox(
+            "Isi data kosong dengan IDW tetangga",
+            value=False,
+            help="Sel kosong diisi rata-rata berbobot jarak (dan beda elevasi) pos tetangga; ditandai '*' pada tabel BMKG."
+        )
+    with g2:
+        use_filled = st.checkbox(
+            "Pakai nilai terisi untuk ringkasan & indeks",
+            value=False,
+            disabled=not fill_gaps
+        )
+
+    qc_enabled = st.multiselect(
+        "Aturan QC aktif",
+        options=list(QC_RULES.keys()),
+        default=default_enabled_rules(),
+        format_func=lambda c: f"{c} — {QC_RULES[c].label} ({QC_RULES[c].severity})"
+    )
+    qc_incremental = st.checkbox(
+        "QC inkremental (evaluasi ulang hanya pos-hari yang berubah sejak Run sebelumnya)",
+        value=True
+    )
+
     b1, b2, b3 = st.columns([1, 1, 2])
     with b1:
         run = st.button("Run", type="primary", use_container_width=True)
@@ -254,172 +518,131 @@ if st.session_state["page"] == "Input":
         MONTH_INT = int(MM)
         MONTH_STR = f"{YEAR}-{MM}"
         das_n = int(dasarian)
+        from_db = data_source == "Database Supabase (Online)"
+        st.session_state.pop("run_error", None)
 
         # ------------------------------------------------------------
-        # 1. Pengambilan Data dari Supabase (Online) atau CSV Upload
+        # 1. Sumber Data: query Supabase di job latar belakang, atau parse CSV Upload di sini
         # ------------------------------------------------------------
-        # app.py (di dalam blok if run:)
-
-        if data_source == "Database Supabase (Online)":
-            with st.spinner("Mengambil data timeseries 365 hari ke belakang dari Supabase..."):
-                try:
-                    # Tarik data dengan lookback 365 hari
-                    df_ts = fetch_rainfall_data_timeseries(YEAR, MONTH_INT, lookback_days=365)
-                    df = fetch_rainfall_data_from_db(YEAR, MONTH_INT)
-                except Exception as e:
-                    st.error(f"Gagal mengambil data dari Supabase: {e}")
-                    st.stop()
-                
-                if df.empty:
-                    st.error(f"Tidak ada data tersimpan di Supabase untuk periode {MONTH_STR}.")
-                    st.stop()
+        run_params = dict(
+            year=YEAR, month=MONTH_INT, das_n=das_n, rainy_thr=float(rainy_thr), heavy_thr=float(heavy_thr),
+            qc_enabled=sorted(qc_enabled), fill_gaps=bool(fill_gaps), use_filled=bool(use_filled),
+            qc_incremental=bool(qc_incremental),
+        )
+        if from_db:
+            # Token digest (stasiun, bulan) seluruh bulan lookback 365 hari: laporan baru, koreksi delta,
+            # atau backfill di bulan mana pun yang dibaca Run membuat kunci job (dan kunci cache query) baru
+            month_token = get_lookback_digest_token(YEAR, MONTH_INT, lookback_days=365)
+            data_id = {"source": "db", "digest": month_token}
         else:
-            if not up_rain:
+            if not up_rain and not up_arg:
                 st.error("Upload file CSV vertikal curah hujan terlebih dahulu.")
                 st.stop()
 
-            def read_csv_robust(uploaded_file) -> pd.DataFrame:
-                attempts = [
-                    (",", "utf-8"), (";", "utf-8"), ("\t", "utf-8"),
-                    (",", "utf-8-sig"), (";", "utf-8-sig"), (",", "latin1")
-                ]
-                last_err = None
-                for sep, enc in attempts:
-                    try:
-                        uploaded_file.seek(0)
-                        df_try = pd.read_csv(uploaded_file, sep=sep, encoding=enc, engine="python")
-                        if df_try.shape[1] >= 2:
-                            return df_try
-                    except Exception as e:
-                        last_err = e
-                raise last_err if last_err else RuntimeError("Unknown read_csv failure")
-
-            dfs, bad_files = [], []
-            for f in up_rain:
-                try:
-                    tmp = read_csv_robust(f)
-                    tmp["__source_file__"] = f.name
-                    dfs.append(tmp)
-                except Exception as e:
-                    bad_files.append(f.name)
-
-            if not dfs:
+            # ARG sub-harian: diagregasi per chunk ke hari pengamatan 07:00, lalu diperlakukan
+            # seperti record harian upload (record manual menang bila pos-hari yang sama ada di keduanya)
+            arg_daily = None
+            if up_arg:
+                with st.status("Agregasi data ARG sub-harian ke hari pengamatan...", expanded=False) as status:
+                    arg_daily, arg_report = stream_subdaily(
+                        up_arg, on_progress=lambda f, n: status.update(label=f"{f}: {n:,} observasi dibaca")
+                    )
+                    status.update(label=f"Selesai: {int(arg_report['rows'].sum()):,} observasi ARG", state="complete")
+                show_ingest_report(arg_report)
+                if arg_daily is not None:
+                    with st.expander("Kelengkapan data ARG per pos", expanded=False):
+                        st.caption(
+                            f"Hari dengan kelengkapan interval < {ARG_MIN_COMPLETENESS_PCT:g}% tidak diberi nilai harian."
+                        )
+                        st.dataframe(completeness_summary(arg_daily), use_container_width=True, height=260)
+
+            df = None
+            if up_rain and stream_mode:
+                # Streaming: matriks harian dilipat per chunk, hanya record bulan target disimpan utuh
+                sink = DailyMatrixSink(YEAR, MONTH_INT)
+                with st.status("Membaca upload per chunk...", expanded=False) as status:
+                    ingest_report = stream_ingest(
+                        up_rain, [sink],
+                        on_progress=lambda f, n: status.update(label=f"{f}: {n:,} baris dibaca")
+                    )
+                    if arg_daily is not None:
+                        sink.write(arg_daily)
+                    df, stream_daily = sink.close()
+                    status.update(label=f"Selesai: {int(ingest_report['rows'].sum()):,} baris dibaca", state="complete")
+                show_ingest_report(ingest_report)
+            elif up_rain:
+                # Parse, normalisasi, dan validasi tiap file paralel; error per file dilaporkan
+                df, ingest_report = ingest_files(up_rain)
+                show_ingest_report(ingest_report)
+            if arg_daily is not None and stream_daily is None:
+                df = arg_daily if df is None else pd.concat([df, arg_daily], ignore_index=True)
+
+            if df is None:
                 st.error("Tidak ada file curah hujan valid untuk diproses.")
                 st.stop()
 
-            df = pd.concat(dfs, ignore_index=True)
-            df_ts = df.copy()
-
-        # ------------------------------------------------------------
-        # 2. Validasi & Sanitasi Data Bulan Target
-        # ------------------------------------------------------------
-        required_cols = ["NAME", "DATA TIMESTAMP", "RAINFALL DAY MM"]
-        missing_cols = [c for c in required_cols if c not in df.columns]
-        if missing_cols:
-            st.error(f"Kolom wajib tidak ditemukan: {missing_cols}")
-            st.stop()
-    
-        ts_clean = (
-            df["DATA TIMESTAMP"]
-            .astype(str)
-            .str.replace(r'(\+\d{2}(:\d{2})?|Z)$', '', regex=True)
-            .str.strip()
-        )
-        df["DATA TIMESTAMP"] = pd.to_datetime(ts_clean, format="mixed", errors="coerce")
-        df = df[df["DATA TIMESTAMP"].notna()].copy()
-    
-        df_month = df[df["DATA TIMESTAMP"].dt.strftime("%Y-%m") == MONTH_STR].copy()
-        if df_month.empty:
-            st.error(f"Tidak ada baris untuk {MONTH_STR}. Periksa pilihan bulan atau data.")
-            st.stop()
-    
-        df_month["TGL"] = df_month["DATA TIMESTAMP"].dt.day
-        last_day = month_end_day(YEAR, MONTH_INT)
-        df_month_full = df_month[df_month["TGL"].between(1, last_day)].copy()
+            # Validasi bulan target langsung agar kesalahan pilihan bulan terlihat tanpa menunggu job
+            try:
+                df_month_full, _ = prepare_month_records(df, YEAR, MONTH_INT)
+            except ValueError as e:
+                st.error(str(e))
+                st.stop()
+            data_id = {
+                "source": "upload",
+                "stream": bool(stream_mode),
+                "files": sorted(
+                    (f.name, hashlib.md5(f.getvalue()).hexdigest()) for f in list(up_rain or []) + list(up_arg or [])
+                ),
+            }
 
-        # Deteksi tanggal data TERAKHIR yang ada di database untuk bulan ini
-        latest_db_day = int(df_month_full["TGL"].max())
+        resources = {
+            "coords": st.session_state["coords_final"],
+            "cube": get_rainfall_cube(),
+            "normals": get_dasarian_normals(),
+            "neighbor_index": get_neighbor_index(),
+            "idw_weights": get_idw_weights() if fill_gaps else None,
+            "areal_weights": get_areal_weights(),
+            "station_thresholds": get_station_thresholds(),
+            "admin_index": get_admin_index(),
+        }
 
         # ------------------------------------------------------------
-        # 3. Kalkulasi Window Dasarian & Continuous Index Lintas Bulan
+        # 2-3. Validasi + Seluruh Window (pipeline.run_month) sebagai job latar belakang
         # ------------------------------------------------------------
-        windows_def = dasarian_windows_to_build(YEAR, MONTH_INT, das_n)
-        windows_out = {}
-    
-        for key, (win_start, win_end) in windows_def.items():
-            out = build_outputs(
-                df_month_full,
-                month_start=1,
-                month_end=last_day,
-                win_start=win_start,
-                win_end=win_end
-            )
-    
-            wide_num_full = out["wide_num_out"].copy()
-            wide_num_win = wide_num_full[wide_num_full["TGL"].between(int(win_start), int(win_end))].copy()
-    
-            dash, daydash, hi = build_dashboard(wide_num_win, rainy_thr, heavy_thr)
-            
-            # Hitung CDD/CWD Lintas Bulan secara Real Continuous Timeseries
-            if data_source == "Database Supabase (Online)":
-                if key == "monthly":
-                    eval_day = min(latest_db_day, last_day)
-                else:
-                    eval_day = min(int(win_end), latest_db_day)
-                    
-                eval_dt = pd.Timestamp(year=YEAR, month=MONTH_INT, day=eval_day)
-                
-                cdd = compute_cdd_cwd_timeseries(
-                    df_ts, 
-                    target_year=YEAR, 
-                    target_month=MONTH_INT, 
-                    wet_threshold=rainy_thr, 
-                    eval_until_date=eval_dt
-                )
+        def run_job(update):
+            if from_db:
+                update("Mengambil data timeseries 365 hari ke belakang dari Supabase", 0.02)
+                # Query lewat wrapper st.cache_data (kunci = token digest): Run ulang setelah TTL job
+                # habis tetap memakai cache selama tidak ada laporan baru
+                df_ts = fetch_rainfall_data_timeseries(YEAR, MONTH_INT, lookback_days=365, digest_token=month_token)
+                df_db = fetch_rainfall_data_from_db(YEAR, MONTH_INT, digest_token=month_token)
+                if df_db.empty:
+                    raise ValueError(f"Tidak ada data tersimpan di Supabase untuk periode {MONTH_STR}.")
+                month_full, _ = prepare_month_records(df_db, YEAR, MONTH_INT)
+                update("Matriks harian timeseries", 0.10)
+                matrix = build_daily_matrix(df_ts)
             else:
-                cdd = compute_cdd_cwd(wide_num_full, wet_threshold=rainy_thr, dynamic_last_day=latest_db_day)
-    
-            label = {
-                "das1": "Das 1 (TGL 1–10)",
-                "das2": "Das 2 (TGL 11–20)",
-                "das3": f"Das 3 (TGL 21–{last_day})",
-                "monthly": f"Bulanan (TGL 1–{last_day})",
-            }[key]
-    
-            windows_out[key] = {
-                "key": key,
-                "label": label,
-                "start_day": int(win_start),
-                "end_day": int(win_end),
-                "outputs": out,
-                "station_dash": dash,
-                "day_dash": daydash,
-                "hi": hi,
-                "cdd_cwd_df": cdd,
-            }
-    
-        # ------------------------------------------------------------
-        # 4. Update Session State & Transisi Halaman
-        # ------------------------------------------------------------
-        st.session_state["meta"] = {
-            "MONTH_STR": MONTH_STR,
-            "YEAR": YEAR,
-            "MM": MM,
-            "last_day": int(last_day),
-            "latest_db_day": int(latest_db_day),
-            "das_n": int(das_n),
-            "rainy_thr": float(rainy_thr),
-            "heavy_thr": float(heavy_thr),
-        }
-    
-        st.session_state["derived"] = {"windows": windows_out}
-        st.session_state["view_window"] = f"das{das_n}"
-        st.session_state["outputs"] = windows_out[f"das{das_n}"]["outputs"]
-    
-        st.success("Selesai diproses. Membuka halaman Hasil.")
-        goto("Hasil")
+                df_ts, month_full = None, df_month_full
+                update("Matriks harian timeseries", 0.10)
+                matrix = stream_daily if stream_daily is not None else build_daily_matrix(df)
+            return run_month(
+                month_full, matrix, YEAR, MONTH_INT, das_n, resources,
+                rainy_thr=rainy_thr, heavy_thr=heavy_thr, qc_enabled=qc_enabled,
+                fill_gaps=fill_gaps, use_filled=use_filled, qc_incremental=qc_incremental,
+                cdd_timeseries=df_ts, on_stage=update,
+            )
+
+        job, created = get_job_runner().submit(
+            job_key(**run_params, **data_id), run_job, label=f"Run {MONTH_STR} (das {das_n})"
+        )
+        st.session_state["run_job"] = {"id": job.id, "das_n": das_n}
+        if not created:
+            st.toast("Run identik sedang/baru saja diproses (mungkin oleh pengguna lain); hasil job tersebut dipakai.")
         st.rerun()
 
+    if st.session_state.get("run_error"):
+        st.error(f"Run gagal: {st.session_state['run_error']}")
+
 # ============================================================
 # PAGE: Hasil
 # ============================================================
@@ -427,7 +650,7 @@ elif st.session_state["page"] == "Hasil":
     require_results()
 
     meta = st.session_state.get("meta", {}) or {}
-    window_selector_ui()
+    window_selector_ui(allow_custom=True)
     bundle = get_active_bundle()
     if bundle is None:
         st.info("Window belum tersedia. Silakan Run ulang.")
@@ -628,6 +851,96 @@ elif st.session_state["page"] == "Hasil":
         if not station_dash.empty:
             st.dataframe(station_dash[["station", "total_mm", "valid_days"]].head(15), use_container_width=True, height=380)
 
+    # ------------------------------------------------------------
+    # 7. Anomali terhadap Normal Klimatologi
+    # ------------------------------------------------------------
+    if "pct_of_normal" in station_dash.columns:
+        st.markdown("---")
+        st.subheader(f"📉 Anomali terhadap Normal ({win_label})")
+        st.caption("Sifat hujan BMKG: Bawah Normal < 85%, Normal 85–115%, Atas Normal > 115% dari rata-rata normal.")
+        norm_cols = ["station", "total_mm", "normal_mean_mm", "normal_median_mm", "anomaly_mm",
+                     "pct_of_normal", "tercile", "sifat_hujan"]
+        st.dataframe(
+            station_dash[[c for c in norm_cols if c in station_dash.columns]].sort_values("pct_of_normal"),
+            use_container_width=True,
+            height=380
+        )
+
+    # ------------------------------------------------------------
+    # 8. SPI (Standardized Precipitation Index) Bulan Target
+    # ------------------------------------------------------------
+    spi_cols = [f"SPI_{s}" for s in SPI_SCALES if f"SPI_{s}" in station_dash.columns]
+    if spi_cols:
+        st.markdown("---")
+        st.subheader(f"🏜️ SPI {MONTH_STR} (skala {', '.join(str(s) for s in SPI_SCALES)} bulan)")
+        spi_view = station_dash[["station"] + spi_cols].copy()
+        if spi_view[spi_cols].notna().any().any():
+            for c in spi_cols:
+                spi_view[f"{c}_kategori"] = spi_view[c].apply(classify_spi)
+            st.dataframe(spi_view.sort_values(spi_cols[0]), use_container_width=True, height=380)
+        else:
+            st.caption("SPI belum tersedia: riwayat data kurang dari 10 tahun (bangun cube historis dengan `python cube.py build`) atau bulan target belum lengkap.")
+
+    # ------------------------------------------------------------
+    # 9. Curah Hujan Wilayah (Thiessen) per Kabupaten/Kota
+    # ------------------------------------------------------------
+    areal_summary = (bundle.get("outputs", {}) or {}).get("areal_summary")
+    if isinstance(areal_summary, pd.DataFrame) and not areal_summary.empty:
+        st.markdown("---")
+        st.subheader(f"🗺️ Curah Hujan Wilayah Kabupaten/Kota - Thiessen ({win_label})")
+        st.caption(
+            "Rata-rata berbobot luas poligon Thiessen stasiun di dalam batas wilayah. Stasiun tanpa data "
+            "dikeluarkan dan bobot sisanya dinormalisasi ulang; hari dengan cakupan luas < 50% dikosongkan."
+        )
+        aL, aR = st.columns([0.9, 1.1])
+        with aL:
+            st.dataframe(areal_summary.sort_values("total_mm", ascending=False), use_container_width=True, height=380)
+        with aR:
+            areal_daily = bundle["outputs"].get("areal_daily")
+            if isinstance(areal_daily, pd.DataFrame) and not areal_daily.empty:
+                st.line_chart(areal_daily.set_index("TGL"))
+
+    # ------------------------------------------------------------
+    # 10. Rekap Wilayah Administrasi (dari kode POS HUJAN ID)
+    # ------------------------------------------------------------
+    admin_rollup = bundle.get("admin_rollup") or {}
+    if admin_rollup:
+        st.markdown("---")
+        st.subheader(f"🏛️ Rekap Wilayah Administrasi ({win_label})")
+        admin_level = st.radio(
+            "Level wilayah", options=list(admin_rollup), horizontal=True,
+            format_func=lambda k: ADMIN_LEVEL_LABELS.get(k, k), key="admin_level_hasil"
+        )
+        st.caption(
+            f"total_mm_rata2: rata-rata akumulasi pos yang melapor; mean_mm_per_hari: rata-rata seluruh pos-hari valid; "
+            f"n_hari_lebat: pos-hari ≥ {heavy_thr:g} mm; n_hari_ekstrem: pos-hari > 150 mm. Memakai nilai terukur (tanpa isian IDW)."
+        )
+        st.dataframe(
+            admin_rollup[admin_level].sort_values("total_mm_rata2", ascending=False),
+            use_container_width=True, height=380
+        )
+
+    # ------------------------------------------------------------
+    # 11. Indeks Presipitasi ETCCDI & Kelas Intensitas BMKG
+    # ------------------------------------------------------------
+    idx_cols = [c for c in list(PRECIP_INDEX_LABELS) + INTENSITY_COLS if c in station_dash.columns]
+    if idx_cols:
+        st.markdown("---")
+        st.subheader(f"🌧️ Indeks Presipitasi ETCCDI & Kelas Intensitas BMKG ({win_label})")
+        st.caption(
+            "R95p/R99p: jumlah curah hujan hari basah di atas persentil 95/99 hari basah stasiun "
+            "(dihitung dari seluruh timeseries yang diambil). Kelas intensitas BMKG: ringan 0.5–20, "
+            "sedang 20–50, lebat 50–100, sangat lebat 100–150, ekstrem >150 mm/hari."
+        )
+        n_recomputed = (bundle.get("outputs", {}) or {}).get("indices_recomputed")
+        if n_recomputed is not None:
+            st.caption(f"Dihitung ulang saat Run: {n_recomputed} stasiun (sisanya dari cache digest stasiun-bulan).")
+        st.dataframe(
+            station_dash[["station"] + idx_cols].sort_values(["Rx1day", "station"], ascending=[False, True]),
+            use_container_width=True,
+            height=420
+        )
+
 # ============================================================
 # PAGE: QC
 # ============================================================
@@ -664,10 +977,11 @@ elif st.session_state["page"] == "QC":
         
         # Hitung spesifik temuan Data Kosong vs Ekstrim
         missing_count = len(qc_df[qc_df["FLAG"] == "MISSING_DATA"]) if "FLAG" in qc_df.columns else 0
-        extreme_count = len(qc_df[qc_df["FLAG"] == "EXTREME_VALUE"]) if "FLAG" in qc_df.columns else 0
+        extreme_count = len(qc_df[qc_df["FLAG"].isin(["EXTREME_VALUE", "EXTREME_STATION"])]) if "FLAG" in qc_df.columns else 0
+        spatial_count = len(qc_df[qc_df["FLAG"] == "SPATIAL_OUTLIER"]) if "FLAG" in qc_df.columns else 0
 
         # Dashboard Card Ringkasan Temuan Anomali
-        k1, k2, k3 = st.columns(3)
+        k1, k2, k3, k4 = st.columns(4)
         k1.metric("Total Temuan QC", f"{total_anomali} Catatan")
         k2.metric(
             "Data Kosong / Missing (9999)", 
@@ -676,11 +990,17 @@ elif st.session_state["page"] == "QC":
             delta_color="inverse"
         )
         k3.metric(
-            "Nilai Ekstrim (>200mm)", 
+            "Nilai Ekstrim (>200mm / historis)", 
             f"{extreme_count} Pos-Hari", 
             delta="Verifikasi Manual" if extreme_count > 0 else "Normal", 
             delta_color="off"
         )
+        k4.metric(
+            "Outlier Spasial (Buddy Check)",
+            f"{spatial_count} Pos-Hari",
+            delta="Bandingkan Tetangga" if spatial_count > 0 else "Konsisten",
+            delta_color="off"
+        )
 
         st.markdown("---")
 
@@ -710,6 +1030,17 @@ elif st.session_state["page"] == "QC":
     else:
         st.success("🎉 Tidak ditemukan data anomali atau nilai ekstrim (Data Passed Anomaly Checks).")
 
+    # Rincian eksekusi aturan QC (registry): status, jumlah flag, dan waktu per aturan
+    rule_stats = outputs.get("qc_rule_stats")
+    if isinstance(rule_stats, pd.DataFrame) and not rule_stats.empty:
+        with st.expander("⏱️ Rincian Aturan QC (waktu & jumlah flag per aturan)"):
+            total_ms = float(rule_stats["Waktu (ms)"].sum())
+            st.caption(f"Total waktu QC: {total_ms:.1f} ms untuk {int((rule_stats['Status'] == 'ok').sum())} aturan aktif.")
+            if "Mode" in rule_stats.columns:
+                reused = int((rule_stats["Mode"] == "dipakai ulang").sum())
+                st.caption(f"QC inkremental: {reused} aturan memakai ulang flag tersimpan (tidak ada pos-hari terdampak yang berubah).")
+            st.dataframe(rule_stats, use_container_width=True)
+
     st.markdown("---")
 
     # ------------------------------------------------------------
@@ -815,10 +1146,17 @@ elif st.session_state["page"] == "Tabel":
         key="table_view_choice"
     )
 
+    if "filled_count" in outputs:
+        st.caption(
+            f"{outputs['filled_count']} pos-hari kosong diisi IDW tetangga (ditandai '*' pada format BMKG). "
+            + ("Nilai terisi ikut dipakai pada ringkasan & indeks." if meta.get("use_filled") else "Nilai terisi tidak dipakai pada ringkasan & indeks.")
+        )
+
     if view_choice.startswith("FORMAT BMKG"):
         st.dataframe(wide_bmkg_out, use_container_width=True, height=720)
     else:
-        st.dataframe(wide_num_out, use_container_width=True, height=720)
+        wide_num_filled = outputs.get("wide_num_filled")
+        st.dataframe(wide_num_filled if wide_num_filled is not None else wide_num_out, use_container_width=True, height=720)
 
 # ============================================================
 # PAGE: Grafik
@@ -897,57 +1235,61 @@ elif st.session_state["page"] == "Grafik":
 # PAGE: Peta
 # ============================================================
 elif st.session_state["page"] == "Peta":
+    import pydeck as pdk   # hanya dimuat bila halaman Peta dibuka
+
     st.subheader("Peta interaktif stasiun (hover untuk tooltip)")
 
     coords_final = st.session_state["coords_final"].copy()
 
     if st.session_state.get("outputs") is not None:
-        window_selector_ui()
+        window_selector_ui(allow_custom=True)
         bundle = get_active_bundle()
     else:
         bundle = None
 
     if bundle is not None:
-        outputs = bundle.get("outputs", {})
-        station_dash = bundle.get("station_dash", pd.DataFrame())
-        cdd_cwd_df = bundle.get("cdd_cwd_df", pd.DataFrame())
-
-        qc_station = outputs.get("qc_station", pd.DataFrame())
-        if isinstance(qc_station, pd.DataFrame) and (not qc_station.empty) and ("station" in qc_station.columns):
-            qc_station = qc_station[["station", "completeness_pct"]].copy() if "completeness_pct" in qc_station.columns else qc_station[["station"]].copy()
-        else:
-            qc_station = pd.DataFrame(columns=["station", "completeness_pct"])
-
-        if not (isinstance(station_dash, pd.DataFrame) and (not station_dash.empty)):
-            station_dash = pd.DataFrame(columns=["station", "total_mm", "max_mm", "tgl_max"])
-        else:
-            keep_sd = [c for c in ["station", "total_mm", "max_mm", "tgl_max"] if c in station_dash.columns]
-            station_dash = station_dash[keep_sd].copy()
-
-        if not (isinstance(cdd_cwd_df, pd.DataFrame) and (not cdd_cwd_df.empty)):
-            cdd_cwd_df = pd.DataFrame(columns=[
-                "station", "CDD_len", "CWD_len", "CDD_cur_len", "CWD_cur_len", "CH_max_mm", "CH_max_TGL"
-            ])
-        else:
-            keep_idx = [c for c in [
-                "station", "CDD_len", "CWD_len", "CDD_cur_len", "CWD_cur_len", "CH_max_mm", "CH_max_TGL"
-            ] if c in cdd_cwd_df.columns]
-            cdd_cwd_df = cdd_cwd_df[keep_idx].copy()
-
-        map_df = (
-            coords_final.merge(qc_station, on="station", how="left")
-                       .merge(station_dash, on="station", how="left")
-                       .merge(cdd_cwd_df, on="station", how="left")
-        )
+        # Tabel atribut stasiun window dibangun sekali saat Run; window kustom dibangun saat dipilih
+        map_df = bundle.get("map_table")
+        if map_df is None:
+            map_df = build_station_table(
+                coords_final,
+                qc_station=bundle.get("outputs", {}).get("qc_station"),
+                station_dash=bundle.get("station_dash"),
+                cdd_cwd_df=bundle.get("cdd_cwd_df"),
+            )
 
         win_label = str(bundle.get("label", "Window"))
         start_day = int(bundle.get("start_day", 1))
         end_day = int(bundle.get("end_day", start_day))
-        st.caption(f"Peta digabung dengan hasil: **{win_label}** (TGL {start_day}–{end_day}).")
+        if bundle.get("key") == "custom":
+            st.caption(f"Peta digabung dengan hasil: **{win_label}**.")
+        else:
+            st.caption(f"Peta digabung dengan hasil: **{win_label}** (TGL {start_day}–{end_day}).")
     else:
         map_df = coords_final.copy()
         st.info("Hasil curah hujan belum diproses. Peta hanya menampilkan koordinat dan QC koordinat.")
 
+    # Agregasi wilayah: nilai rekap kabupaten/kecamatan disalin ke setiap stasiun anggota
+    admin_rollup = (bundle.get("admin_rollup") or {}) if bundle is not None else {}
+    agg_level = st.radio(
+        "Agregasi", options=["stasiun"] + list(admin_rollup), horizontal=True,
+        format_func=lambda k: "Per stasiun" if k == "stasiun" else ADMIN_LEVEL_LABELS.get(k, k),
+        key="map_agg_level"
+    )
+    if agg_level != "stasiun":
+        admin_index = get_admin_index()
+        rollup = admin_rollup[agg_level]
+        agg = broadcast_to_stations(
+            rollup.rename(columns={"total_mm_rata2": "total_mm", "max_mm": "CH_max_mm"}).drop(columns="stasiun"),
+            admin_index, agg_level, ["total_mm", "CH_max_mm", "completeness_pct"],
+        ).set_index("station").reindex(map_df["station"].astype(str))
+        map_df = map_df.copy()
+        for c in agg.columns:
+            map_df[c] = agg[c].to_numpy()
+        st.caption(
+            "Akumulasi, CH maksimum, dan kelengkapan memakai nilai rekap wilayah; layer lain tetap per stasiun."
+        )
+
     c1, c2, c3, c4 = st.columns([1, 1, 1.1, 1.2])
     with c1:
         hide_missing = st.checkbox("Sembunyikan stasiun tanpa koordinat", value=True, key="map_hide_missing")
@@ -956,17 +1298,21 @@ elif st.session_state["page"] == "Peta":
     with c3:
         point_size = st.slider("Ukuran titik", min_value=3, max_value=18, value=9, step=1, key="map_point_size")
     with c4:
-        mode = st.radio("Mode peta", options=["Titik (Scatter)", "Heatmap (nilai layer)"], index=0, horizontal=True, key="map_mode")
-
-    plot_df = map_df.copy()
-    if hide_missing:
-        plot_df = plot_df[plot_df["lat"].notna() & plot_df["lon"].notna()].copy()
-    if show_only_bad:
-        plot_df = plot_df[plot_df["qc_flag"].isin(["MISSING_COORD", "OUT_OF_BOUNDS", "DUP_LATLON"])].copy()
+        mode = st.radio(
+            "Mode peta",
+            options=["Titik (Scatter)", "Heatmap (nilai layer)", "Permukaan IDW (grid)"],
+            index=0, horizontal=True, key="map_mode"
+        )
 
-    if plot_df.empty:
-        st.warning("Tidak ada titik yang bisa ditampilkan (cek filter atau data koordinat).")
-        st.stop()
+    index_layers = {f"Indeks {label}": (col, label) for col, label in PRECIP_INDEX_LABELS.items()}
+    index_layers.update({
+        f"Hari hujan {c[2:].replace('_', ' ')} ({c})": (c, f"Hari {c[2:].replace('_', ' ')}") for c in INTENSITY_COLS
+    })
+    index_layers.update({f"SPI {s} bulan (SPI_{s})": (f"SPI_{s}", f"SPI-{s}") for s in SPI_SCALES})
+    index_layers.update({
+        "Persen terhadap normal (pct_of_normal)": ("pct_of_normal", "% normal"),
+        "Anomali terhadap normal (anomaly_mm)": ("anomaly_mm", "Anomali (mm)"),
+    })
 
     layer = st.selectbox(
         "Warna atau bobot berdasarkan",
@@ -975,7 +1321,7 @@ elif st.session_state["page"] == "Peta":
             "Akumulasi window (total_mm)", "CDD terpanjang (CDD_len)",
             "CWD terpanjang (CWD_len)", "CDD terkini (CDD_cur_len)",
             "CWD terkini (CWD_cur_len)", "CH maksimum (CH_max_mm)"
-        ],
+        ] + list(index_layers.keys()),
         key="map_layer"
     )
 
@@ -985,27 +1331,6 @@ elif st.session_state["page"] == "Peta":
     with right:
         st.markdown("### Legend")
 
-    def clamp01(x: float) -> float:
-        return max(0.0, min(1.0, x))
-
-    def value_to_rgb(v, vmin, vmax):
-        if pd.isna(v) or pd.isna(vmin) or pd.isna(vmax) or vmax == vmin:
-            return [160, 160, 160, 180]
-        t = clamp01((float(v) - float(vmin)) / (float(vmax) - float(vmin)))
-        r = int(60 + 180 * t)
-        g = int(80 + 60 * (1 - t))
-        b = int(220 - 180 * t)
-        return [r, g, b, 190]
-
-    def qc_to_rgb(flag: str):
-        m = {
-            "OK": [30, 160, 60, 190],
-            "MISSING_COORD": [180, 180, 180, 160],
-            "OUT_OF_BOUNDS": [255, 140, 0, 190],
-            "DUP_LATLON": [220, 60, 60, 190],
-        }
-        return m.get(str(flag), [140, 140, 140, 170])
-
     def render_qc_legend(container):
         items = [
             ("OK", (30, 160, 60)),
@@ -1064,13 +1389,28 @@ background: linear-gradient(90deg, rgb(60,80,220), rgb(240,80,40));">
         metric_col, metric_label = "CDD_cur_len", "CDD current (hari)"
     elif layer == "CWD terkini (CWD_cur_len)":
         metric_col, metric_label = "CWD_cur_len", "CWD current (hari)"
+    elif layer in index_layers:
+        metric_col, metric_label = index_layers[layer]
+
+    # Payload layer (filter + warna vektor) di-memo per (Run, window, metrik, mode, filter)
+    payload_cache = st.session_state.setdefault("map_payload_cache", {})
+    window_id = bundle.get("key") if bundle is not None else None
+    if window_id == "custom":
+        window_id = ("custom",) + tuple(str(d) for d in st.session_state.get("custom_range", ()))
+    payload_key = (st.session_state.get("run_id"), window_id, agg_level, metric_col, mode, hide_missing, show_only_bad)
+    if payload_key not in payload_cache:
+        payload_cache[payload_key] = layer_payload(
+            map_df, metric_col,
+            hide_missing=hide_missing,
+            show_only_bad=show_only_bad,
+            numeric_only=mode.startswith("Heatmap")
+        )
+    payload = payload_cache[payload_key]
+    plot_df, vmin, vmax = payload["plot_df"], payload["vmin"], payload["vmax"]
 
-    if metric_col == "qc_flag":
-        plot_df["__color__"] = plot_df["qc_flag"].apply(qc_to_rgb)
-    else:
-        plot_df[metric_col] = pd.to_numeric(plot_df.get(metric_col), errors="coerce")
-        vmin, vmax = plot_df[metric_col].min(skipna=True), plot_df[metric_col].max(skipna=True)
-        plot_df["__color__"] = plot_df[metric_col].apply(lambda v: value_to_rgb(v, vmin, vmax))
+    if plot_df.empty:
+        st.warning("Tidak ada titik yang bisa ditampilkan (cek filter atau data koordinat).")
+        st.stop()
 
     if metric_col == "qc_flag":
         render_qc_legend(right)
@@ -1083,6 +1423,8 @@ background: linear-gradient(90deg, rgb(60,80,220), rgb(240,80,40));">
         "Lat/Lon: {lat}, {lon}<br/>"
         "QC: {qc_flag}<br/>"
     )
+    if agg_level != "stasiun":
+        tooltip_html += "Wilayah: {wilayah}<br/>"
     if metric_col is not None:
         tooltip_html += f"{metric_label}: " + "{" + metric_col + "}<br/>"
 
@@ -1106,14 +1448,43 @@ background: linear-gradient(90deg, rgb(60,80,220), rgb(240,80,40));">
                 auto_highlight=True,
             )
         )
+    elif mode.startswith("Permukaan"):
+        if metric_col == "qc_flag":
+            with left:
+                st.warning("Permukaan IDW hanya untuk layer numerik. Gunakan mode Titik untuk QC kategori.")
+        else:
+            # Bobot grid di-cache per set koordinat: ganti metrik/window = gather berbobot + lookup colormap
+            grid = get_grid_weights()
+            station_vals = (
+                pd.to_numeric(map_df.drop_duplicates("station").set_index("station")[metric_col], errors="coerce")
+                .reindex(grid["stations"]).to_numpy(dtype=float)
+            ) if metric_col in map_df.columns else np.full(len(grid["stations"]), np.nan)
+            with left:
+                surf_opacity = st.slider("Opasitas permukaan", 0.2, 1.0, 0.75, 0.05, key="surf_opacity")
+            layers.append(
+                pdk.Layer(
+                    "BitmapLayer",
+                    image=surface_image(station_vals, grid, vmin=vmin, vmax=vmax),
+                    bounds=list(grid["bounds"]),
+                    opacity=surf_opacity,
+                )
+            )
+            layers.append(
+                pdk.Layer(
+                    "ScatterplotLayer",
+                    data=plot_df,
+                    get_position=["lon", "lat"],
+                    get_fill_color=[40, 40, 40, 200],
+                    get_radius=max(point_size // 2, 2) * 120,
+                    pickable=True,
+                )
+            )
     else:
         if metric_col == "qc_flag":
             with left:
                 st.warning("Heatmap hanya untuk layer numerik. Gunakan mode Titik untuk QC kategori.")
         else:
-            hm_df = plot_df.copy()
-            hm_df[metric_col] = pd.to_numeric(hm_df[metric_col], errors="coerce")
-            hm_df = hm_df[np.isfinite(hm_df[metric_col])].copy()
+            hm_df = plot_df
 
             if hm_df.empty:
                 with left:
@@ -1164,27 +1535,10 @@ elif st.session_state["page"] == "Download":
     end_day = int(bundle.get("end_day", start_day))
 
     outputs = bundle.get("outputs", {}) or {}
-    station_dash = bundle.get("station_dash", pd.DataFrame())
-    day_dash = bundle.get("day_dash", pd.DataFrame())
-    cdd_cwd_df = bundle.get("cdd_cwd_df", pd.DataFrame())
-
-    wide_bmkg_out = outputs.get("wide_bmkg_out")
-    wide_num_out = outputs.get("wide_num_out")
-    if wide_bmkg_out is None or wide_num_out is None:
+    if outputs.get("wide_bmkg_out") is None or outputs.get("wide_num_out") is None:
         st.warning("Output utama tidak ditemukan pada window ini. Silakan Run ulang di halaman Input.")
         st.stop()
 
-    qc_station = outputs.get("qc_station", pd.DataFrame())
-    qc_day = outputs.get("qc_day", pd.DataFrame())
-    qc_gap = outputs.get("qc_gap", pd.DataFrame())
-    qc_empty_last_day = outputs.get("qc_empty_last_day", pd.DataFrame())
-
-    qc_duplicates = outputs.get("qc_duplicates", pd.DataFrame())
-    qc_unknown_names = outputs.get("qc_unknown_names", pd.DataFrame())
-    qc_mapped_not_in_header = outputs.get("qc_mapped_not_in_header", pd.DataFrame())
-
-    qc_unmapped = outputs.get("qc_unmapped", qc_mapped_not_in_header)
-
     coords_final = st.session_state.get("coords_final")
     coords_final = coords_final.copy() if isinstance(coords_final, pd.DataFrame) else pd.DataFrame()
 
@@ -1193,50 +1547,19 @@ elif st.session_state["page"] == "Download":
 
     st.caption(f"Window aktif: **{win_label}** (TGL {start_day}–{end_day}) | Periode: **{MONTH_STR}**")
 
-    fname_bmkg = f"rain_horizontal_{MONTH_STR}_{view_key}_format_bmkg.csv"
-    fname_num = f"rain_horizontal_{MONTH_STR}_{view_key}_numeric.csv"
-
-    fname_qc_station = f"QC_station_completeness_{MONTH_STR}_{view_key}.csv"
-    fname_qc_day = f"QC_day_completeness_{MONTH_STR}_{view_key}.csv"
-    fname_qc_unmapped = f"QC_unmapped_names_{MONTH_STR}_{view_key}.csv"
-    fname_qc_gap = f"QC_station_empty_gap_{MONTH_STR}_{view_key}.csv"
-    fname_qc_empty_last = f"QC_empty_last_day_{MONTH_STR}_{view_key}.csv"
-
-    fname_qc_duplicates = f"QC_duplicates_station_day_{MONTH_STR}_{view_key}.csv"
-    fname_qc_unknown = f"QC_unknown_raw_names_{MONTH_STR}_{view_key}.csv"
-
-    summary_station_name = f"SUMMARY_station_rain_{MONTH_STR}_{view_key}.csv"
-    summary_day_name = f"SUMMARY_day_rain_{MONTH_STR}_{view_key}.csv"
-    summary_cdd_cwd_name = f"SUMMARY_CDD_CWD_CHmax_{MONTH_STR}_{view_key}.csv"
-
-    coords_name = "STATION_COORDS_MAPPED.csv"
-
-    download_choice = st.selectbox(
-        "Pilih file yang ingin di-download",
-        [
-            fname_bmkg, fname_num, "— QC —", fname_qc_station,
-            fname_qc_day, fname_qc_unmapped, fname_qc_gap, fname_qc_empty_last,
-            fname_qc_duplicates, fname_qc_unknown, "— Ringkasan —",
-            summary_station_name, summary_day_name, summary_cdd_cwd_name,
-            "— Referensi —", coords_name,
-        ],
-        index=0
-    )
+    # Nama file & isi per grup dari inti (sama dengan ekspor CLI)
+    product_groups = window_products(bundle, MONTH_STR, view_key, coords_final)
+    download_map = {fname: df for group in product_groups.values() for fname, df in group.items()}
+    options = []
+    for i, (group, files) in enumerate(product_groups.items()):
+        options += ([] if i == 0 else [f"— {group} —"]) + list(files)
+
+    download_choice = st.selectbox("Pilih file yang ingin di-download", options, index=0)
 
     if str(download_choice).startswith("—"):
         st.info("Pilih item file (bukan header pemisah).")
         st.stop()
 
-    download_map = {
-        fname_bmkg: wide_bmkg_out, fname_num: wide_num_out,
-        fname_qc_station: qc_station, fname_qc_day: qc_day,
-        fname_qc_unmapped: qc_unmapped, fname_qc_gap: qc_gap,
-        fname_qc_empty_last: qc_empty_last_day, fname_qc_duplicates: qc_duplicates,
-        fname_qc_unknown: qc_unknown_names, summary_station_name: station_dash,
-        summary_day_name: day_dash, summary_cdd_cwd_name: cdd_cwd_df,
-        coords_name: coords_final,
-    }
-
     df_dl = download_map.get(download_choice)
     if df_dl is None:
         st.error("Pilihan file tidak dikenali. Silakan pilih ulang.")
@@ -0,0 +1,288 @@
+# areal.py
+#
+# Curah hujan wilayah (areal) per kabupaten/kota dengan bobot Thiessen. Poligon Voronoi tiap
+# stasiun dirasterisasi di grid halus atas NTB (sel -> stasiun terdekat), lalu diklip dengan
+# poligon batas wilayah dari file GeoJSON lokal (scanline even-odd, tanpa shapely). Hasilnya
+# matriks sparse W [stasiun, wilayah] = fraksi luas wilayah yang diwakili stasiun, dihitung
+# sekali per (koordinat, file batas) dan disimpan di cache. Rata-rata wilayah seluruh hari
+# cukup satu perkalian matriks; stasiun kosong ditangani dengan normalisasi ulang bobot:
+#
+#   areal[h, r] = sum_i v[h, i] * ada[h, i] * W[i, r] / sum_i ada[h, i] * W[i, r]
+#
+#   python areal.py build --boundary batas_kabupaten.geojson
+#   python areal.py show
+
+import argparse
+import hashlib
+import json
+import os
+
+import numpy as np
+import pandas as pd
+from scipy import sparse
+
+from config import CACHE_DIR, REGION_BOUNDARY_PATH
+from qc_spatial import EARTH_RADIUS_KM
+from surface import NTB_BOUNDS
+
+DEFAULT_AREAL_PATH = os.path.join(CACHE_DIR, "areal", "thiessen_weights.npz")
+
+AREAL_RES_DEG = 0.005            # ~550 m; resolusi raster Voronoi + klip batas
+MIN_AREA_COVERAGE = 0.5          # fraksi luas wilayah yang harus terwakili stasiun berdata
+REGION_NAME_FIELDS = ("WADMKK", "NAMOBJ", "KABKOT", "kabupaten", "name", "NAME")
+KM_PER_DEG = np.pi * EARTH_RADIUS_KM / 180.0
+
+
+# ============================================================
+# Batas wilayah (GeoJSON)
+# ============================================================
+
+def _region_name(props: dict, name_field: str = None) -> str:
+    if name_field:
+        return str(props.get(name_field, "")).strip()
+    for f in REGION_NAME_FIELDS:
+        if props.get(f):
+            return str(props[f]).strip()
+    return ""
+
+
+def load_regions(path: str = REGION_BOUNDARY_PATH, name_field: str = None) -> dict:
+    """
+    Membaca GeoJSON (Polygon / MultiPolygon, lon-lat) menjadi {nama wilayah: array tepi [m, 4]}
+    (x0, y0, x1, y1). Seluruh ring (termasuk lubang) digabung; fitur dengan nama sama disatukan.
+    """
+    with open(path, "r", encoding="utf-8") as f:
+        gj = json.load(f)
+    features = gj["features"] if gj.get("type") == "FeatureCollection" else [gj]
+
+    edges = {}
+    for i, feat in enumerate(features):
+        geom = feat.get("geometry") or {}
+        if geom.get("type") == "Polygon":
+            polys = [geom["coordinates"]]
+        elif geom.get("type") == "MultiPolygon":
+            polys = geom["coordinates"]
+        else:
+            continue
+        name = _region_name(feat.get("properties") or {}, name_field) or f"wilayah_{i + 1}"
+        for rings in polys:
+            for ring in rings:
+                r = np.asarray(ring, dtype=np.float64)[:, :2]
+                if len(r) < 3:
+                    continue
+                e = np.hstack([r, np.roll(r, -1, axis=0)])
+                edges.setdefault(name, []).append(e)
+    return {name: np.vstack(parts) for name, parts in edges.items()}
+
+
+def rasterize_region(edges: np.ndarray, lons: np.ndarray, lats: np.ndarray) -> np.ndarray:
+    """Mask [ny, nx] pusat sel di dalam poligon (aturan even-odd per baris grid)."""
+    x0, y0, x1, y1 = edges.T
+    mask = np.zeros((len(lats), len(lons)), dtype=bool)
+    row_in = (lats >= min(y0.min(), y1.min())) & (lats <= max(y0.max(), y1.max()))
+    for r in np.nonzero(row_in)[0]:
+        y = lats[r]
+        cross = (y0 <= y) != (y1 <= y)
+        if not cross.any():
+            continue
+        xs = np.sort(x0[cross] + (y - y0[cross]) * (x1[cross] - x0[cross]) / (y1[cross] - y0[cross]))
+        mask[r] = (np.searchsorted(xs, lons) % 2) == 1
+    return mask
+
+
+# ============================================================
+# Bobot Thiessen
+# ============================================================
+
+def _nearest_station(coords: pd.DataFrame, lons: np.ndarray, lats: np.ndarray) -> np.ndarray:
+    """Indeks stasiun terdekat (haversine) untuk setiap sel [ny, nx]; -1 bila tidak ada koordinat."""
+    st_lat = np.radians(pd.to_numeric(coords["lat"], errors="coerce").to_numpy(dtype=np.float64))
+    st_lon = np.radians(pd.to_numeric(coords["lon"], errors="coerce").to_numpy(dtype=np.float64))
+    valid = np.nonzero(np.isfinite(st_lat) & np.isfinite(st_lon))[0]
+    out = np.full((len(lats), len(lons)), -1, dtype=np.int32)
+    if valid.size == 0:
+        return out
+    s_lat, s_lon = st_lat[valid], st_lon[valid]
+    g_lon = np.radians(lons)[:, None]
+    for r, lat in enumerate(np.radians(lats)):
+        a = np.sin((lat - s_lat) / 2) ** 2 + np.cos(lat) * np.cos(s_lat) * np.sin((g_lon - s_lon) / 2) ** 2
+        out[r] = valid[np.argmin(a, axis=1)]
+    return out
+
+
+class ArealWeights:
+    """Matriks sparse W [stasiun, wilayah] (fraksi luas) + luas wilayah (km2) + tanda tangan input."""
+
+    def __init__(self, stations, regions, W, area_km2, signature: str = ""):
+        self.stations = [str(s) for s in stations]
+        self.regions = [str(r) for r in regions]
+        self.W = sparse.csr_matrix(W)
+        self.area_km2 = np.asarray(area_km2, dtype=np.float64)
+        self.signature = signature
+
+    @classmethod
+    def build(cls, coords: pd.DataFrame, regions: dict, bounds=NTB_BOUNDS, res_deg: float = AREAL_RES_DEG,
+              signature: str = ""):
+        lon0, lat0, lon1, lat1 = bounds
+        lons = np.arange(lon0 + res_deg / 2, lon1, res_deg)
+        lats = np.arange(lat1 - res_deg / 2, lat0, -res_deg)
+        nearest = _nearest_station(coords, lons, lats)
+        cell_km2 = (res_deg * KM_PER_DEG) ** 2 * np.cos(np.radians(lats))[:, None] * np.ones((1, len(lons)))
+
+        names = list(regions)
+        rows, cols, vals = [], [], []
+        area = np.zeros(len(names))
+        for j, name in enumerate(names):
+            inside = rasterize_region(regions[name], lons, lats) & (nearest >= 0)
+            area[j] = cell_km2[inside].sum()
+            st_idx = nearest[inside]
+            rows.append(st_idx)
+            cols.append(np.full(st_idx.size, j))
+            vals.append(cell_km2[inside])
+
+        n_st = len(coords)
+        A = sparse.coo_matrix(
+            (np.concatenate(vals) if vals else [], (np.concatenate(rows) if rows else [], np.concatenate(cols) if cols else [])),
+            shape=(n_st, len(names)),
+        ).tocsr()                                           # duplikat (sel per stasiun) dijumlah
+        with np.errstate(invalid="ignore", divide="ignore"):
+            inv = np.where(area > 0, 1.0 / area, 0.0)
+        return cls(coords["station"].astype(str).tolist(), names, A @ sparse.diags(inv), area, signature)
+
+    # --------------------------------------------------------
+    # Rata-rata wilayah
+    # --------------------------------------------------------
+
+    def areal_mean(self, values: np.ndarray, min_coverage: float = MIN_AREA_COVERAGE) -> tuple:
+        """
+        values [hari, stasiun] (urutan self.stations) -> (areal [hari, wilayah], coverage [hari, wilayah]).
+        Bobot stasiun kosong dinormalisasi ulang; NaN bila coverage < min_coverage.
+        """
+        v = np.asarray(values, dtype=np.float64)
+        have = np.isfinite(v)
+        num = np.asarray(self.W.T @ np.where(have, v, 0.0).T).T
+        cov = np.asarray(self.W.T @ have.astype(np.float64).T).T
+        with np.errstate(invalid="ignore", divide="ignore"):
+            areal = np.where((cov > 0) & (cov >= min_coverage), num / cov, np.nan)
+        return areal, cov
+
+    def window_table(self, wide_num_win: pd.DataFrame, min_coverage: float = MIN_AREA_COVERAGE) -> tuple:
+        """
+        Wide window (kolom TGL + stasiun) -> (harian [TGL x wilayah], ringkasan per wilayah):
+        total/rata-rata/maks curah hujan wilayah, hari valid, dan coverage rata-rata.
+        """
+        values = wide_num_win.reindex(columns=self.stations).to_numpy(dtype=np.float64)
+        areal, cov = self.areal_mean(values, min_coverage)
+        daily = pd.DataFrame(np.round(areal, 1), columns=self.regions)
+        daily.insert(0, "TGL", wide_num_win["TGL"].astype(int).to_numpy())
+
+        valid = np.isfinite(areal)
+        n_valid = valid.sum(axis=0)
+        with np.errstate(invalid="ignore"):
+            summary = pd.DataFrame({
+                "wilayah": self.regions,
+                "luas_km2": np.round(self.area_km2, 1),
+                "n_stasiun": np.diff(self.W.tocsc().indptr),
+                "total_mm": np.round(np.where(n_valid > 0, np.nansum(areal, axis=0), np.nan), 1),
+                "mean_mm_per_hari": np.round(np.where(n_valid > 0, np.nansum(areal, axis=0) / np.maximum(n_valid, 1), np.nan), 1),
+                "max_mm": np.round(np.where(n_valid > 0, np.nanmax(np.where(valid, areal, -np.inf), axis=0), np.nan), 1),
+                "valid_days": n_valid,
+                "coverage_pct": np.round(100.0 * cov.mean(axis=0), 1) if len(cov) else np.nan,
+            })
+        return daily, summary
+
+    def summary(self) -> pd.DataFrame:
+        """Bobot Thiessen (persen luas) per pasangan stasiun-wilayah yang tidak nol."""
+        coo = self.W.tocoo()
+        return pd.DataFrame({
+            "wilayah": np.asarray(self.regions)[coo.col],
+            "station": np.asarray(self.stations)[coo.row],
+            "bobot_pct": np.round(100.0 * coo.data, 2),
+        }).sort_values(["wilayah", "bobot_pct"], ascending=[True, False]).reset_index(drop=True)
+
+    # --------------------------------------------------------
+    # Persistensi
+    # --------------------------------------------------------
+
+    def save(self, path: str = DEFAULT_AREAL_PATH):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        coo = self.W.tocoo()
+        tmp = path + ".tmp.npz"
+        np.savez_compressed(
+            tmp,
+            stations=np.array(self.stations),
+            regions=np.array(self.regions),
+            row=coo.row.astype(np.int32),
+            col=coo.col.astype(np.int32),
+            data=coo.data,
+            area_km2=self.area_km2,
+            signature=np.array(self.signature),
+        )
+        os.replace(tmp, path)
+
+    @classmethod
+    def load(cls, path: str = DEFAULT_AREAL_PATH):
+        if not os.path.exists(path):
+            return None
+        with np.load(path, allow_pickle=False) as z:
+            stations = [str(s) for s in z["stations"]]
+            regions = [str(r) for r in z["regions"]]
+            W = sparse.coo_matrix((z["data"], (z["row"], z["col"])), shape=(len(stations), len(regions)))
+            return cls(stations, regions, W, z["area_km2"].copy(), str(z["signature"]))
+
+
+def input_signature(coords: pd.DataFrame, boundary_path: str) -> str:
+    """Hash koordinat stasiun + isi file batas; bobot dibangun ulang bila salah satunya berubah."""
+    h = hashlib.sha1()
+    h.update(pd.util.hash_pandas_object(coords[["station", "lat", "lon"]], index=False).to_numpy().tobytes())
+    with open(boundary_path, "rb") as f:
+        h.update(f.read())
+    return h.hexdigest()
+
+
+def load_or_build_areal_weights(coords: pd.DataFrame, boundary_path: str = REGION_BOUNDARY_PATH,
+                                path: str = DEFAULT_AREAL_PATH):
+    """Bobot dari cache bila tanda tangan cocok, selain itu dibangun dan disimpan; None bila file batas tidak ada."""
+    if not boundary_path or not os.path.exists(boundary_path):
+        return None
+    sig = input_signature(coords, boundary_path)
+    cached = ArealWeights.load(path)
+    if cached is not None and cached.signature == sig:
+        return cached
+    weights = ArealWeights.build(coords, load_regions(boundary_path), signature=sig)
+    weights.save(path)
+    return weights
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Bobot Thiessen stasiun -> wilayah (kabupaten/kota).")
+    sub = parser.add_subparsers(dest="cmd", required=True)
+    p_build = sub.add_parser("build", help="Bangun ulang bobot dari coords.csv + file batas GeoJSON")
+    p_build.add_argument("--boundary", default=REGION_BOUNDARY_PATH)
+    p_build.add_argument("--coords", default="coords.csv")
+    p_build.add_argument("--out", default=DEFAULT_AREAL_PATH)
+    p_show = sub.add_parser("show", help="Tampilkan bobot per wilayah")
+    p_show.add_argument("--path", default=DEFAULT_AREAL_PATH)
+    args = parser.parse_args(argv)
+
+    if args.cmd == "show":
+        weights = ArealWeights.load(args.path)
+        if weights is None:
+            print(f"Belum ada bobot di {args.path}")
+            return 1
+        print(weights.summary().to_string(index=False))
+        return 0
+
+    if not os.path.exists(args.boundary):
+        print(f"File batas wilayah tidak ditemukan: {args.boundary}")
+        return 1
+    from rainfall import prepare_station_coordinates
+    coords = prepare_station_coordinates(pd.read_csv(args.coords))
+    weights = ArealWeights.build(coords, load_regions(args.boundary), signature=input_signature(coords, args.boundary))
+    weights.save(args.out)
+    print(f"{len(weights.regions)} wilayah, {weights.W.nnz} pasangan stasiun-wilayah; disimpan ke {args.out}")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,256 @@
+# backfill.py
+#
+# Backfill historis rainfall_data dari arsip CSV (pohon direktori, .csv / .gz / .zip) tanpa Streamlit.
+#
+#   python backfill.py run arsip/2015 arsip/2016 --workers 4 --batch-rows 1000000
+#   python backfill.py status
+#
+# File di-parse paralel dengan process pool (reader + normalisasi yang sama dengan jalur upload:
+# ingest.iter_upload_chunks, timestamp tanpa sufiks zona waktu, nilai numerik) dan nama pos
+# dipetakan ke nama header lewat NAME_MAP. Hasil dikumpulkan per file utuh menjadi batch besar
+# yang dimuat dengan COPY ke staging + INSERT ... ON CONFLICT DO NOTHING (db.RainfallCopySink),
+# satu transaksi per batch. Setelah batch commit, digest (stasiun, bulan) di rainfall_digest untuk
+# bulan-bulan yang tersentuh batch dihitung ulang (digests.refresh_db_digests, sama dengan jalur
+# Push) agar token cache Run berubah, lalu setiap file di dalam batch dicatat di checkpoint
+# (path + ukuran + mtime) sehingga backfill yang terputus dilanjutkan dari file berikutnya;
+# file yang berubah sejak dicatat diproses ulang. Batch yang gagal di tengah aman diulang
+# karena insert bersifat idempoten.
+
+import argparse
+import json
+import os
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+
+import pandas as pd
+
+from config import CACHE_DIR
+from db import RainfallCopySink, create_engine_from_url
+from digests import refresh_db_digests
+from ingest import ARCHIVE_SUFFIXES, iter_upload_chunks
+from rainfall import map_station_name
+
+DEFAULT_CHECKPOINT = os.path.join(CACHE_DIR, "backfill", "checkpoint.json")
+BACKFILL_SUFFIXES = (".csv",) + ARCHIVE_SUFFIXES
+DEFAULT_BATCH_ROWS = 1_000_000
+
+
+# ============================================================
+# Penemuan file & checkpoint
+# ============================================================
+
+def discover_files(paths) -> list:
+    """Semua file .csv/.gz/.zip di bawah path (file atau direktori, rekursif), terurut."""
+    found = []
+    for p in paths:
+        if os.path.isfile(p):
+            found.append(os.path.abspath(p))
+            continue
+        for root, _, names in os.walk(p):
+            found.extend(
+                os.path.abspath(os.path.join(root, n)) for n in names if n.lower().endswith(BACKFILL_SUFFIXES)
+            )
+    return sorted(set(found))
+
+
+def file_fingerprint(path: str) -> dict:
+    st = os.stat(path)
+    return {"size": int(st.st_size), "mtime": int(st.st_mtime)}
+
+
+def load_checkpoint(path: str = DEFAULT_CHECKPOINT) -> dict:
+    """{path file: {size, mtime, status, rows, inserted, at}}; dict kosong bila belum ada."""
+    if not os.path.exists(path):
+        return {}
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def save_checkpoint(state: dict, path: str = DEFAULT_CHECKPOINT):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp = path + ".tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(state, f, ensure_ascii=False, indent=1)
+    os.replace(tmp, path)
+
+
+def pending_files(files, state: dict, retry_errors: bool = False) -> list:
+    """File yang belum selesai (atau berubah sejak dicatat); file error dilewati kecuali retry_errors."""
+    out = []
+    for f in files:
+        rec = state.get(f)
+        if rec is None or {k: rec.get(k) for k in ("size", "mtime")} != file_fingerprint(f):
+            out.append(f)
+        elif rec.get("status") != "done" and retry_errors:
+            out.append(f)
+    return out
+
+
+# ============================================================
+# Worker (proses terpisah)
+# ============================================================
+
+def parse_backfill_file(path: str) -> tuple:
+    """
+    Membaca satu file arsip menjadi record siap muat (kolom RainfallCopySink.COLS, nama pos
+    dipetakan NAME_MAP, timestamp tak terbaca dibuang). Return (path, DataFrame atau None, info).
+    """
+    info = {"rows": 0, "ts_invalid": 0, "error": None}
+    try:
+        parts = []
+        for _, chunk in iter_upload_chunks(path, os.path.basename(path)):
+            valid = chunk["DATA TIMESTAMP"].notna()
+            info["rows"] += len(chunk)
+            info["ts_invalid"] += int((~valid).sum())
+            chunk = chunk[valid].reindex(columns=RainfallCopySink.COLS)
+            chunk["NAME"] = map_station_name(chunk["NAME"])
+            chunk["RAINFALL DAY MM"] = pd.to_numeric(chunk["RAINFALL DAY MM"], errors="coerce")
+            parts.append(chunk)
+        df = pd.concat(parts, ignore_index=True) if parts else pd.DataFrame(columns=RainfallCopySink.COLS)
+    except Exception as e:
+        df, info["error"] = None, str(e)
+    return path, df, info
+
+
+# ============================================================
+# Backfill
+# ============================================================
+
+def batch_months(batch: list) -> list:
+    """Rentang [awal, akhir) setiap bulan berbeda yang muncul di batch (bukan seluruh rentang min-maks)."""
+    periods = set()
+    for _, df, _ in batch:
+        if len(df):
+            periods.update(pd.DatetimeIndex(df["DATA TIMESTAMP"]).to_period("M").unique())
+    return [(p.start_time, (p + 1).start_time) for p in sorted(periods)]
+
+
+def _flush(engine, batch: list, state: dict, checkpoint: str) -> int:
+    """
+    Memuat satu batch (list (path, df, info)) dalam satu transaksi, memperbarui digest bulan yang
+    tersentuh, lalu mencatat checkpoint. Bila refresh digest gagal, file belum dicatat sehingga
+    backfill berikutnya memuat ulang (idempoten) dan mengulang refresh.
+    """
+    sink = RainfallCopySink(engine)
+    try:
+        for _, df, _ in batch:
+            if len(df):
+                sink.write(df)
+        inserted = sink.close()
+    except Exception:
+        sink.abort()
+        raise
+    refresh_db_digests(engine, batch_months(batch))
+    now = pd.Timestamp.now().isoformat(timespec="seconds")
+    for path, df, info in batch:
+        state[path] = {**file_fingerprint(path), "status": "done", "rows": info["rows"],
+                       "ts_invalid": info["ts_invalid"], "at": now}
+    save_checkpoint(state, checkpoint)
+    return inserted
+
+
+def run_backfill(engine, paths, workers: int = None, batch_rows: int = DEFAULT_BATCH_ROWS,
+                 checkpoint: str = DEFAULT_CHECKPOINT, retry_errors: bool = False, log=print) -> dict:
+    """
+    Backfill semua file di bawah `paths`. Parse paralel (maks 2x workers file di memori sekaligus),
+    muat per batch >= batch_rows baris. Return ringkasan: files, done, errors, rows, inserted, detik.
+    """
+    t0 = time.perf_counter()
+    state = load_checkpoint(checkpoint)
+    files = discover_files(paths)
+    todo = pending_files(files, state, retry_errors=retry_errors)
+    todo_set = set(todo)
+    skipped_err = sum(1 for f in files if f not in todo_set and state[f].get("status") != "done")
+    summary = {"files": len(files), "skipped": len(files) - len(todo), "skipped_errors": skipped_err,
+               "done": 0, "errors": 0, "rows": 0, "inserted": 0}
+    log(
+        f"{len(files)} file ditemukan, {summary['skipped'] - skipped_err} sudah selesai menurut checkpoint, "
+        f"{skipped_err} gagal sebelumnya dilewati (pakai --retry-errors), {len(todo)} diproses."
+    )
+    if not todo:
+        summary["detik"] = round(time.perf_counter() - t0, 1)
+        return summary
+
+    workers = max(1, workers or (os.cpu_count() or 1))
+    batch, batch_n = [], 0
+    queue = iter(todo)
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        running = set()
+        while True:
+            # Jendela terbatas: memori induk maks ~2x workers file + satu batch
+            while len(running) < 2 * workers:
+                nxt = next(queue, None)
+                if nxt is None:
+                    break
+                running.add(pool.submit(parse_backfill_file, nxt))
+            if not running:
+                break
+            finished, running = wait(running, return_when=FIRST_COMPLETED)
+            for fut in finished:
+                path, df, info = fut.result()
+                if info["error"] is not None:
+                    state[path] = {**file_fingerprint(path), "status": f"error: {info['error']}",
+                                   "rows": 0, "at": pd.Timestamp.now().isoformat(timespec="seconds")}
+                    save_checkpoint(state, checkpoint)
+                    summary["errors"] += 1
+                    log(f"GAGAL {path}: {info['error']}")
+                    continue
+                batch.append((path, df, info))
+                batch_n += len(df)
+                summary["rows"] += info["rows"]
+            if batch_n >= batch_rows:
+                summary["inserted"] += _flush(engine, batch, state, checkpoint)
+                summary["done"] += len(batch)
+                log(f"Batch {batch_n:,} baris dimuat ({summary['done']}/{len(todo)} file).")
+                batch, batch_n = [], 0
+
+    if batch:
+        summary["inserted"] += _flush(engine, batch, state, checkpoint)
+        summary["done"] += len(batch)
+        log(f"Batch {batch_n:,} baris dimuat ({summary['done']}/{len(todo)} file).")
+    summary["detik"] = round(time.perf_counter() - t0, 1)
+    return summary
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Backfill historis rainfall_data dari arsip CSV (dapat dilanjutkan).")
+    parser.add_argument("--checkpoint", default=DEFAULT_CHECKPOINT, help="File checkpoint per file")
+    sub = parser.add_subparsers(dest="cmd", required=True)
+
+    p_run = sub.add_parser("run", help="Parse paralel + muat batch ke database")
+    p_run.add_argument("paths", nargs="+", help="File atau direktori (rekursif: .csv, .gz, .zip)")
+    p_run.add_argument("--db-url", default=None, help="URL database (default: env DATABASE_URL)")
+    p_run.add_argument("--workers", type=int, default=None, help="Jumlah proses parser (default: jumlah CPU)")
+    p_run.add_argument("--batch-rows", type=int, default=DEFAULT_BATCH_ROWS, help="Baris minimum per transaksi muat")
+    p_run.add_argument("--retry-errors", action="store_true", help="Proses ulang file yang sebelumnya gagal")
+
+    sub.add_parser("status", help="Ringkasan checkpoint")
+
+    args = parser.parse_args(argv)
+
+    if args.cmd == "status":
+        state = load_checkpoint(args.checkpoint)
+        if not state:
+            print(f"Checkpoint kosong: {args.checkpoint}")
+            return 0
+        recs = pd.DataFrame.from_dict(state, orient="index")
+        done = recs["status"] == "done"
+        print(f"{int(done.sum())} file selesai ({int(recs.loc[done, 'rows'].sum()):,} baris), {int((~done).sum())} gagal.")
+        for path, rec in recs[~done].iterrows():
+            print(f"  {path}: {rec['status']}")
+        return 0
+
+    engine = create_engine_from_url(args.db_url)
+    summary = run_backfill(
+        engine, args.paths, workers=args.workers, batch_rows=args.batch_rows,
+        checkpoint=args.checkpoint, retry_errors=args.retry_errors,
+    )
+    print(
+        f"Selesai: {summary['done']} file dimuat, {summary['errors']} gagal, {summary['skipped']} dilewati; "
+        f"{summary['rows']:,} baris dibaca, {summary['inserted']:,} baris baru ({summary['detik']} s)."
+    )
+    return 1 if summary["errors"] else 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
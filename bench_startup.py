@@ -0,0 +1,105 @@
+# bench_startup.py
+#
+# Benchmark cold start: waktu import modul yang dimuat app.py saat start, diukur dengan
+# `python -X importtime` di proses baru (default: semua import top-level app.py, dibaca via AST).
+#
+#   python bench_startup.py
+#   python bench_startup.py --budget-ms 1500 --runs 7 --top 20
+#   python bench_startup.py --modules pipeline cli
+#
+# Exit code 1 bila median total import melebihi budget, atau modul berat yang seharusnya dimuat
+# saat dipakai (SQLAlchemy, psycopg2, pydeck, scipy.special, scipy.sparse) ikut termuat saat start;
+# 2 bila import gagal.
+
+import argparse
+import ast
+import os
+import re
+import statistics
+import subprocess
+import sys
+import time
+
+STARTUP_BUDGET_MS = 2500.0
+LAZY_MODULES = ("sqlalchemy", "psycopg2", "pydeck", "scipy.special", "scipy.sparse")
+REPO_DIR = os.path.dirname(os.path.abspath(__file__))
+
+_LINE = re.compile(r"^import time:\s+(\d+)\s+\|\s+(\d+)\s+\|(\s*)(\S+)\s*$")
+
+
+def app_startup_modules(app_path: str = os.path.join(REPO_DIR, "app.py")) -> list:
+    """Modul yang di-import di level teratas app.py (bukan di dalam blok halaman / fungsi)."""
+    with open(app_path, "r", encoding="utf-8") as f:
+        tree = ast.parse(f.read())
+    mods = []
+    for node in tree.body:
+        if isinstance(node, ast.Import):
+            mods.extend(a.name for a in node.names)
+        elif isinstance(node, ast.ImportFrom) and node.module and node.level == 0:
+            mods.append(node.module)
+    return list(dict.fromkeys(mods))
+
+
+def parse_importtime(stderr: str) -> list:
+    """Baris importtime -> [(nama, self_us, cumulative_us, kedalaman)]."""
+    rows = []
+    for line in stderr.splitlines():
+        m = _LINE.match(line)
+        if m:
+            rows.append((m.group(4), int(m.group(1)), int(m.group(2)), (len(m.group(3)) - 1) // 2))
+    return rows
+
+
+def measure(modules, runs: int = 5) -> dict:
+    """Import `modules` di `runs` proses baru. Return median wall/import (ms) + rincian run terakhir."""
+    code = "import " + ", ".join(modules)
+    wall, total, rows = [], [], []
+    for _ in range(runs):
+        t0 = time.perf_counter()
+        proc = subprocess.run(
+            [sys.executable, "-X", "importtime", "-c", code],
+            cwd=REPO_DIR, capture_output=True, text=True,
+        )
+        wall.append(1000 * (time.perf_counter() - t0))
+        if proc.returncode != 0:
+            raise RuntimeError(proc.stderr.strip().splitlines()[-1] if proc.stderr.strip() else "import gagal")
+        rows = parse_importtime(proc.stderr)
+        total.append(sum(r[1] for r in rows) / 1000)
+    return {"wall_ms": statistics.median(wall), "import_ms": statistics.median(total), "rows": rows}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark waktu import cold start aplikasi (python -X importtime).")
+    parser.add_argument("--modules", nargs="+", default=None, help="Modul yang diukur (default: import top-level app.py)")
+    parser.add_argument("--runs", type=int, default=5, help="Jumlah proses baru (median)")
+    parser.add_argument("--budget-ms", type=float, default=STARTUP_BUDGET_MS, help="Budget median total import (ms)")
+    parser.add_argument("--top", type=int, default=15, help="Jumlah paket termahal yang ditampilkan")
+    args = parser.parse_args(argv)
+
+    modules = args.modules or app_startup_modules()
+    try:
+        res = measure(modules, runs=args.runs)
+    except RuntimeError as e:
+        print(f"Import gagal: {e}")
+        return 2
+
+    # Paket top-level termahal (kumulatif), termasuk dependensi pihak ketiga
+    top = sorted((r for r in res["rows"] if r[3] == 0), key=lambda r: -r[2])[: args.top]
+    print(f"Modul: {', '.join(modules)}")
+    print(f"{'paket':<32}{'kumulatif (ms)':>16}")
+    for name, _, cum, _ in top:
+        print(f"{name:<32}{cum / 1000:>16.1f}")
+
+    loaded = {r[0] for r in res["rows"]}
+    eager = [m for m in LAZY_MODULES if m in loaded]
+    print(f"\nMedian {args.runs} run: import {res['import_ms']:.0f} ms, proses total {res['wall_ms']:.0f} ms "
+          f"(budget import {args.budget_ms:.0f} ms)")
+    if eager:
+        print(f"GAGAL: modul lazy ikut termuat saat start: {', '.join(eager)}")
+    if res["import_ms"] > args.budget_ms:
+        print("GAGAL: melebihi budget")
+    return 1 if eager or res["import_ms"] > args.budget_ms else 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
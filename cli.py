@@ -0,0 +1,127 @@
+# cli.py
+#
+# Run SEGARA tanpa Streamlit (cron / regenerasi produk massal). Pipeline sama dengan tombol Run:
+# ambil data -> build_outputs per window -> dashboard -> CDD/CWD -> QC -> ekspor CSV (pipeline.py).
+#
+#   python cli.py run --month 2024-01 --das 2
+#   python cli.py run --month 2024-01 --until 2024-12 --workers 4 --outdir produk
+#   python cli.py run --month 2024-03 --input arsip/2024/*.csv
+#
+# Rentang bulan diproses paralel dengan process pool; setiap proses membuka engine dan memuat
+# sumber daya (koordinat, cube, normal, indeks tetangga, bobot) sekali, lalu menulis produk ke
+# <outdir>/<YYYY-MM>/ dengan nama file yang sama dengan halaman Download.
+
+import argparse
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import pandas as pd
+
+from pipeline import export_products, load_resources, prepare_month_records, query_timeseries, run_month
+from rainfall import build_daily_matrix
+
+DEFAULT_OUTDIR = "produk"
+
+_WORKER = {}
+
+
+def month_range(start: str, until: str = None) -> list:
+    """'YYYY-MM' s.d. 'YYYY-MM' (inklusif) -> [(tahun, bulan), ...]."""
+    periods = pd.period_range(pd.Period(start, freq="M"), pd.Period(until or start, freq="M"), freq="M")
+    return [(p.year, p.month) for p in periods]
+
+
+def _init_worker(db_url: str, inputs, coords_path: str, fill_gaps: bool):
+    """Sekali per proses: engine (sumber DB) atau record upload (sumber CSV), dan sumber daya Run."""
+    if inputs:
+        from ingest import ingest_files
+        df, _ = ingest_files(inputs, max_workers=1)
+        _WORKER["records"] = df
+    else:
+        from db import create_engine_from_url
+        _WORKER["engine"] = create_engine_from_url(db_url)
+    _WORKER["resources"] = load_resources(coords_path, fill_gaps=fill_gaps)
+
+
+def process_month(job: dict) -> dict:
+    """Satu bulan: ambil data, run_month, ekspor. Tidak melempar exception (status di hasil)."""
+    year, month = job["year"], job["month"]
+    t0 = time.perf_counter()
+    res = {"month": f"{year}-{month:02d}", "status": "ok", "files": 0, "detik": 0.0}
+    try:
+        if "records" in _WORKER:
+            df = _WORKER["records"]
+            if df is None:
+                raise ValueError("tidak ada file input valid")
+            df_ts = None
+        else:
+            df = df_ts = query_timeseries(_WORKER["engine"], year, month, lookback_days=job["lookback_days"])
+            if df.empty:
+                raise ValueError("tidak ada data di database")
+
+        df_month_full, _ = prepare_month_records(df, year, month)
+        result = run_month(
+            df_month_full, build_daily_matrix(df), year, month, job["das"], _WORKER["resources"],
+            rainy_thr=job["rainy_thr"], heavy_thr=job["heavy_thr"], qc_enabled=job["qc"],
+            fill_gaps=job["fill_gaps"], use_filled=job["use_filled"],
+            cdd_timeseries=df_ts,
+        )
+        written = export_products(result, job["outdir"], coords=_WORKER["resources"]["coords"], windows=job["windows"])
+        res["files"] = len(written)
+    except Exception as e:
+        res["status"] = f"error: {e}"
+    res["detik"] = round(time.perf_counter() - t0, 1)
+    return res
+
+
+def run_months(months, workers: int = None, db_url: str = None, inputs=None, coords_path: str = "coords.csv",
+               **job_kw) -> list:
+    """Memproses daftar (tahun, bulan) paralel; return ringkasan per bulan dalam urutan bulan."""
+    jobs = [{"year": y, "month": m, **job_kw} for y, m in months]
+    init = (db_url, list(inputs or []), coords_path, job_kw.get("fill_gaps", False))
+    workers = max(1, min(workers or (os.cpu_count() or 1), len(jobs)))
+    if workers == 1:
+        _init_worker(*init)
+        return [process_month(j) for j in jobs]
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=init) as pool:
+        return list(pool.map(process_month, jobs))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Run pipeline SEGARA tanpa Streamlit dan ekspor produk CSV.")
+    sub = parser.add_subparsers(dest="cmd", required=True)
+
+    p_run = sub.add_parser("run", help="Proses satu bulan atau rentang bulan")
+    p_run.add_argument("--month", required=True, help="Bulan (YYYY-MM), atau awal rentang")
+    p_run.add_argument("--until", default=None, help="Akhir rentang bulan (YYYY-MM, inklusif)")
+    p_run.add_argument("--das", type=int, choices=[1, 2, 3], default=3, help="Dasarian terakhir yang dibangun")
+    p_run.add_argument("--windows", nargs="+", default=None, help="Hanya ekspor window ini (das1 das2 das3 monthly)")
+    p_run.add_argument("--input", nargs="+", default=None, help="File CSV vertikal (default: ambil dari database)")
+    p_run.add_argument("--db-url", default=None, help="URL database (default: env DATABASE_URL)")
+    p_run.add_argument("--lookback-days", type=int, default=365, help="Lookback CDD/CWD dan persentil (hari)")
+    p_run.add_argument("--coords", default="coords.csv", help="File koordinat stasiun")
+    p_run.add_argument("--outdir", default=DEFAULT_OUTDIR, help="Direktori produk")
+    p_run.add_argument("--workers", type=int, default=None, help="Jumlah proses (default: jumlah CPU)")
+    p_run.add_argument("--rainy-thr", type=float, default=1.0, help="Batas hari hujan (mm)")
+    p_run.add_argument("--heavy-thr", type=float, default=20.0, help="Batas hujan lebat (mm)")
+    p_run.add_argument("--qc", nargs="+", default=None, help="Kode aturan QC aktif (default: aturan default)")
+    p_run.add_argument("--fill-gaps", action="store_true", help="Isi sel kosong dengan IDW tetangga")
+    p_run.add_argument("--use-filled", action="store_true", help="Pakai nilai terisi untuk ringkasan & indeks")
+
+    args = parser.parse_args(argv)
+
+    results = run_months(
+        month_range(args.month, args.until), workers=args.workers, db_url=args.db_url,
+        inputs=args.input, coords_path=args.coords,
+        das=args.das, windows=args.windows, outdir=args.outdir, lookback_days=args.lookback_days,
+        rainy_thr=args.rainy_thr, heavy_thr=args.heavy_thr, qc=args.qc,
+        fill_gaps=args.fill_gaps, use_filled=args.use_filled,
+    )
+    for r in results:
+        print(f"{r['month']}: {r['status']} ({r['files']} file, {r['detik']} s)")
+    return 1 if any(r["status"] != "ok" for r in results) else 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,196 @@
+# climatology.py
+#
+# Normal klimatologi per stasiun per dasarian-tahun (36 dasarian) dan per bulan (12 bulan):
+# rata-rata, median, dan batas tersil. Dihitung sekali dari cube historis (job precompute)
+# dan disimpan sebagai lookup table .npz kecil; saat Run cukup join O(stasiun).
+#
+#   python climatology.py build [--base 1991 2020]
+
+import argparse
+import os
+import warnings
+
+import numpy as np
+import pandas as pd
+
+from config import CACHE_DIR, NORMAL_BASE_PERIOD
+
+DEFAULT_NORMALS_PATH = os.path.join(CACHE_DIR, "climatology", "normals_dasarian.npz")
+MIN_VALID_FRAC = 0.8   # minimal fraksi hari valid agar total dasarian/bulan dihitung
+MIN_YEARS = 10         # minimal jumlah tahun untuk sebuah normal
+
+# Sifat hujan BMKG berdasarkan persen terhadap normal
+SIFAT_HUJAN = [(115.0, "Atas Normal"), (85.0, "Normal"), (-np.inf, "Bawah Normal")]
+
+
+def dasarian_of_year(dates: pd.DatetimeIndex) -> np.ndarray:
+    """Indeks dasarian-tahun 0..35 (Jan das1 = 0, Des das3 = 35)."""
+    das = np.where(dates.day <= 10, 0, np.where(dates.day <= 20, 1, 2))
+    return (dates.month.to_numpy() - 1) * 3 + das
+
+
+def window_period_key(window_key: str, month: int) -> tuple:
+    """Memetakan key window Run (das1/das2/das3/monthly) ke (jenis, indeks baris) lookup normal."""
+    if window_key == "monthly":
+        return "mon", int(month) - 1
+    if window_key in ("das1", "das2", "das3"):
+        return "das", (int(month) - 1) * 3 + int(window_key[-1]) - 1
+    return None, None
+
+
+def _period_totals(daily: pd.DataFrame, labels: np.ndarray, n_periods: int, base_period) -> np.ndarray:
+    """Total per (tahun, periode, stasiun) dengan syarat kelengkapan, bentuk [tahun, periode, stasiun]."""
+    b0, b1 = base_period
+    years = daily.index.year.to_numpy()
+    keep = (years >= b0) & (years <= b1)
+    v = daily.to_numpy(dtype=np.float64)[keep]
+    y = years[keep] - b0
+    p = labels[keep]
+
+    n_years = b1 - b0 + 1
+    n_st = v.shape[1]
+    valid = np.isfinite(v)
+    flat = y * n_periods + p
+
+    sums = np.zeros((n_years * n_periods, n_st))
+    n_valid = np.zeros((n_years * n_periods, n_st))
+    n_days = np.bincount(flat, minlength=n_years * n_periods).astype(np.float64)
+    np.add.at(sums, flat, np.where(valid, v, 0.0))
+    np.add.at(n_valid, flat, valid)
+
+    with np.errstate(invalid="ignore", divide="ignore"):
+        frac = n_valid / n_days[:, None]
+    totals = np.where(frac >= MIN_VALID_FRAC, sums, np.nan)
+    return totals.reshape(n_years, n_periods, n_st)
+
+
+def _summarize(totals: np.ndarray) -> dict:
+    n = np.isfinite(totals).sum(axis=0)
+    with warnings.catch_warnings():
+        warnings.simplefilter("ignore", category=RuntimeWarning)
+        mean = np.nanmean(totals, axis=0)
+        q = np.nanpercentile(totals, [50, 100 / 3, 200 / 3], axis=0)
+    ok = n >= MIN_YEARS
+    return {
+        "mean": np.where(ok, mean, np.nan).astype(np.float32),
+        "median": np.where(ok, q[0], np.nan).astype(np.float32),
+        "t1": np.where(ok, q[1], np.nan).astype(np.float32),
+        "t2": np.where(ok, q[2], np.nan).astype(np.float32),
+        "n_years": n.astype(np.int16),
+    }
+
+
+def build_normals(daily: pd.DataFrame, base_period=NORMAL_BASE_PERIOD) -> dict:
+    """Membangun normal dasarian (36 baris) dan bulanan (12 baris) dari matriks harian historis."""
+    dates = pd.DatetimeIndex(daily.index)
+    first_full = dates.min().year if (dates.min().month, dates.min().day) == (1, 1) else dates.min().year + 1
+    last_full = dates.max().year if (dates.max().month, dates.max().day) == (12, 31) else dates.max().year - 1
+    b0, b1 = max(int(base_period[0]), first_full), min(int(base_period[1]), last_full)
+    if b1 < b0:
+        raise ValueError("Riwayat data tidak mencakup satu tahun penuh pun dalam periode dasar.")
+
+    das = _summarize(_period_totals(daily, dasarian_of_year(dates), 36, (b0, b1)))
+    mon = _summarize(_period_totals(daily, dates.month.to_numpy() - 1, 12, (b0, b1)))
+
+    normals = {"stations": [str(c) for c in daily.columns], "base_period": (b0, b1)}
+    normals.update({f"das_{k}": v for k, v in das.items()})
+    normals.update({f"mon_{k}": v for k, v in mon.items()})
+    return normals
+
+
+def save_normals(normals: dict, path: str = DEFAULT_NORMALS_PATH):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    arrays = {k: v for k, v in normals.items() if k not in ("stations", "base_period")}
+    tmp = path + ".tmp.npz"
+    np.savez(tmp, stations=np.array(normals["stations"]), base_period=np.array(normals["base_period"]), **arrays)
+    os.replace(tmp, path)
+
+
+def load_normals(path: str = DEFAULT_NORMALS_PATH):
+    """Lookup normal yang sudah di-precompute; None bila belum dibangun."""
+    if not os.path.exists(path):
+        return None
+    with np.load(path, allow_pickle=False) as z:
+        normals = {k: z[k] for k in z.files}
+    normals["stations"] = [str(s) for s in normals["stations"]]
+    normals["base_period"] = tuple(int(y) for y in normals["base_period"])
+    return normals
+
+
+def classify_sifat_hujan(pct) -> str:
+    if pd.isna(pct):
+        return "-"
+    for lower, label in SIFAT_HUJAN:
+        if pct > lower:
+            return label
+    return SIFAT_HUJAN[-1][1]
+
+
+def attach_normals(station_dash: pd.DataFrame, normals: dict, window_key: str, month: int,
+                   period_days: int) -> pd.DataFrame:
+    """
+    Menambahkan kolom normal, anomali, persen terhadap normal, posisi tersil, dan sifat hujan
+    ke station_dash (kolom total_mm, valid_days). Join O(stasiun) via indeks baris lookup.
+    period_days = panjang penuh periode normal (hari dasarian/bulan); total hanya dibandingkan
+    bila valid_days memenuhi syarat kelengkapan yang sama dengan normal (MIN_VALID_FRAC), sehingga
+    window yang baru berjalan sebagian (Run pertengahan bulan) tidak terbaca "Bawah Normal".
+    """
+    kind, row = window_period_key(window_key, month)
+    if normals is None or kind is None or station_dash.empty:
+        return station_dash
+
+    pos = {s: i for i, s in enumerate(normals["stations"])}
+    idx = station_dash["station"].map(pos)
+    have = idx.notna().to_numpy()
+    col = np.where(have, idx.fillna(0).astype(int).to_numpy(), 0)
+
+    def pick(name):
+        return np.where(have, normals[f"{kind}_{name}"][row][col].astype(np.float64), np.nan)
+
+    out = station_dash.copy()
+    total = pd.to_numeric(out["total_mm"], errors="coerce").to_numpy(dtype=np.float64)
+    if "valid_days" in out.columns:
+        valid = pd.to_numeric(out["valid_days"], errors="coerce").to_numpy(dtype=np.float64)
+        total = np.where(valid >= MIN_VALID_FRAC * float(period_days), total, np.nan)
+
+    mean, t1, t2 = pick("mean"), pick("t1"), pick("t2")
+    out["normal_mean_mm"] = mean
+    out["normal_median_mm"] = pick("median")
+    out["normal_t1_mm"] = t1
+    out["normal_t2_mm"] = t2
+    out["anomaly_mm"] = total - mean
+    with np.errstate(invalid="ignore", divide="ignore"):
+        out["pct_of_normal"] = np.where(mean > 0, total / mean * 100.0, np.nan).round(1)
+    out["tercile"] = np.select(
+        [np.isnan(total) | np.isnan(t1), total < t1, total > t2],
+        ["-", "Bawah", "Atas"],
+        default="Tengah"
+    )
+    out["sifat_hujan"] = out["pct_of_normal"].apply(classify_sifat_hujan)
+    return out
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Precompute normal klimatologi dasarian dari cube historis.")
+    sub = parser.add_subparsers(dest="cmd", required=True)
+    p_build = sub.add_parser("build", help="Bangun lookup normal dari cube")
+    p_build.add_argument("--base", nargs=2, type=int, default=list(NORMAL_BASE_PERIOD), metavar=("AWAL", "AKHIR"))
+    p_build.add_argument("--cube", default=None, help="Direktori cube (default: cache)")
+    p_build.add_argument("--out", default=DEFAULT_NORMALS_PATH)
+    args = parser.parse_args(argv)
+
+    from cube import DEFAULT_CUBE_DIR, open_cube
+    cube = open_cube(args.cube or DEFAULT_CUBE_DIR)
+    if cube is None:
+        print("Cube historis belum ada. Jalankan: python cube.py build --start YYYY-MM-DD")
+        return 1
+
+    normals = build_normals(cube.to_frame(), base_period=tuple(args.base))
+    save_normals(normals, args.out)
+    b0, b1 = normals["base_period"]
+    print(f"Normal dasarian {b0}-{b1} untuk {len(normals['stations'])} stasiun disimpan ke {args.out}")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
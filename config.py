@@ -1,5 +1,7 @@
 # config.py
 
+import os
+
 HORIZONTAL_COLS = [
     "Ampenan", "Cakranegara", "Majeluk", "Selaparang", "Batu Layar", "Buwun Mas",
     "Banter Gerung / Banyu Urip", "Gerung", "Gunung Sari", "Labuapi", "Lembar",
@@ -75,4 +77,46 @@ NAME_MAP = {
     "Sukamulia/Dasan Lekong": "Sukamulia /Dasan Lekong",
     "Tapir/Seteluk": "Tapir /Seteluk",
     "Kateng": "Kateng (lombok Tengah)",
-}
\ No newline at end of file
+}
+
+# Direktori cache lokal (cube memmap, parameter terfit, lookup table, dsb).
+# Bisa dioverride lewat environment variable SEGARA_CACHE_DIR.
+CACHE_DIR = os.environ.get("SEGARA_CACHE_DIR", ".segara_cache")
+
+# Klasifikasi intensitas hujan harian BMKG (mm/hari), batas bawah tiap kelas
+# ringan: 0.5–20, sedang: 20–50, lebat: 50–100, sangat lebat: 100–150, ekstrem: > 150
+BMKG_INTENSITY_BINS = [0.5, 20.0, 50.0, 100.0, 150.0]
+BMKG_INTENSITY_CLASSES = ["ringan", "sedang", "lebat", "sangat_lebat", "ekstrem"]
+
+# Hari pengamatan BMKG: pembacaan jam 07:00 waktu setempat tanggal D mencakup (D-1 07:00, D 07:00].
+# Data ARG sub-harian diagregasi ke hari ini; hari dengan kelengkapan interval di bawah ambang
+# tidak diberi nilai harian (tetap tercatat dengan persentase kelengkapannya).
+OBS_DAY_CUTOFF_HOUR = 7
+ARG_INTERVAL_MINUTES = 10
+ARG_MIN_COMPLETENESS_PCT = 80.0
+
+# Periode dasar (tahun awal, tahun akhir) untuk fitting distribusi gamma SPI.
+# Dipotong otomatis ke tahun lengkap yang tersedia di cube historis.
+SPI_BASE_PERIOD = (1991, 2020)
+SPI_SCALES = (1, 3, 6)
+
+# Periode dasar normal klimatologi dasarian (dipotong ke tahun yang tersedia di cube)
+NORMAL_BASE_PERIOD = (1991, 2020)
+
+# File batas wilayah kabupaten/kota (GeoJSON lon-lat) untuk curah hujan wilayah Thiessen.
+# Tidak disertakan di repo; bisa dioverride lewat environment variable SEGARA_REGION_BOUNDARY.
+REGION_BOUNDARY_PATH = os.environ.get("SEGARA_REGION_BOUNDARY", "batas_kabupaten.geojson")
+
+# Kode wilayah (4 digit awal POS HUJAN ID = provinsi + kabupaten/kota) -> nama kabupaten/kota NTB
+REGENCY_NAMES = {
+    "5201": "Lombok Barat",
+    "5202": "Lombok Tengah",
+    "5203": "Lombok Timur",
+    "5204": "Sumbawa",
+    "5205": "Dompu",
+    "5206": "Bima",
+    "5207": "Sumbawa Barat",
+    "5208": "Lombok Utara",
+    "5271": "Kota Mataram",
+    "5272": "Kota Bima",
+}
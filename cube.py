@@ -0,0 +1,332 @@
+# cube.py
+#
+# Cube curah hujan multi-tahun (hari x stasiun) berbasis memory-map.
+#
+# Layout direktori cube:
+#   meta.json  -> tanggal awal, jumlah hari terisi, kapasitas, urutan stasiun
+#   rain.f32   -> float32 [kapasitas, n_stasiun], nilai numerik (NaN = kosong, 8888 -> 0.1)
+#   code.u8    -> uint8   [kapasitas, n_stasiun], kode BMKG (lihat rainfall.CODE_*)
+#
+# Urutan kolom mengikuti HORIZONTAL_COLS sehingga slice hari menghasilkan view tanpa copy,
+# dan file yang sama dapat dibuka read-only oleh banyak proses (page cache bersama).
+
+import argparse
+import json
+import os
+
+import numpy as np
+import pandas as pd
+from sqlalchemy import text
+
+from config import CACHE_DIR, HORIZONTAL_COLS
+from db import clean_timestamp_series, create_engine_from_url
+from rainfall import CODE_NO_ROW, encode_raw_rainfall, map_station_name
+
+DEFAULT_CUBE_DIR = os.path.join(CACHE_DIR, "cube")
+GROW_DAYS = 366
+
+_META_FILE = "meta.json"
+_RAIN_FILE = "rain.f32"
+_CODE_FILE = "code.u8"
+
+
+class RainfallCube:
+    """
+    Akses memory-mapped ke cube curah hujan harian.
+    Buka dengan mode="r" untuk analisis (read-only, berbagi page antar proses)
+    atau mode="r+" untuk menulis/append.
+    """
+
+    def __init__(self, path: str = DEFAULT_CUBE_DIR, mode: str = "r"):
+        self.path = path
+        self.mode = mode
+        with open(os.path.join(path, _META_FILE), "r", encoding="utf-8") as f:
+            meta = json.load(f)
+
+        self.start = np.datetime64(meta["start_date"], "D")
+        self.n_days = int(meta["n_days"])
+        self.capacity = int(meta["capacity"])
+        self.stations = list(meta["stations"])
+        self.station_index = {s: i for i, s in enumerate(self.stations)}
+        self._open_maps()
+
+    # --------------------------------------------------------
+    # Pembuatan & manajemen file
+    # --------------------------------------------------------
+
+    @classmethod
+    def create(cls, path: str, start_date, end_date, stations=None) -> "RainfallCube":
+        """Membuat cube kosong (semua sel NaN / CODE_NO_ROW) untuk rentang tanggal."""
+        stations = list(stations) if stations is not None else list(HORIZONTAL_COLS)
+        start = np.datetime64(pd.Timestamp(start_date).date(), "D")
+        end = np.datetime64(pd.Timestamp(end_date).date(), "D")
+        if end < start:
+            raise ValueError(f"Tanggal akhir ({end}) lebih awal dari tanggal awal ({start}).")
+
+        n_days = int((end - start).astype(int)) + 1
+        capacity = n_days + GROW_DAYS
+        n_st = len(stations)
+
+        os.makedirs(path, exist_ok=True)
+        rain = np.memmap(os.path.join(path, _RAIN_FILE), dtype=np.float32, mode="w+", shape=(capacity, n_st))
+        rain[:] = np.nan
+        rain.flush()
+        code = np.memmap(os.path.join(path, _CODE_FILE), dtype=np.uint8, mode="w+", shape=(capacity, n_st))
+        code[:] = CODE_NO_ROW
+        code.flush()
+        del rain, code
+
+        _write_meta(path, {
+            "start_date": str(start),
+            "n_days": n_days,
+            "capacity": capacity,
+            "stations": stations,
+        })
+        return cls(path, mode="r+")
+
+    def _open_maps(self):
+        shape = (self.capacity, len(self.stations))
+        self._rain = np.memmap(os.path.join(self.path, _RAIN_FILE), dtype=np.float32, mode=self.mode, shape=shape)
+        self._code = np.memmap(os.path.join(self.path, _CODE_FILE), dtype=np.uint8, mode=self.mode, shape=shape)
+
+    def _save_meta(self):
+        _write_meta(self.path, {
+            "start_date": str(self.start),
+            "n_days": self.n_days,
+            "capacity": self.capacity,
+            "stations": self.stations,
+        })
+
+    def _grow(self, new_n_days: int):
+        """Memperbesar kapasitas file (kelipatan GROW_DAYS) dan mengisi area baru dengan NaN / NO_ROW."""
+        if new_n_days <= self.capacity:
+            return
+        old_cap = self.capacity
+        new_cap = new_n_days + GROW_DAYS
+        n_st = len(self.stations)
+
+        self.flush()
+        del self._rain, self._code
+        for fname, itemsize in ((_RAIN_FILE, 4), (_CODE_FILE, 1)):
+            with open(os.path.join(self.path, fname), "r+b") as f:
+                f.truncate(new_cap * n_st * itemsize)
+
+        self.capacity = new_cap
+        self._open_maps()
+        self._rain[old_cap:] = np.nan
+        self._code[old_cap:] = CODE_NO_ROW
+
+    def flush(self):
+        if self.mode != "r":
+            self._rain.flush()
+            self._code.flush()
+
+    # --------------------------------------------------------
+    # Indeks tanggal & stasiun
+    # --------------------------------------------------------
+
+    @property
+    def end(self) -> np.datetime64:
+        return self.start + np.timedelta64(self.n_days - 1, "D")
+
+    @property
+    def dates(self) -> pd.DatetimeIndex:
+        return pd.date_range(pd.Timestamp(self.start), periods=self.n_days, freq="D")
+
+    def day_offset(self, d) -> int:
+        return int((np.datetime64(pd.Timestamp(d).date(), "D") - self.start).astype(int))
+
+    def _day_slice(self, start=None, end=None) -> slice:
+        i0 = 0 if start is None else max(self.day_offset(start), 0)
+        i1 = self.n_days if end is None else min(self.day_offset(end) + 1, self.n_days)
+        return slice(i0, max(i1, i0))
+
+    def _station_selector(self, stations):
+        """
+        Mengembalikan slice bila stasiun yang diminta berurutan dalam HORIZONTAL_COLS
+        (view tanpa copy, mis. satu blok kabupaten), selain itu array indeks (gather).
+        """
+        if stations is None:
+            return slice(None)
+        idx = np.array([self.station_index[s] for s in stations], dtype=np.intp)
+        if len(idx) and np.array_equal(idx, np.arange(idx[0], idx[0] + len(idx))):
+            return slice(int(idx[0]), int(idx[0]) + len(idx))
+        return idx
+
+    # --------------------------------------------------------
+    # Akses data
+    # --------------------------------------------------------
+
+    def slice(self, start=None, end=None, stations=None):
+        """
+        Potongan cube untuk rentang tanggal (inklusif) dan subset stasiun.
+        Return (values float32 [hari, stasiun], codes uint8 [hari, stasiun], DatetimeIndex).
+        Rentang hari selalu berupa view memmap; subset stasiun non-berurutan di-gather.
+        """
+        ds = self._day_slice(start, end)
+        ss = self._station_selector(stations)
+        dates = pd.date_range(pd.Timestamp(self.start + np.timedelta64(ds.start, "D")), periods=ds.stop - ds.start, freq="D")
+        return self._rain[ds][:, ss], self._code[ds][:, ss], dates
+
+    def to_frame(self, start=None, end=None, stations=None) -> pd.DataFrame:
+        """Matriks numerik sebagai DataFrame (index tanggal, kolom stasiun), setara pivot rain_num."""
+        values, _, dates = self.slice(start, end, stations)
+        cols = list(stations) if stations is not None else self.stations
+        return pd.DataFrame(np.asarray(values, dtype=np.float64), index=dates, columns=cols)
+
+    def write_rows(self, df: pd.DataFrame) -> int:
+        """
+        Menulis baris long-format (NAME, DATA TIMESTAMP / DATE, RAINFALL DAY MM) ke cube.
+        Cube otomatis diperbesar bila tanggal melewati akhir cube. Untuk duplikat stasiun-hari
+        dipakai record pertama (setara pivot_table aggfunc="first").
+        """
+        if self.mode == "r":
+            raise RuntimeError("Cube dibuka read-only. Gunakan mode='r+' untuk menulis.")
+        if df is None or df.empty:
+            return 0
+
+        if "DATE" in df.columns:
+            dates = pd.to_datetime(df["DATE"], errors="coerce")
+        else:
+            dates = clean_timestamp_series(df["DATA TIMESTAMP"])
+        dates = dates.dt.normalize()
+
+        names = map_station_name(df["NAME"])
+        st_idx = names.map(self.station_index)
+
+        ok = dates.notna() & st_idx.notna()
+        if not ok.any():
+            return 0
+
+        day_idx = ((dates[ok].values.astype("datetime64[D]") - self.start).astype(np.int64))
+        if day_idx.min() < 0:
+            raise ValueError(
+                f"Data sebelum awal cube ({self.start}). Bangun ulang cube dengan tanggal awal lebih lama."
+            )
+
+        st_idx = st_idx[ok].astype(np.int64).to_numpy()
+        values, codes = encode_raw_rainfall(df.loc[ok, "RAINFALL DAY MM"])
+
+        # Record pertama per (hari, stasiun)
+        flat = day_idx * len(self.stations) + st_idx
+        _, first = np.unique(flat, return_index=True)
+        day_idx, st_idx, values, codes = day_idx[first], st_idx[first], values[first], codes[first]
+
+        new_n_days = int(day_idx.max()) + 1
+        if new_n_days > self.n_days:
+            self._grow(new_n_days)
+            self.n_days = new_n_days
+
+        self._rain[day_idx, st_idx] = values
+        self._code[day_idx, st_idx] = codes
+        self.flush()
+        self._save_meta()
+        return int(len(first))
+
+
+def _write_meta(path: str, meta: dict):
+    tmp = os.path.join(path, _META_FILE + ".tmp")
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(meta, f, ensure_ascii=False, indent=1)
+    os.replace(tmp, os.path.join(path, _META_FILE))
+
+
+def open_cube(path: str = DEFAULT_CUBE_DIR, mode: str = "r"):
+    """Membuka cube bila ada, None bila belum pernah dibangun."""
+    if not os.path.exists(os.path.join(path, _META_FILE)):
+        return None
+    return RainfallCube(path, mode=mode)
+
+
+# ============================================================
+# Build & append dari tabel rainfall_data
+# ============================================================
+
+_RANGE_QUERY = text("""
+    SELECT
+        "NAME",
+        "DATA TIMESTAMP"::text AS "DATA TIMESTAMP",
+        "RAINFALL DAY MM"
+    FROM rainfall_data
+    WHERE ("DATA TIMESTAMP" AT TIME ZONE 'UTC')::date BETWEEN :start_str AND :end_str
+    ORDER BY "DATA TIMESTAMP" ASC;
+""")
+
+
+def load_range_into_cube(cube: RainfallCube, engine, start_date, end_date, chunk_days: int = GROW_DAYS) -> int:
+    """Menarik rainfall_data per blok tanggal (default ~1 tahun) dan menuliskannya ke cube."""
+    written = 0
+    cur = pd.Timestamp(start_date).normalize()
+    end = pd.Timestamp(end_date).normalize()
+    while cur <= end:
+        blk_end = min(cur + pd.Timedelta(days=chunk_days - 1), end)
+        with engine.connect() as conn:
+            df = pd.read_sql(_RANGE_QUERY, conn, params={
+                "start_str": cur.strftime("%Y-%m-%d"),
+                "end_str": blk_end.strftime("%Y-%m-%d"),
+            })
+        written += cube.write_rows(df)
+        cur = blk_end + pd.Timedelta(days=1)
+    return written
+
+
+def build_cube_from_db(engine, start_date, end_date=None, path: str = DEFAULT_CUBE_DIR) -> RainfallCube:
+    """Membangun cube baru dari rainfall_data untuk rentang [start_date, end_date]."""
+    end_date = end_date if end_date is not None else pd.Timestamp.today().normalize()
+    cube = RainfallCube.create(path, start_date, end_date)
+    load_range_into_cube(cube, engine, start_date, end_date)
+    return cube
+
+
+def append_cube_from_db(engine, path: str = DEFAULT_CUBE_DIR, since=None, until=None, overlap_days: int = 7) -> int:
+    """
+    Append harian: menarik ulang data sejak (akhir cube - overlap_days) agar laporan terlambat
+    ikut tertulis, lalu memperpanjang cube hingga `until` (default hari ini).
+    """
+    cube = RainfallCube(path, mode="r+")
+    if since is None:
+        since = pd.Timestamp(cube.end) - pd.Timedelta(days=overlap_days)
+    since = max(pd.Timestamp(since), pd.Timestamp(cube.start))
+    until = until if until is not None else pd.Timestamp.today().normalize()
+    return load_range_into_cube(cube, engine, since, until)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Kelola cube curah hujan memory-mapped (hari x stasiun).")
+    parser.add_argument("--path", default=DEFAULT_CUBE_DIR, help="Direktori cube")
+    parser.add_argument("--db-url", default=None, help="URL database (default: env DATABASE_URL)")
+    sub = parser.add_subparsers(dest="cmd", required=True)
+
+    p_build = sub.add_parser("build", help="Bangun cube baru dari rainfall_data")
+    p_build.add_argument("--start", required=True, help="Tanggal awal (YYYY-MM-DD)")
+    p_build.add_argument("--end", default=None, help="Tanggal akhir (default: hari ini)")
+
+    p_append = sub.add_parser("append", help="Append data terbaru (untuk cron harian)")
+    p_append.add_argument("--since", default=None, help="Tarik ulang sejak tanggal ini")
+
+    sub.add_parser("info", help="Tampilkan ringkasan cube")
+
+    args = parser.parse_args(argv)
+
+    if args.cmd == "info":
+        cube = open_cube(args.path)
+        if cube is None:
+            print(f"Cube belum ada di {args.path}")
+            return 1
+        values, codes, _ = cube.slice()
+        print(f"{args.path}: {cube.start} s.d. {cube.end} ({cube.n_days} hari x {len(cube.stations)} stasiun)")
+        print(f"Sel terisi: {int((codes != CODE_NO_ROW).sum())} / {codes.size}")
+        return 0
+
+    engine = create_engine_from_url(args.db_url)
+    if args.cmd == "build":
+        cube = build_cube_from_db(engine, args.start, args.end, path=args.path)
+        print(f"Cube dibangun: {cube.start} s.d. {cube.end} ({cube.n_days} hari)")
+    else:
+        n = append_cube_from_db(engine, path=args.path, since=args.since)
+        print(f"{n} sel stasiun-hari ditulis.")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
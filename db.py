@@ -0,0 +1,117 @@
+# db.py
+#
+# Utilitas database tanpa Streamlit, dipakai oleh job terjadwal / CLI
+# (mis. pembangunan cube). Aplikasi Streamlit tetap memakai get_db_engine() di utils.py.
+
+import io
+import os
+
+import pandas as pd
+
+
+def create_engine_from_url(db_url: str = None):
+    """
+    Membuat SQLAlchemy engine dari URL eksplisit, environment variable DATABASE_URL,
+    atau config.DB_URL (urutan prioritas tersebut). SQLAlchemy di-import di sini agar
+    clean_timestamp_series (dipakai ingest saat start aplikasi) tidak ikut memuatnya.
+    """
+    from sqlalchemy import create_engine
+
+    if not db_url:
+        db_url = os.environ.get("DATABASE_URL")
+    if not db_url:
+        try:
+            from config import DB_URL
+            db_url = DB_URL
+        except ImportError:
+            raise RuntimeError(
+                "URL database tidak ditemukan. Isi --db-url, environment DATABASE_URL, atau DB_URL di config.py."
+            )
+
+    return create_engine(
+        db_url,
+        pool_pre_ping=True,
+        pool_recycle=300,
+        connect_args={"connect_timeout": 10}
+    )
+
+
+def clean_timestamp_series(s: pd.Series) -> pd.Series:
+    """Membuang suffix zona waktu (+07, +07:00, Z) lalu parse ke datetime naive."""
+    ts_clean = (
+        s.astype(str)
+        .str.replace(r'(\+\d{2}(:\d{2})?|Z)$', '', regex=True)
+        .str.strip()
+    )
+    return pd.to_datetime(ts_clean, format="mixed", errors="coerce")
+
+
+class RainfallCopySink:
+    """
+    Sink ingest streaming ke rainfall_data bergaya COPY: setiap chunk di-COPY ke tabel staging
+    sementara (memori klien terbatas satu chunk), lalu dipindahkan sekali dengan
+    INSERT ... SELECT ... ON CONFLICT DO NOTHING saat close(). Setiap file upload dibungkus
+    SAVEPOINT (begin_file / commit_file / rollback_file) sehingga file yang gagal di tengah
+    tidak meninggalkan chunk awalnya di staging.
+    """
+
+    COLS = ["POS HUJAN ID", "NAME", "DATA TIMESTAMP", "RAINFALL DAY MM"]
+
+    def __init__(self, engine, table: str = "rainfall_data"):
+        self.table = table
+        self.conn = engine.raw_connection()
+        self.cur = self.conn.cursor()
+        self.cur.execute(
+            'CREATE TEMP TABLE _rain_stage ("POS HUJAN ID" text, "NAME" text, '
+            '"DATA TIMESTAMP" timestamp, "RAINFALL DAY MM" double precision) ON COMMIT DROP'
+        )
+        self.staged = 0
+        self.file_staged = 0
+        self.closed = False
+
+    def begin_file(self):
+        self.cur.execute("SAVEPOINT ingest_file")
+        self.file_staged = 0
+
+    def commit_file(self):
+        self.cur.execute("RELEASE SAVEPOINT ingest_file")
+        self.file_staged = 0
+
+    def rollback_file(self):
+        self.cur.execute("ROLLBACK TO SAVEPOINT ingest_file")
+        self.staged -= self.file_staged
+        self.file_staged = 0
+
+    def write(self, chunk: pd.DataFrame):
+        df = chunk.reindex(columns=self.COLS)
+        df = df[df["DATA TIMESTAMP"].notna()]
+        df["RAINFALL DAY MM"] = pd.to_numeric(df["RAINFALL DAY MM"], errors="coerce")
+        buf = io.StringIO()
+        df.to_csv(buf, header=False, index=False, date_format="%Y-%m-%d %H:%M:%S")
+        buf.seek(0)
+        cols = ", ".join(f'"{c}"' for c in self.COLS)
+        self.cur.copy_expert(f"COPY _rain_stage ({cols}) FROM STDIN WITH (FORMAT csv)", buf)
+        self.staged += len(df)
+        self.file_staged += len(df)
+
+    def close(self) -> int:
+        """Memindahkan staging ke tabel tujuan; return jumlah baris baru."""
+        cols = ", ".join(f'"{c}"' for c in self.COLS)
+        try:
+            self.cur.execute(f"INSERT INTO {self.table} ({cols}) SELECT {cols} FROM _rain_stage ON CONFLICT DO NOTHING")
+            inserted = self.cur.rowcount
+            self.conn.commit()
+            return int(inserted)
+        finally:
+            self.conn.close()
+            self.closed = True
+
+    def abort(self):
+        """Membatalkan seluruh staging; no-op bila koneksi sudah ditutup (mis. close() gagal)."""
+        if self.closed:
+            return
+        try:
+            self.conn.rollback()
+        finally:
+            self.conn.close()
+            self.closed = True
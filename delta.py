@@ -0,0 +1,220 @@
+# delta.py
+#
+# Upload delta ke rainfall_data: hanya baris baru atau berubah yang dikirim. Untuk bulan-bulan
+# yang tersentuh upload, database mengembalikan hash isi ringkas per (pos, hari); hash yang sama
+# dihitung lokal dari representasi kanonik baris upload, lalu dibandingkan:
+#
+#   tidak ada di DB      -> insert
+#   hash berbeda         -> update + catatan audit (nilai lama -> baru) di rainfall_audit
+#   hash sama            -> tidak dikirim
+#   >1 baris di DB       -> tidak dikirim bila berbeda (dilaporkan; lihat qc_duplicates)
+#
+# Representasi kanonik: POS HUJAN ID | timestamp 'YYYY-MM-DD HH:MM:SS' | nilai dibulatkan 1 desimal
+# (string kosong untuk NULL), identik dengan ekspresi SQL di REMOTE_HASH_SQL: nilai float dibaca
+# dengan 15 digit signifikan lalu dibulatkan half-up seperti float8 -> numeric -> round() Postgres.
+# Bila satu pos-hari punya beberapa baris di DB, pembanding dan target update adalah satu baris
+# deterministik (timestamp terkecil, lalu ctid).
+
+import hashlib
+import io
+from decimal import ROUND_HALF_UP, Decimal
+
+import numpy as np
+import pandas as pd
+from sqlalchemy import text
+
+from ingest import parse_timestamps
+
+HASH_LEN = 16     # 64 bit pertama md5 (hex) cukup untuk membedakan versi satu pos-hari
+
+REMOTE_HASH_SQL = """
+    SELECT DISTINCT ON ("NAME", "DATA TIMESTAMP"::date)
+           "NAME" AS name, "DATA TIMESTAMP"::date AS day,
+           left(md5(concat_ws('|',
+               COALESCE("POS HUJAN ID", ''),
+               to_char("DATA TIMESTAMP", 'YYYY-MM-DD HH24:MI:SS'),
+               COALESCE(round("RAINFALL DAY MM"::numeric, 1)::text, '')
+           )), :hash_len) AS h,
+           count(*) OVER (PARTITION BY "NAME", "DATA TIMESTAMP"::date) AS n_db
+    FROM rainfall_data
+    WHERE "DATA TIMESTAMP" >= :start AND "DATA TIMESTAMP" < :end
+    ORDER BY "NAME", "DATA TIMESTAMP"::date, "DATA TIMESTAMP", ctid
+"""
+
+AUDIT_DDL = """
+    CREATE TABLE IF NOT EXISTS rainfall_audit (
+        id bigserial PRIMARY KEY,
+        changed_at timestamptz NOT NULL DEFAULT now(),
+        "NAME" text NOT NULL,
+        "DATE" date NOT NULL,
+        "POS HUJAN ID" text,
+        old_timestamp timestamp,
+        new_timestamp timestamp,
+        old_value double precision,
+        new_value double precision,
+        source text
+    )
+"""
+
+STAGE_COLS = ["POS HUJAN ID", "NAME", "DATA TIMESTAMP", "RAINFALL DAY MM", "DAY", "action"]
+_ONE_DECIMAL = Decimal("0.1")
+
+
+def canonical_value(v) -> str:
+    """Nilai -> teks 1 desimal persis seperti round(float8::numeric, 1)::text di Postgres."""
+    if v is None or not np.isfinite(v):
+        return ""
+    d = Decimal(f"{v:.15g}").quantize(_ONE_DECIMAL, rounding=ROUND_HALF_UP)
+    return str(abs(d) if d == 0 else d)     # numeric Postgres tidak punya -0.0
+
+
+def prepare_upload_rows(df: pd.DataFrame) -> pd.DataFrame:
+    """
+    Baris upload -> satu baris per (NAME, DAY) dengan hash kanonik. Sanitasi sama dengan
+    insert_rainfall_data (timestamp tak terbaca dibuang, nilai numerik); duplikat pos-hari:
+    record pertama menang, seperti matriks harian.
+    """
+    out = pd.DataFrame({
+        "POS HUJAN ID": df["POS HUJAN ID"] if "POS HUJAN ID" in df.columns else None,
+        "NAME": df["NAME"].astype("string"),
+        "DATA TIMESTAMP": parse_timestamps(df["DATA TIMESTAMP"]),
+        "RAINFALL DAY MM": pd.to_numeric(df["RAINFALL DAY MM"], errors="coerce"),
+    })
+    out = out[out["DATA TIMESTAMP"].notna() & out["NAME"].notna()].copy()
+    out["DAY"] = out["DATA TIMESTAMP"].dt.normalize()
+    out = out.drop_duplicates(["NAME", "DAY"], keep="first").reset_index(drop=True)
+
+    pos = out["POS HUJAN ID"].astype("string").fillna("")
+    ts = out["DATA TIMESTAMP"].dt.strftime("%Y-%m-%d %H:%M:%S")
+    val = out["RAINFALL DAY MM"].map(canonical_value).astype("string")
+    canon = pos.str.cat([ts, val], sep="|")
+    out["h"] = [hashlib.md5(s.encode("utf-8")).hexdigest()[:HASH_LEN] for s in canon]
+    return out
+
+
+def touched_months(rows: pd.DataFrame) -> list:
+    """Rentang [awal, akhir) per bulan yang muncul di upload."""
+    months = rows["DAY"].dt.to_period("M").unique()
+    return [(m.start_time, (m + 1).start_time) for m in sorted(months)]
+
+
+def fetch_remote_hashes(conn, months) -> pd.DataFrame:
+    """
+    Hash per (NAME, DAY) dari database untuk bulan-bulan tersentuh (kunci + 16 karakter hash dari
+    baris deterministik pertama + jumlah baris DB pos-hari tersebut di n_db).
+    """
+    cols = ["NAME", "DAY", "h", "n_db"]
+    parts = []
+    for start, end in months:
+        res = conn.execute(text(REMOTE_HASH_SQL), {"start": start, "end": end, "hash_len": HASH_LEN})
+        parts.append(pd.DataFrame(res.fetchall(), columns=cols))
+    remote = pd.concat(parts, ignore_index=True) if parts else pd.DataFrame(columns=cols)
+    remote["DAY"] = pd.to_datetime(remote["DAY"])
+    return remote
+
+
+def diff_rows(local: pd.DataFrame, remote: pd.DataFrame) -> pd.DataFrame:
+    """
+    Menandai setiap baris lokal: insert / update / unchanged / duplicate_db (kolom action).
+    Pos-hari yang di DB sudah punya beberapa baris tidak diperbarui (target update ambigu).
+    """
+    merged = local.merge(remote.rename(columns={"h": "h_db"}), on=["NAME", "DAY"], how="left")
+    merged["action"] = np.where(
+        merged["h_db"].isna(), "insert",
+        np.where(merged["h_db"] == merged["h"], "unchanged",
+                 np.where(merged["n_db"].fillna(1) > 1, "duplicate_db", "update"))
+    )
+    return merged
+
+
+def apply_delta(engine, diff: pd.DataFrame, source: str = "") -> dict:
+    """
+    Mengirim baris insert/update dalam satu transaksi (COPY ke staging, lalu INSERT dan
+    UPDATE + audit berbasis set). Return dict: inserted, updated, unchanged, changes (DataFrame
+    nilai lama -> baru untuk baris yang diperbarui), skipped_duplicates (pos-hari ganda di DB yang
+    tidak diperbarui).
+    """
+    send = diff[diff["action"].isin(["insert", "update"])]
+    result = {
+        "inserted": 0,
+        "updated": 0,
+        "unchanged": int((diff["action"] == "unchanged").sum()),
+        "skipped_duplicates": diff.loc[diff["action"] == "duplicate_db", ["NAME", "DAY", "n_db"]].reset_index(drop=True),
+        "changes": pd.DataFrame(columns=["NAME", "DATE", "old_value", "new_value", "old_timestamp", "new_timestamp"]),
+    }
+    if send.empty:
+        return result
+
+    conn = engine.raw_connection()
+    try:
+        cur = conn.cursor()
+        cur.execute(AUDIT_DDL)
+        cur.execute(
+            'CREATE TEMP TABLE _delta_stage ("POS HUJAN ID" text, "NAME" text, "DATA TIMESTAMP" timestamp, '
+            '"RAINFALL DAY MM" double precision, "DAY" date, action text) ON COMMIT DROP'
+        )
+        buf = io.StringIO()
+        send[STAGE_COLS].to_csv(buf, header=False, index=False, date_format="%Y-%m-%d %H:%M:%S")
+        buf.seek(0)
+        cols = ", ".join(f'"{c}"' if c != "action" else c for c in STAGE_COLS)
+        cur.copy_expert(f"COPY _delta_stage ({cols}) FROM STDIN WITH (FORMAT csv)", buf)
+
+        cur.execute("""
+            INSERT INTO rainfall_data ("POS HUJAN ID", "NAME", "DATA TIMESTAMP", "RAINFALL DAY MM")
+            SELECT "POS HUJAN ID", "NAME", "DATA TIMESTAMP", "RAINFALL DAY MM"
+            FROM _delta_stage WHERE action = 'insert'
+            ON CONFLICT DO NOTHING
+        """)
+        result["inserted"] = int(cur.rowcount)
+
+        # CTE 'target' memilih tepat satu baris per pos-hari (urutan sama dengan REMOTE_HASH_SQL) dan
+        # membaca snapshot sebelum UPDATE sehingga nilai lama bisa diaudit tanpa join ganda
+        cur.execute("""
+            WITH target AS (
+                SELECT DISTINCT ON (r."NAME", r."DATA TIMESTAMP"::date)
+                       r.ctid AS rid, s."NAME", s."DAY" AS day,
+                       r."DATA TIMESTAMP" AS old_ts, r."RAINFALL DAY MM" AS old_v
+                FROM rainfall_data r
+                JOIN _delta_stage s ON s.action = 'update' AND r."NAME" = s."NAME" AND r."DATA TIMESTAMP"::date = s."DAY"
+                ORDER BY r."NAME", r."DATA TIMESTAMP"::date, r."DATA TIMESTAMP", r.ctid
+            ), upd AS (
+                UPDATE rainfall_data r
+                SET "POS HUJAN ID" = s."POS HUJAN ID", "DATA TIMESTAMP" = s."DATA TIMESTAMP",
+                    "RAINFALL DAY MM" = s."RAINFALL DAY MM"
+                FROM target t
+                JOIN _delta_stage s ON s.action = 'update' AND s."NAME" = t."NAME" AND s."DAY" = t.day
+                WHERE r.ctid = t.rid
+                RETURNING t."NAME", t.day, r."POS HUJAN ID", t.old_ts, r."DATA TIMESTAMP" AS new_ts,
+                          t.old_v, r."RAINFALL DAY MM" AS new_v
+            )
+            INSERT INTO rainfall_audit ("NAME", "DATE", "POS HUJAN ID", old_timestamp, new_timestamp,
+                                        old_value, new_value, source)
+            SELECT "NAME", day, "POS HUJAN ID", old_ts, new_ts, old_v, new_v, %s
+            FROM upd
+            RETURNING "NAME", "DATE", old_value, new_value, old_timestamp, new_timestamp
+        """, (source,))
+        changes = cur.fetchall()
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        conn.close()
+
+    result["changes"] = pd.DataFrame(changes, columns=list(result["changes"].columns))
+    result["updated"] = len(result["changes"])
+    return result
+
+
+def delta_upload(engine, df: pd.DataFrame, source: str = "") -> dict:
+    """Upload delta lengkap: hash lokal, hash DB bulan tersentuh, diff, kirim. Tambah kunci 'diff'."""
+    local = prepare_upload_rows(df)
+    if local.empty:
+        return {"inserted": 0, "updated": 0, "unchanged": 0, "changes": pd.DataFrame(),
+                "skipped_duplicates": pd.DataFrame(columns=["NAME", "DAY", "n_db"]), "diff": local}
+    with engine.connect() as conn:
+        remote = fetch_remote_hashes(conn, touched_months(local))
+    diff = diff_rows(local, remote)
+    result = apply_delta(engine, diff, source=source)
+    result["diff"] = diff
+    return result
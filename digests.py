@@ -0,0 +1,211 @@
+# digests.py
+#
+# Digest isi per (stasiun, bulan) untuk invalidasi cache yang halus. Satu hash per pos per bulan
+# dari representasi kanonik seluruh record bulan itu (sama dengan delta.py: POS HUJAN ID |
+# timestamp | nilai 1 desimal, diurutkan per timestamp):
+#
+#   - tabel rainfall_digest di database dipelihara oleh jalur ingest (push / delta / streaming),
+#     sehingga Run bisa memakai token digest bulan-bulan lookback sebagai kunci cache query
+#     alih-alih TTL;
+#   - digest yang sama dihitung lokal dari record bulan target untuk cache hasil per stasiun
+#     (StationResultCache): hanya stasiun yang digest-nya berubah yang dihitung ulang.
+
+import hashlib
+import os
+
+import numpy as np
+import pandas as pd
+from sqlalchemy import text
+
+from config import CACHE_DIR
+from delta import canonical_value
+from ingest import parse_timestamps
+from rainfall import map_station_name
+
+DEFAULT_STATION_CACHE_DIR = os.path.join(CACHE_DIR, "station_cache")
+
+DIGEST_DDL = """
+    CREATE TABLE IF NOT EXISTS rainfall_digest (
+        station text NOT NULL,
+        month date NOT NULL,
+        digest text NOT NULL,
+        n_rows integer NOT NULL,
+        updated_at timestamptz NOT NULL DEFAULT now(),
+        PRIMARY KEY (station, month)
+    )
+"""
+
+# Digest per NAME mentah; md5 atas baris kanonik terurut (identik dengan row_canonical di Python)
+REFRESH_DIGEST_SQL = """
+    INSERT INTO rainfall_digest (station, month, digest, n_rows, updated_at)
+    SELECT "NAME", date_trunc('month', "DATA TIMESTAMP")::date,
+           md5(string_agg(concat_ws('|',
+               COALESCE("POS HUJAN ID", ''),
+               to_char("DATA TIMESTAMP", 'YYYY-MM-DD HH24:MI:SS'),
+               COALESCE(round("RAINFALL DAY MM"::numeric, 1)::text, '')
+           ), ',' ORDER BY "DATA TIMESTAMP", "POS HUJAN ID")),
+           count(*), now()
+    FROM rainfall_data
+    WHERE "DATA TIMESTAMP" >= :start AND "DATA TIMESTAMP" < :end
+    GROUP BY 1, 2
+    ON CONFLICT (station, month) DO UPDATE
+        SET digest = EXCLUDED.digest, n_rows = EXCLUDED.n_rows, updated_at = now()
+        WHERE rainfall_digest.digest IS DISTINCT FROM EXCLUDED.digest
+"""
+
+PRUNE_DIGEST_SQL = """
+    DELETE FROM rainfall_digest d
+    WHERE d.month >= :start AND d.month < :end
+      AND NOT EXISTS (
+          SELECT 1 FROM rainfall_data r
+          WHERE r."NAME" = d.station AND r."DATA TIMESTAMP" >= d.month
+            AND r."DATA TIMESTAMP" < d.month + interval '1 month'
+      )
+"""
+
+FETCH_DIGEST_SQL = "SELECT station, digest FROM rainfall_digest WHERE month = :month"
+
+
+# ============================================================
+# Digest lokal
+# ============================================================
+
+def row_canonical(df: pd.DataFrame) -> pd.Series:
+    """Representasi kanonik per record (sama dengan ekspresi SQL digest / delta)."""
+    pos = (df["POS HUJAN ID"] if "POS HUJAN ID" in df.columns else pd.Series("", index=df.index))
+    ts = parse_timestamps(df["DATA TIMESTAMP"])
+    # Pembulatan half-up identik dengan round(::numeric, 1) Postgres (Series.round = half-even biner)
+    val = pd.to_numeric(df["RAINFALL DAY MM"], errors="coerce").astype(np.float64).map(canonical_value)
+    return (
+        pos.astype("string").fillna("")
+        .str.cat([ts.dt.strftime("%Y-%m-%d %H:%M:%S").fillna(""), val.astype("string")], sep="|")
+    )
+
+
+def _combine_by_station(raw: pd.DataFrame) -> pd.Series:
+    """Digest per NAME mentah -> per stasiun header (alias digabung dengan hash terurut)."""
+    if raw.empty:
+        return pd.Series(dtype=object)
+    raw = raw.assign(station=map_station_name(raw["NAME"]).to_numpy())
+    grouped = raw.sort_values("digest").groupby("station")["digest"].agg(list)
+    return grouped.map(lambda d: d[0] if len(d) == 1 else hashlib.md5("|".join(d).encode()).hexdigest())
+
+
+def station_month_digests(df_month: pd.DataFrame) -> pd.Series:
+    """Digest per stasiun (index = nama header) dari record long-format satu bulan."""
+    if df_month is None or df_month.empty:
+        return pd.Series(dtype=object)
+    tmp = pd.DataFrame({
+        "NAME": df_month["NAME"].astype(str).to_numpy(),
+        "ts": parse_timestamps(df_month["DATA TIMESTAMP"]).to_numpy(),
+        "pos": (df_month["POS HUJAN ID"].astype("string").fillna("").to_numpy()
+                if "POS HUJAN ID" in df_month.columns else ""),
+        "canon": row_canonical(df_month).to_numpy(),
+    }).sort_values(["NAME", "ts", "pos"], kind="stable")
+    raw = tmp.groupby("NAME", sort=False)["canon"].agg(",".join).reset_index()
+    raw["digest"] = [hashlib.md5(s.encode("utf-8")).hexdigest() for s in raw["canon"]]
+    return _combine_by_station(raw[["NAME", "digest"]])
+
+
+def digest_token(digests: pd.Series) -> str:
+    """Satu token untuk seluruh bulan (kunci cache query); berubah bila digest stasiun mana pun berubah."""
+    if digests is None or len(digests) == 0:
+        return ""
+    s = digests.sort_index()
+    return hashlib.md5("|".join(f"{k}={v}" for k, v in s.items()).encode()).hexdigest()
+
+
+# ============================================================
+# Tabel digest di database (dipelihara jalur ingest)
+# ============================================================
+
+def months_between(start, end) -> list:
+    """Rentang [awal, akhir) setiap bulan antara dua tanggal (inklusif)."""
+    if start is None or end is None or pd.isna(start) or pd.isna(end):
+        return []
+    periods = pd.period_range(pd.Timestamp(start).to_period("M"), pd.Timestamp(end).to_period("M"), freq="M")
+    return [(p.start_time, (p + 1).start_time) for p in periods]
+
+
+def refresh_db_digests(engine, months) -> int:
+    """Menghitung ulang digest bulan-bulan tersentuh di sisi database; return jumlah baris digest berubah."""
+    changed = 0
+    with engine.begin() as conn:
+        conn.execute(text(DIGEST_DDL))
+        for start, end in months:
+            params = {"start": start, "end": end}
+            changed += conn.execute(text(REFRESH_DIGEST_SQL), params).rowcount or 0
+            changed += conn.execute(text(PRUNE_DIGEST_SQL), params).rowcount or 0
+    return int(changed)
+
+
+def fetch_db_digests(conn, year: int, month: int) -> pd.Series:
+    """Digest per stasiun header bulan target dari rainfall_digest; Series kosong bila tabel belum ada."""
+    try:
+        res = conn.execute(text(FETCH_DIGEST_SQL), {"month": pd.Timestamp(year=year, month=month, day=1).date()})
+        raw = pd.DataFrame(res.fetchall(), columns=["NAME", "digest"])
+    except Exception:
+        return pd.Series(dtype=object)
+    return _combine_by_station(raw)
+
+
+def range_digest_token(conn, start, end) -> str:
+    """
+    Token untuk seluruh bulan antara start dan end (mis. lookback timeseries Run): berubah bila
+    digest stasiun mana pun di bulan mana pun dalam rentang berubah; '' bila belum ada digest.
+    """
+    parts = []
+    for m0, _ in months_between(start, end):
+        token = digest_token(fetch_db_digests(conn, m0.year, m0.month))
+        if token:
+            parts.append(f"{m0:%Y-%m}={token}")
+    return hashlib.md5("|".join(parts).encode()).hexdigest() if parts else ""
+
+
+# ============================================================
+# Cache hasil per stasiun
+# ============================================================
+
+class StationResultCache:
+    """
+    Hasil per stasiun (satu baris per stasiun, kolom 'station') + digest saat dihitung, disimpan
+    sebagai pickle pandas. compute() hanya memanggil fungsi untuk stasiun yang digest-nya berubah
+    (atau belum pernah dihitung); baris lain dipakai ulang.
+    """
+
+    def __init__(self, key: str, cache_dir: str = DEFAULT_STATION_CACHE_DIR):
+        self.path = os.path.join(cache_dir, f"{key}.pkl")
+        self.state = None
+        if os.path.exists(self.path):
+            try:
+                self.state = pd.read_pickle(self.path)
+            except Exception:
+                self.state = None
+
+    def compute(self, stations, digests, func) -> tuple:
+        """
+        stations: urutan output; digests: Series/array digest per stasiun (selaras stations);
+        func(list stasiun) -> DataFrame dengan kolom 'station'. Return (DataFrame, jumlah dihitung ulang).
+        """
+        stations = [str(s) for s in stations]
+        digests = pd.Series(np.asarray(digests, dtype=object), index=stations)
+        old_rows, old_dig = (self.state["rows"], self.state["digests"]) if self.state else (None, None)
+
+        if old_rows is None:
+            stale = stations
+        else:
+            prev = old_dig.reindex(stations)
+            stale = [s for s, same in zip(stations, (prev == digests).to_numpy()) if not same or s not in old_rows.index]
+
+        if stale:
+            fresh = func(stale).set_index("station")
+            rows = fresh if old_rows is None else pd.concat([old_rows.drop(index=stale, errors="ignore"), fresh])
+            rows = rows.reindex(stations)
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            tmp = self.path + ".tmp"
+            pd.to_pickle({"rows": rows, "digests": digests}, tmp)
+            os.replace(tmp, self.path)
+            self.state = {"rows": rows, "digests": digests}
+        else:
+            rows = old_rows.reindex(stations)
+        return rows.rename_axis("station").reset_index(), len(stale)
@@ -0,0 +1,89 @@
+# gapfill.py
+#
+# Pengisian data kosong berbasis tetangga (inverse distance weighting). Matriks bobot
+# [stasiun target, stasiun donor] dibangun sekali dari koordinat (opsional dengan penalti beda
+# elevasi), lalu seluruh sel kosong dalam window diisi dengan satu perkalian matriks bermask:
+#
+#   isi[h, i] = sum_j W[i, j] * v[h, j] * ada[h, j] / sum_j W[i, j] * ada[h, j]
+#
+# Sel terisi dilacak dengan mask boolean [hari, stasiun] (ditampilkan dengan akhiran "*") dan
+# tidak dipakai untuk indeks kecuali diminta.
+
+import numpy as np
+import pandas as pd
+
+from qc_spatial import haversine_matrix
+
+IDW_POWER = 2.0
+IDW_RADIUS_KM = 30.0
+IDW_MAX_DONORS = 8
+MIN_DONORS = 2
+ELEV_SCALE_M = 300.0     # bobot dikali exp(-|dz| / ELEV_SCALE_M) bila penyesuaian elevasi aktif
+MIN_DIST_KM = 0.5        # cegah bobot tak hingga untuk pos berkoordinat (hampir) sama
+
+
+def build_idw_weights(coords: pd.DataFrame, power: float = IDW_POWER, radius_km: float = IDW_RADIUS_KM,
+                      max_donors: int = IDW_MAX_DONORS, use_elevation: bool = True) -> dict:
+    """
+    Matriks bobot IDW dari hasil prepare_station_coordinates (urutan HORIZONTAL_COLS).
+    Return dict: stations, W [n, n] float64 (diagonal 0, hanya max_donors donor terdekat dalam radius).
+    """
+    stations = coords["station"].astype(str).tolist()
+    dist = haversine_matrix(coords["lat"], coords["lon"])
+    np.fill_diagonal(dist, np.nan)
+    dist = np.where(np.isfinite(dist) & (dist <= radius_km), dist, np.inf)
+
+    with np.errstate(divide="ignore"):
+        W = 1.0 / np.maximum(dist, MIN_DIST_KM) ** power
+    W[~np.isfinite(dist)] = 0.0
+
+    if use_elevation and "elev_m" in coords.columns:
+        elev = pd.to_numeric(coords["elev_m"], errors="coerce").to_numpy(dtype=np.float64)
+        dz = np.abs(elev[:, None] - elev[None, :])
+        W *= np.where(np.isfinite(dz), np.exp(-dz / ELEV_SCALE_M), 1.0)
+
+    if max_donors and W.shape[1] > max_donors:
+        kth = np.partition(W, -max_donors, axis=1)[:, -max_donors][:, None]
+        W = np.where(W >= kth, W, 0.0)
+
+    return {"stations": stations, "W": W, "power": power, "radius_km": radius_km, "use_elevation": use_elevation}
+
+
+def idw_fill(values: np.ndarray, weights: dict, min_donors: int = MIN_DONORS) -> tuple:
+    """
+    Mengisi sel NaN dengan rata-rata berbobot donor yang ada pada hari yang sama.
+    Return (nilai terisi [hari, stasiun], mask sel yang diisi).
+    """
+    v = np.asarray(values, dtype=np.float64)
+    W = weights["W"]
+    have = np.isfinite(v)
+
+    num = np.where(have, v, 0.0) @ W.T
+    den = have.astype(np.float64) @ W.T
+    n_donor = have.astype(np.float64) @ (W > 0).T
+
+    with np.errstate(invalid="ignore", divide="ignore"):
+        est = np.round(num / den, 1)
+    fill = ~have & (den > 0) & (n_donor >= min_donors)
+    return np.where(fill, est, v), fill
+
+
+def fill_window(wide_num_win: pd.DataFrame, weights: dict, min_donors: int = MIN_DONORS) -> tuple:
+    """Versi DataFrame (kolom TGL + stasiun) dari idw_fill; return (wide terisi, mask DataFrame)."""
+    stations = weights["stations"]
+    filled, mask = idw_fill(wide_num_win[stations].to_numpy(dtype=np.float64), weights, min_donors)
+    wide_filled = wide_num_win.copy()
+    wide_filled[stations] = filled
+    mask_df = pd.DataFrame(mask, index=wide_num_win.index, columns=stations)
+    return wide_filled, mask_df
+
+
+def mark_filled_bmkg(wide_bmkg_out: pd.DataFrame, wide_filled: pd.DataFrame, mask_df: pd.DataFrame) -> pd.DataFrame:
+    """Menulis nilai terisi (sel True di mask_df) ke tabel format BMKG dengan akhiran '*'; index = TGL."""
+    out = wide_bmkg_out.copy()
+    tgl = wide_filled["TGL"].astype(int).to_numpy()
+    for col in mask_df.columns[mask_df.any(axis=0).to_numpy()]:
+        sel = mask_df[col].to_numpy()
+        vals = wide_filled[col].to_numpy()[sel]
+        out.loc[tgl[sel], col] = ["-*" if v == 0 else f"{v:g}*" for v in vals]
+    return out
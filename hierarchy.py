@@ -0,0 +1,149 @@
+# hierarchy.py
+#
+# Rekap wilayah administrasi dari struktur kode POS HUJAN ID (mis. 52010101a):
+#
+#   52 | 01 | 01 | 01 a
+#   provinsi | kabupaten/kota | kecamatan | nomor pos + sufiks
+#
+# Keanggotaan stasiun -> wilayah per level disimpan sebagai matriks sparse [stasiun, wilayah]
+# (satu stasiun tepat satu wilayah). Statistik harian per stasiun seluruh window dihitung sekaligus
+# lewat matriks window [window, hari], lalu digulung ke wilayah dengan satu perkalian sparse;
+# maksimum memakai reduceat atas stasiun yang diurutkan per wilayah (tanpa loop per grup).
+
+import numpy as np
+import pandas as pd
+
+from config import BMKG_INTENSITY_BINS, REGENCY_NAMES
+
+ADMIN_LEVELS = {"kabupaten": 4, "kecamatan": 6}     # level -> panjang prefiks kode
+ADMIN_LEVEL_LABELS = {"kabupaten": "Kabupaten/Kota", "kecamatan": "Kecamatan"}
+POS_ID_PATTERN = r"^\s*(\d{6})"
+EXTREME_MM = BMKG_INTENSITY_BINS[-1]                 # > 150 mm/hari: kelas ekstrem BMKG
+
+
+def _group_name(level: str, code: str) -> str:
+    if level == "kabupaten":
+        return REGENCY_NAMES.get(code, code)
+    return f"Kec. {code}"
+
+
+def build_admin_index(coords: pd.DataFrame) -> dict:
+    """
+    Indeks hierarki dari hasil prepare_station_coordinates (urutan HORIZONTAL_COLS).
+    Return dict: stations, levels {level: {codes, names, members, group_of [n] (-1 = tanpa kode),
+    M csr [stasiun, wilayah]}}.
+    """
+    from scipy import sparse   # dimuat saat indeks pertama dibangun, bukan saat import halaman
+
+    stations = coords["station"].astype(str).tolist()
+    base = coords["pos_id"].astype("string").str.extract(POS_ID_PATTERN, expand=False)
+
+    levels = {}
+    for level, n in ADMIN_LEVELS.items():
+        code = base.str.slice(0, n)
+        codes = sorted(code.dropna().unique().tolist())
+        group_of = pd.Index(codes).get_indexer(code.fillna("")).astype(np.int32)
+        has = group_of >= 0
+        M = sparse.csr_matrix(
+            (np.ones(int(has.sum())), (np.nonzero(has)[0], group_of[has])),
+            shape=(len(stations), len(codes)),
+        )
+        members = (
+            pd.Series(np.asarray(stations)[has]).groupby(group_of[has]).agg(", ".join)
+            .reindex(range(len(codes)), fill_value="").tolist()
+        )
+        levels[level] = {
+            "codes": codes,
+            "names": [_group_name(level, c) for c in codes],
+            "members": members,
+            "group_of": group_of,
+            "M": M,
+        }
+    return {"stations": stations, "levels": levels}
+
+
+def _group_max(values: np.ndarray, group_of: np.ndarray, n_groups: int) -> np.ndarray:
+    """Maksimum kolom per grup [baris, grup] lewat reduceat atas kolom terurut grup; NaN bila kosong."""
+    out = np.full((values.shape[0], n_groups), -np.inf)
+    has = group_of >= 0
+    if not has.any():
+        return np.full_like(out, np.nan)
+    order = np.nonzero(has)[0][np.argsort(group_of[has], kind="stable")]
+    g_sorted = group_of[order]
+    starts = np.r_[0, np.nonzero(np.diff(g_sorted))[0] + 1]
+    out[:, g_sorted[starts]] = np.maximum.reduceat(values[:, order], starts, axis=1)
+    return np.where(np.isfinite(out), out, np.nan)
+
+
+def rollup_windows(values: np.ndarray, tgl, windows: dict, index: dict, level: str,
+                   heavy_thr: float, extreme_mm: float = EXTREME_MM) -> dict:
+    """
+    values [hari, stasiun] (urutan index['stations']) + nomor TGL per baris + {key: (awal, akhir)}
+    -> {key: DataFrame rekap per wilayah}. Seluruh window dihitung dalam satu lintasan.
+    """
+    lv = index["levels"][level]
+    v = np.asarray(values, dtype=np.float64)
+    have = np.isfinite(v)
+    v0 = np.where(have, v, 0.0)
+    tgl = np.asarray(tgl, dtype=np.int64)
+
+    keys = list(windows)
+    D = np.array([(tgl >= int(s)) & (tgl <= int(e)) for s, e in windows.values()], dtype=np.float64)
+    n_days = D.sum(axis=1)
+
+    # Statistik per (window, stasiun)
+    st_sum = D @ v0
+    st_cnt = D @ have
+    st_heavy = D @ (have & (v0 >= heavy_thr))
+    st_ext = D @ (have & (v0 > extreme_mm))
+    st_max = np.where((D[:, :, None] > 0) & have[None], v0[None], -np.inf).max(axis=1)
+    reported = st_cnt > 0
+
+    # Gulung ke wilayah: X [window, stasiun] @ M [stasiun, wilayah]
+    M = lv["M"]
+
+    def roll(x):
+        return np.asarray(M.T @ np.asarray(x, dtype=np.float64).T).T
+
+    n_members = np.asarray(M.sum(axis=0)).ravel()
+    n_rep = roll(reported)
+    cells = roll(st_cnt)
+    g_heavy = roll(st_heavy)
+    g_ext = roll(st_ext)
+    g_sum = roll(st_sum)
+    g_tot = roll(np.where(reported, st_sum, 0.0))
+    g_max = _group_max(np.where(reported, st_max, -np.inf), lv["group_of"], len(lv["codes"]))
+
+    with np.errstate(invalid="ignore", divide="ignore"):
+        mean_total = np.where(n_rep > 0, g_tot / n_rep, np.nan)
+        mean_day = np.where(cells > 0, g_sum / cells, np.nan)
+        completeness = 100.0 * cells / (n_members[None, :] * n_days[:, None])
+
+    out = {}
+    for w, key in enumerate(keys):
+        out[key] = pd.DataFrame({
+            "kode": lv["codes"],
+            "wilayah": lv["names"],
+            "n_stasiun": n_members.astype(int),
+            "n_melapor": n_rep[w].astype(int),
+            "total_mm_rata2": np.round(mean_total[w], 1),
+            "mean_mm_per_hari": np.round(mean_day[w], 1),
+            "max_mm": np.round(g_max[w], 1),
+            "completeness_pct": np.round(completeness[w], 1),
+            "n_hari_lebat": g_heavy[w].astype(int),
+            "n_hari_ekstrem": g_ext[w].astype(int),
+            "stasiun": lv["members"],
+        })
+    return out
+
+
+def broadcast_to_stations(rollup: pd.DataFrame, index: dict, level: str, cols) -> pd.DataFrame:
+    """Nilai rekap wilayah disalin ke setiap stasiun anggotanya (urutan index['stations'])."""
+    lv = index["levels"][level]
+    g = lv["group_of"]
+    src = rollup.set_index("kode").reindex(lv["codes"])
+    out = pd.DataFrame({"station": index["stations"], "wilayah": np.asarray(lv["names"] + [None], dtype=object)[g]})
+    for c in cols:
+        vals = np.append(src[c].to_numpy(dtype=np.float64), np.nan)
+        out[c] = vals[g]
+    return out
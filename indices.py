@@ -0,0 +1,103 @@
+# indices.py
+#
+# Mesin indeks presipitasi ETCCDI + kelas intensitas BMKG dalam satu pass vektor
+# atas matriks window [hari, stasiun]. Dipanggil per window pada setiap Run.
+
+import warnings
+
+import numpy as np
+import pandas as pd
+
+from config import BMKG_INTENSITY_BINS, BMKG_INTENSITY_CLASSES, HORIZONTAL_COLS
+
+WET_DAY_MM = 1.0
+
+# Kolom hasil -> label tampilan (dipakai tabel Hasil dan layer Peta)
+PRECIP_INDEX_LABELS = {
+    "Rx1day": "Rx1day (mm)",
+    "Rx5day": "Rx5day (mm)",
+    "R10mm": "R10mm (hari)",
+    "R20mm": "R20mm (hari)",
+    "R50mm": "R50mm (hari)",
+    "SDII": "SDII (mm/hari hujan)",
+    "PRCPTOT": "PRCPTOT (mm)",
+    "R95p": "R95p (mm)",
+    "R99p": "R99p (mm)",
+}
+INTENSITY_COLS = [f"n_{c}" for c in BMKG_INTENSITY_CLASSES]
+
+
+def station_wet_percentiles(values: np.ndarray, qs=(95, 99), wet_thr: float = WET_DAY_MM) -> dict:
+    """
+    Persentil hari basah (>= wet_thr) per stasiun dari timeseries historis [hari, stasiun].
+    Return {q: array[n_stasiun]} (NaN untuk stasiun tanpa hari basah).
+    """
+    v = np.asarray(values, dtype=np.float64)
+    wet = np.where(v >= wet_thr, v, np.nan)
+    with warnings.catch_warnings():
+        warnings.simplefilter("ignore", category=RuntimeWarning)
+        pct = np.nanpercentile(wet, list(qs), axis=0)
+    return {q: pct[i] for i, q in enumerate(qs)}
+
+
+def _rolling_max_sum(filled: np.ndarray, valid: np.ndarray, k: int) -> np.ndarray:
+    """Maksimum jumlah k hari berurutan per stasiun; hanya jendela dengan k hari valid."""
+    n_days, n_st = filled.shape
+    if n_days < k:
+        return np.full(n_st, np.nan)
+    cs = np.vstack([np.zeros((1, n_st)), np.cumsum(filled, axis=0)])
+    cv = np.vstack([np.zeros((1, n_st), dtype=np.int32), np.cumsum(valid, axis=0, dtype=np.int32)])
+    sums = cs[k:] - cs[:-k]
+    full = (cv[k:] - cv[:-k]) == k
+    sums = np.where(full, sums, -np.inf)
+    out = sums.max(axis=0)
+    return np.where(np.isfinite(out), out, np.nan)
+
+
+def compute_precip_indices(values: np.ndarray, p95=None, p99=None, stations=None, wet_thr: float = WET_DAY_MM) -> pd.DataFrame:
+    """
+    Menghitung Rx1day, Rx5day, R10mm, R20mm, R50mm, SDII, PRCPTOT, R95p, R99p dan jumlah hari per
+    kelas intensitas BMKG (ringan/sedang/lebat/sangat lebat/ekstrem) untuk matriks [hari, stasiun].
+    p95/p99 adalah persentil hari basah per stasiun (lihat station_wet_percentiles); bila None,
+    R95p/R99p bernilai NaN.
+    """
+    stations = list(stations) if stations is not None else list(HORIZONTAL_COLS)
+    v = np.asarray(values, dtype=np.float64)
+    n_st = v.shape[1]
+
+    valid = np.isfinite(v)
+    filled = np.where(valid, v, 0.0)
+    any_valid = valid.any(axis=0)
+    wet = valid & (filled >= wet_thr)
+    n_wet = wet.sum(axis=0)
+    prcptot = np.where(wet, filled, 0.0).sum(axis=0)
+
+    with np.errstate(invalid="ignore", divide="ignore"):
+        sdii = np.where(n_wet > 0, prcptot / n_wet, np.nan)
+
+    def _exceed_sum(pct):
+        if pct is None:
+            return np.full(n_st, np.nan)
+        pct = np.asarray(pct, dtype=np.float64)
+        over = wet & (filled > pct[None, :])
+        return np.where(np.isfinite(pct), np.where(over, filled, 0.0).sum(axis=0), np.nan)
+
+    # Kelas intensitas: 0 = di bawah 0.5 mm, 1..5 = ringan..ekstrem
+    cls = np.where(valid, np.digitize(filled, BMKG_INTENSITY_BINS), 0)
+    class_counts = (cls[:, :, None] == np.arange(1, len(BMKG_INTENSITY_BINS) + 1)).sum(axis=0)
+
+    out = pd.DataFrame({
+        "station": stations,
+        "Rx1day": np.where(any_valid, np.where(valid, v, -np.inf).max(axis=0), np.nan),
+        "Rx5day": _rolling_max_sum(filled, valid, 5),
+        "R10mm": (valid & (filled >= 10.0)).sum(axis=0),
+        "R20mm": (valid & (filled >= 20.0)).sum(axis=0),
+        "R50mm": (valid & (filled >= 50.0)).sum(axis=0),
+        "SDII": sdii,
+        "PRCPTOT": np.where(any_valid, prcptot, np.nan),
+        "R95p": np.where(any_valid, _exceed_sum(p95), np.nan),
+        "R99p": np.where(any_valid, _exceed_sum(p99), np.nan),
+    })
+    for i, col in enumerate(INTENSITY_COLS):
+        out[col] = class_counts[:, i]
+    return out
@@ -0,0 +1,338 @@
+# ingest.py
+#
+# Pembacaan CSV upload curah hujan (format vertikal POS HUJAN) tanpa dependensi Streamlit.
+# Encoding dan delimiter ditebak sekali dari potongan awal file, lalu file di-parse satu kali
+# dengan engine C (atau pyarrow bila terpasang) dan dtype eksplisit untuk kolom wajib.
+# Nilai curah hujan dibaca sebagai teks agar QC format (INVALID_FORMAT) tetap melihat nilai mentah.
+# Upload banyak file di-parse, dinormalisasi, dan divalidasi paralel (thread pool); error dan
+# waktu per file dikumpulkan dalam laporan ingest. Mode streaming membaca CSV / .gz / .zip per
+# chunk berukuran tetap dan meneruskan tiap chunk bersih ke sink (COPY database atau builder
+# matriks harian), sehingga memori tetap terbatas berapa pun ukuran file.
+
+import csv
+import gzip
+import importlib.util
+import io
+import os
+import time
+import zipfile
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+from db import clean_timestamp_series
+from rainfall import build_daily_matrix, normalize_station_name
+
+REQUIRED_COLS = ["NAME", "DATA TIMESTAMP", "RAINFALL DAY MM"]
+RAW_DTYPES = {"POS HUJAN ID": str, "NAME": str, "DATA TIMESTAMP": str, "RAINFALL DAY MM": str}
+SNIFF_BYTES = 64 * 1024
+DELIMITERS = [",", ";", "\t", "|"]
+HAS_PYARROW = importlib.util.find_spec("pyarrow") is not None
+MAX_INGEST_WORKERS = 8
+CHUNK_ROWS = 200_000
+ARCHIVE_SUFFIXES = (".gz", ".zip")
+
+
+def _read_bytes(src) -> bytes:
+    """Isi file dari UploadedFile Streamlit, bytes, path, atau objek file biner."""
+    if isinstance(src, (bytes, bytearray)):
+        return bytes(src)
+    if isinstance(src, (str, os.PathLike)):
+        with open(src, "rb") as f:
+            return f.read()
+    if hasattr(src, "getvalue"):
+        return src.getvalue()
+    src.seek(0)
+    return src.read()
+
+
+def sniff_encoding(head: bytes) -> str:
+    """utf-8-sig bila ada BOM, utf-8 bila potongan awal valid, selain itu latin-1."""
+    if head.startswith(b"\xef\xbb\xbf"):
+        return "utf-8-sig"
+    try:
+        head.decode("utf-8")
+        return "utf-8"
+    except UnicodeDecodeError as e:
+        # Karakter multibyte terpotong di ujung sampel bukan berarti bukan utf-8
+        if e.start >= len(head) - 3:
+            return "utf-8"
+        return "latin-1"
+
+
+def sniff_delimiter(text: str) -> str:
+    """Delimiter dari baris-baris awal: kandidat dengan jumlah kolom konsisten (> 1) terbanyak."""
+    lines = [ln for ln in text.splitlines()[:50] if ln.strip()]
+    if len(lines) > 1:
+        lines = lines[:-1]          # baris terakhir sampel bisa terpotong
+    if not lines:
+        return ","
+    best, best_cols = ",", 1
+    for sep in DELIMITERS:
+        counts = {ln.count(sep) for ln in lines}
+        n = lines[0].count(sep)
+        if n + 1 > best_cols and len(counts) == 1:
+            best, best_cols = sep, n + 1
+    if best_cols > 1:
+        return best
+    try:
+        return csv.Sniffer().sniff("\n".join(lines), delimiters="".join(DELIMITERS)).delimiter
+    except csv.Error:
+        return ","
+
+
+def read_csv_robust(src, sep: str = None, encoding: str = None) -> pd.DataFrame:
+    """
+    Membaca CSV curah hujan (utf-8 / utf-8-sig / latin-1; pemisah , ; tab |) dalam satu kali parse.
+    Kolom wajib (dan POS HUJAN ID) dibaca sebagai teks; kolom lain mengikuti inferensi pandas.
+    """
+    if src is None:
+        return None
+    data = _read_bytes(src)
+    head = data[:SNIFF_BYTES]
+    encoding = encoding or sniff_encoding(head)
+    sep = sep or sniff_delimiter(head.decode(encoding, errors="replace"))
+
+    kwargs = dict(sep=sep, encoding=encoding, dtype=RAW_DTYPES)
+    if HAS_PYARROW and encoding.startswith("utf-8"):
+        try:
+            return pd.read_csv(io.BytesIO(data), engine="pyarrow", **kwargs)
+        except Exception:
+            pass
+    return pd.read_csv(io.BytesIO(data), engine="c", encoding_errors="replace", **kwargs)
+
+
+# ============================================================
+# Normalisasi & ingest multi-file
+# ============================================================
+
+def parse_timestamps(ts: pd.Series) -> pd.Series:
+    """DATA TIMESTAMP mentah -> datetime naif (sufiks zona waktu dibuang); NaT bila tidak terbaca."""
+    if pd.api.types.is_datetime64_any_dtype(ts):
+        return ts
+    return _map_unique(ts, clean_timestamp_series)
+
+
+def _map_unique(s: pd.Series, func) -> pd.Series:
+    """Menerapkan transformasi string hanya pada nilai unik (nama pos / timestamp sangat berulang)."""
+    codes, uniques = pd.factorize(s)
+    mapped = func(pd.Series(uniques))
+    out = mapped.take(codes.clip(min=0)).set_axis(s.index)
+    return out.where(codes >= 0)
+
+
+def _clean_chunk(df: pd.DataFrame, name: str) -> pd.DataFrame:
+    df["NAME"] = _map_unique(df["NAME"], normalize_station_name)
+    df["DATA TIMESTAMP"] = parse_timestamps(df["DATA TIMESTAMP"])
+    df["__source_file__"] = name
+    return df
+
+
+def parse_upload(src, name: str = None) -> tuple:
+    """
+    Membaca + menormalisasi satu file upload: spasi nama pos, timestamp, kolom __source_file__.
+    Return (DataFrame atau None, baris laporan). Tidak pernah melempar exception.
+    """
+    name = name or getattr(src, "name", None) or str(src)
+    report = {"file": name, "status": "ok", "rows": 0, "ts_invalid": 0, "stations": 0,
+              "start": None, "end": None, "Waktu (ms)": 0.0}
+    t0 = time.perf_counter()
+    try:
+        df = read_csv_robust(src)
+        missing = [c for c in REQUIRED_COLS if c not in df.columns]
+        if missing:
+            raise ValueError(f"kolom wajib tidak ditemukan: {missing}")
+        df = _clean_chunk(df, name)
+        ts = df["DATA TIMESTAMP"]
+        report.update({
+            "rows": len(df),
+            "ts_invalid": int(ts.isna().sum()),
+            "stations": int(df["NAME"].nunique()),
+            "start": ts.min(),
+            "end": ts.max(),
+        })
+    except Exception as e:
+        df = None
+        report["status"] = f"error: {e}"
+    report["Waktu (ms)"] = round(1000 * (time.perf_counter() - t0), 1)
+    return df, report
+
+
+def ingest_files(files, max_workers: int = None) -> tuple:
+    """
+    Parse + validasi banyak file upload secara paralel (thread pool; parser C melepas GIL).
+    Return (DataFrame gabungan atau None, laporan per file [file, status, rows, ts_invalid,
+    stations, start, end, Waktu (ms)]).
+    """
+    files = list(files or [])
+    if not files:
+        return None, pd.DataFrame()
+    workers = max_workers or min(MAX_INGEST_WORKERS, len(files), os.cpu_count() or 1)
+    if workers > 1:
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            results = list(pool.map(parse_upload, files))
+    else:
+        results = [parse_upload(f) for f in files]
+
+    frames = [df for df, _ in results if df is not None]
+    report = pd.DataFrame([r for _, r in results])
+    # Satu concat dalam urutan upload: setiap kolom gabungan dialokasikan sekali
+    return (pd.concat(frames, ignore_index=True) if frames else None), report
+
+
+# ============================================================
+# Ingest streaming (chunk) untuk file besar / terkompresi
+# ============================================================
+
+def _open_members(src, name: str):
+    """Yield (nama, stream biner seekable) untuk CSV polos, .gz, atau setiap CSV di dalam .zip."""
+    if isinstance(src, (str, os.PathLike)):
+        with open(src, "rb") as raw:
+            yield from _open_members(raw, name)
+        return
+    raw = src
+    raw.seek(0)
+    low = name.lower()
+    if low.endswith(".zip"):
+        with zipfile.ZipFile(raw) as zf:
+            for member in zf.namelist():
+                if member.lower().endswith(".csv") and not member.endswith("/"):
+                    with zf.open(member) as f:
+                        yield f"{name}/{member}", f
+    elif low.endswith(".gz"):
+        with gzip.GzipFile(fileobj=raw) as f:
+            yield name, f
+    else:
+        yield name, raw
+
+
+def iter_upload_chunks(src, name: str = None, chunksize: int = CHUNK_ROWS, required=REQUIRED_COLS):
+    """Yield (nama file/anggota arsip, chunk bersih) dari satu upload; sniff sekali per anggota."""
+    name = name or getattr(src, "name", None) or str(src)
+    for member, stream in _open_members(src, name):
+        head = stream.read(SNIFF_BYTES)
+        stream.seek(0)
+        encoding = sniff_encoding(head)
+        sep = sniff_delimiter(head.decode(encoding, errors="replace"))
+        reader = pd.read_csv(
+            stream, sep=sep, encoding=encoding, encoding_errors="replace", dtype=RAW_DTYPES,
+            engine="c", chunksize=chunksize,
+        )
+        with reader:
+            for chunk in reader:
+                missing = [c for c in required if c not in chunk.columns]
+                if missing:
+                    raise ValueError(f"kolom wajib tidak ditemukan: {missing}")
+                yield member, _clean_chunk(chunk, member)
+
+
+def _fold_first(old: pd.DataFrame, new: pd.DataFrame) -> pd.DataFrame:
+    """Menggabungkan dua matriks harian; nilai yang sudah ada (record lebih awal) menang."""
+    if old is None:
+        return new
+    idx = old.index.union(new.index)
+    a = old.reindex(idx).to_numpy(dtype=np.float64)
+    b = new.reindex(idx).to_numpy(dtype=np.float64)
+    return pd.DataFrame(np.where(np.isnan(a), b, a), index=idx, columns=new.columns)
+
+
+class DailyMatrixSink:
+    """
+    Sink streaming untuk Run: matriks harian (tanggal x HORIZONTAL_COLS) dilipat per chunk
+    (record pertama per pos-hari menang, seperti build_daily_matrix), ditambah record long-format
+    bulan target saja untuk build_outputs / QC. Chunk ditampung per file dan baru digabung saat
+    commit_file(), sehingga file yang gagal di tengah dibuang utuh seperti pada ingest_files.
+    """
+
+    def __init__(self, year: int, month: int):
+        self.year, self.month = int(year), int(month)
+        self.daily = None
+        self.month_parts = []
+        self.rollback_file()
+
+    def begin_file(self):
+        self.rollback_file()
+
+    def write(self, chunk: pd.DataFrame):
+        self.file_daily = _fold_first(self.file_daily, build_daily_matrix(chunk))
+        ts = chunk["DATA TIMESTAMP"]
+        in_month = (ts.dt.year == self.year) & (ts.dt.month == self.month)
+        if in_month.any():
+            self.file_month_parts.append(chunk[in_month])
+
+    def commit_file(self):
+        if self.file_daily is not None:
+            self.daily = _fold_first(self.daily, self.file_daily)
+        self.month_parts.extend(self.file_month_parts)
+        self.rollback_file()
+
+    def rollback_file(self):
+        self.file_daily, self.file_month_parts = None, []
+
+    def close(self) -> tuple:
+        """Return (record bulan target atau None, matriks harian kontinu)."""
+        daily = self.daily if self.daily is not None else build_daily_matrix(None)
+        if len(daily):
+            daily = daily.reindex(pd.date_range(daily.index.min(), daily.index.max(), freq="D"))
+        month = pd.concat(self.month_parts, ignore_index=True) if self.month_parts else None
+        return month, daily
+
+
+def _sink_call(sinks, method: str):
+    """Memanggil hook per file (begin_file / commit_file / rollback_file) pada sink yang memilikinya."""
+    for sink in sinks:
+        hook = getattr(sink, method, None)
+        if hook is not None:
+            hook()
+
+
+def stream_ingest(files, sinks, chunksize: int = CHUNK_ROWS, on_progress=None, required=REQUIRED_COLS) -> pd.DataFrame:
+    """
+    Membaca setiap upload per chunk dan meneruskan chunk ke semua sink (objek dengan write(chunk)).
+    on_progress(file, baris_total) dipanggil setiap chunk. Return laporan per file seperti ingest_files.
+
+    Sink boleh menyediakan begin_file() / commit_file() / rollback_file(): file yang gagal dibaca
+    di tengah (error parse/format) di-rollback sehingga chunk awalnya tidak ikut termuat, sama
+    seperti ingest_files yang menolak file utuh. Exception dari sink.write (mis. error database)
+    tidak dicatat sebagai status file melainkan diteruskan ke pemanggil.
+    """
+    reports, total = [], 0
+    for f in files or []:
+        name = getattr(f, "name", None) or str(f)
+        report = {"file": name, "status": "ok", "rows": 0, "ts_invalid": 0, "stations": 0,
+                  "start": None, "end": None, "Waktu (ms)": 0.0}
+        names = set()
+        t0 = time.perf_counter()
+        _sink_call(sinks, "begin_file")
+        chunks = iter_upload_chunks(f, name, chunksize, required=required)
+        try:
+            while True:
+                try:
+                    member, chunk = next(chunks)
+                except StopIteration:
+                    _sink_call(sinks, "commit_file")
+                    break
+                except Exception as e:
+                    _sink_call(sinks, "rollback_file")
+                    report.update({"status": f"error: {e}", "rows": 0, "ts_invalid": 0, "start": None, "end": None})
+                    names.clear()
+                    break
+                for sink in sinks:
+                    sink.write(chunk)
+                ts = chunk["DATA TIMESTAMP"]
+                names.update(chunk["NAME"].dropna().unique())
+                report["rows"] += len(chunk)
+                report["ts_invalid"] += int(ts.isna().sum())
+                if ts.notna().any():
+                    report["start"] = ts.min() if report["start"] is None else min(report["start"], ts.min())
+                    report["end"] = ts.max() if report["end"] is None else max(report["end"], ts.max())
+                total += len(chunk)
+                if on_progress is not None:
+                    on_progress(member, total)
+        finally:
+            chunks.close()
+        report["stations"] = len(names)
+        report["Waktu (ms)"] = round(1000 * (time.perf_counter() - t0), 1)
+        reports.append(report)
+    return pd.DataFrame(reports)
@@ -0,0 +1,127 @@
+# jobs.py
+#
+# Runner job latar belakang tanpa Streamlit untuk Run: fungsi berat dijalankan di thread pool
+# bersama satu proses server (dibagi semua sesi lewat st.cache_resource), sementara skrip
+# Streamlit hanya mengirim job lalu mem-poll status & progres per tahap. Rerun widget tidak lagi
+# membatalkan pekerjaan.
+#
+# Job identik (kunci = hash parameter Run + identitas data) dari pengguna mana pun tidak dihitung
+# dua kali: selama job masih berjalan, atau selesai kurang dari JOB_TTL_S detik lalu, submit()
+# mengembalikan job yang sama. Job gagal tidak dipakai ulang sehingga Run bisa dicoba lagi.
+
+import hashlib
+import json
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+JOB_WORKERS = 2
+JOB_TTL_S = 15 * 60      # job selesai tetap bisa diambil / dipakai ulang selama ini
+
+
+def job_key(**params) -> str:
+    """Hash stabil parameter Run (nilai non-JSON dikonversi ke string)."""
+    payload = json.dumps(params, sort_keys=True, default=str)
+    return hashlib.md5(payload.encode("utf-8")).hexdigest()
+
+
+class Job:
+    """Satu job: status (queued/running/done/error), tahap & progres 0..1, riwayat tahap, hasil."""
+
+    def __init__(self, key: str, label: str = ""):
+        self.id = uuid.uuid4().hex
+        self.key = key
+        self.label = label
+        self.status = "queued"
+        self.stage = "Menunggu antrean"
+        self.progress = 0.0
+        self.stages = []
+        self.result = None
+        self.error = None
+        self.submitted = time.time()
+        self.started = None
+        self.finished = None
+        self._lock = threading.Lock()
+
+    def update(self, stage: str, progress: float = None):
+        """Callback progres untuk fungsi job (aman dipanggil dari thread worker)."""
+        with self._lock:
+            now = time.time()
+            self.stages.append((now - (self.started or now), stage))
+            self.stage = stage
+            if progress is not None:
+                self.progress = min(1.0, max(self.progress, float(progress)))
+
+    @property
+    def done(self) -> bool:
+        return self.status in ("done", "error")
+
+    def snapshot(self) -> dict:
+        """Salinan status untuk ditampilkan (tanpa hasil)."""
+        with self._lock:
+            end = self.finished or time.time()
+            return {
+                "id": self.id,
+                "label": self.label,
+                "status": self.status,
+                "stage": self.stage,
+                "progress": self.progress,
+                "elapsed": end - (self.started or end),
+                "stages": list(self.stages),
+                "error": self.error,
+            }
+
+
+class JobRunner:
+    """Thread pool + registri job per proses dengan deduplikasi per kunci."""
+
+    def __init__(self, max_workers: int = JOB_WORKERS, ttl: float = JOB_TTL_S):
+        self.pool = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="segara-job")
+        self.ttl = float(ttl)
+        self.jobs = {}
+        self.by_key = {}
+        self._lock = threading.Lock()
+
+    def submit(self, key: str, func, label: str = "") -> tuple:
+        """
+        Menjalankan func(update) di latar belakang; update(tahap, progres) melaporkan kemajuan.
+        Return (Job, dibuat_baru). Job identik yang masih berjalan / baru selesai dipakai ulang.
+        """
+        with self._lock:
+            self._prune()
+            existing = self.jobs.get(self.by_key.get(key))
+            if existing is not None and existing.status != "error":
+                return existing, False
+            job = Job(key, label)
+            self.jobs[job.id] = job
+            self.by_key[key] = job.id
+        self.pool.submit(self._run, job, func)
+        return job, True
+
+    def get(self, job_id: str):
+        with self._lock:
+            return self.jobs.get(job_id)
+
+    def _run(self, job: Job, func):
+        job.started = time.time()
+        job.status = "running"
+        job.update("Mulai", 0.0)
+        try:
+            job.result = func(job.update)
+            job.update("Selesai", 1.0)
+            job.status = "done"
+        except Exception as e:
+            job.error = f"{type(e).__name__}: {e}" if not isinstance(e, ValueError) else str(e)
+            job.status = "error"
+        finally:
+            job.finished = time.time()
+
+    def _prune(self):
+        """Membuang job selesai yang lebih tua dari ttl (hasilnya ikut dilepas dari memori)."""
+        now = time.time()
+        stale = [jid for jid, j in self.jobs.items() if j.done and now - (j.finished or now) > self.ttl]
+        for jid in stale:
+            job = self.jobs.pop(jid)
+            if self.by_key.get(job.key) == jid:
+                del self.by_key[job.key]
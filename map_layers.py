@@ -0,0 +1,101 @@
+# map_layers.py
+#
+# Data layer peta tanpa Streamlit: tabel atribut stasiun per window (koordinat + seluruh metrik,
+# selaras urutan coords) dibangun sekali saat Run, pewarnaan titik lewat lookup colormap vektor,
+# dan payload layer (DataFrame terfilter + warna) yang bisa di-memo per (window, metrik, mode).
+
+import numpy as np
+import pandas as pd
+
+from config import SPI_SCALES
+from indices import INTENSITY_COLS, PRECIP_INDEX_LABELS
+from surface import apply_colormap, colormap_lut
+
+SUMMARY_COLS = (
+    ["total_mm", "max_mm", "tgl_max"] + list(PRECIP_INDEX_LABELS) + INTENSITY_COLS
+    + [f"SPI_{s}" for s in SPI_SCALES]
+    + ["normal_mean_mm", "anomaly_mm", "pct_of_normal"]
+)
+CDD_COLS = ["CDD_len", "CWD_len", "CDD_cur_len", "CWD_cur_len", "CH_max_mm", "CH_max_TGL"]
+BAD_COORD_FLAGS = ["MISSING_COORD", "OUT_OF_BOUNDS", "DUP_LATLON"]
+
+QC_COORD_COLORS = {
+    "OK": [30, 160, 60, 190],
+    "MISSING_COORD": [180, 180, 180, 160],
+    "OUT_OF_BOUNDS": [255, 140, 0, 190],
+    "DUP_LATLON": [220, 60, 60, 190],
+}
+QC_OTHER_COLOR = [140, 140, 140, 170]
+NAN_COLOR = (160, 160, 160, 180)
+POINT_LUT = colormap_lut(alpha=190)
+
+
+def _by_station(df: pd.DataFrame, cols, stations: pd.Series) -> pd.DataFrame:
+    """Kolom `cols` dari df (kunci station) disejajarkan ke urutan `stations` tanpa merge berulang."""
+    if not isinstance(df, pd.DataFrame) or df.empty or "station" not in df.columns:
+        return pd.DataFrame(index=range(len(stations)), columns=list(cols))
+    keep = [c for c in cols if c in df.columns]
+    src = df.drop_duplicates("station").set_index("station")[keep]
+    return src.reindex(stations.to_numpy()).reset_index(drop=True)
+
+
+def build_station_table(coords: pd.DataFrame, qc_station: pd.DataFrame = None, station_dash: pd.DataFrame = None,
+                        cdd_cwd_df: pd.DataFrame = None) -> pd.DataFrame:
+    """Tabel atribut stasiun satu window: baris = baris coords, kolom = koordinat + QC + ringkasan + CDD/CWD."""
+    base = coords.reset_index(drop=True)
+    stations = base["station"].astype(str)
+    parts = [
+        base,
+        _by_station(qc_station, ["completeness_pct"], stations),
+        _by_station(station_dash, SUMMARY_COLS, stations),
+        _by_station(cdd_cwd_df, CDD_COLS, stations),
+    ]
+    return pd.concat(parts, axis=1)
+
+
+def metric_colors(values, vmin=None, vmax=None) -> np.ndarray:
+    """RGBA uint8 [n, 4] gradasi biru -> merah; abu-abu untuk NaN."""
+    v = pd.to_numeric(pd.Series(values), errors="coerce").to_numpy(dtype=np.float64)
+    if vmin is None:
+        vmin = np.nanmin(v) if np.isfinite(v).any() else np.nan
+    if vmax is None:
+        vmax = np.nanmax(v) if np.isfinite(v).any() else np.nan
+    return apply_colormap(v, vmin, vmax, POINT_LUT, nan_rgba=NAN_COLOR)
+
+
+def qc_flag_colors(flags) -> np.ndarray:
+    names = list(QC_COORD_COLORS)
+    table = np.array([QC_COORD_COLORS[n] for n in names] + [QC_OTHER_COLOR], dtype=np.uint8)
+    pos = pd.Index(names).get_indexer(pd.Series(flags).astype(str))
+    return table[np.where(pos >= 0, pos, len(names))]
+
+
+def layer_payload(table: pd.DataFrame, metric_col: str, hide_missing: bool = True,
+                  show_only_bad: bool = False, numeric_only: bool = False) -> dict:
+    """
+    Filter + warna untuk satu (metrik, mode). Return dict: plot_df (dengan kolom __color__),
+    vmin, vmax. numeric_only membuang stasiun tanpa nilai metrik (heatmap / permukaan).
+    """
+    plot_df = table
+    keep = np.ones(len(table), dtype=bool)
+    if hide_missing:
+        keep &= (table["lat"].notna() & table["lon"].notna()).to_numpy()
+    if show_only_bad:
+        keep &= table["qc_flag"].isin(BAD_COORD_FLAGS).to_numpy()
+
+    vmin = vmax = np.nan
+    if metric_col == "qc_flag":
+        plot_df = table.loc[keep].copy()
+        colors = qc_flag_colors(plot_df["qc_flag"])
+    else:
+        vals = pd.to_numeric(table[metric_col], errors="coerce") if metric_col in table.columns \
+            else pd.Series(np.nan, index=table.index)
+        if numeric_only:
+            keep &= np.isfinite(vals.to_numpy(dtype=np.float64))
+        plot_df = table.loc[keep].copy()
+        plot_df[metric_col] = vals[keep]
+        vmin, vmax = plot_df[metric_col].min(skipna=True), plot_df[metric_col].max(skipna=True)
+        colors = metric_colors(plot_df[metric_col], vmin, vmax)
+
+    plot_df["__color__"] = colors.tolist()
+    return {"plot_df": plot_df, "vmin": vmin, "vmax": vmax}
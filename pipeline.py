@@ -0,0 +1,848 @@
+# pipeline.py
+#
+# Inti pemrosesan SEGARA tanpa Streamlit: query database (engine eksplisit), pembangun output
+# window (matriks BMKG/numerik, QC, dashboard, CDD/CWD), satu Run lengkap untuk satu bulan
+# (run_month: seluruh window dasarian + bulanan, indeks, SPI, normal, wilayah), dan ekspor produk
+# CSV dengan nama file yang sama dengan halaman Download. Dipakai app.py (lewat wrapper cache di
+# utils.py) maupun CLI batch (cli.py).
+
+import os
+
+import numpy as np
+import pandas as pd
+
+from config import HORIZONTAL_COLS, NAME_MAP, SPI_SCALES
+from rainfall import month_end_day, normalize_station_name
+from qc_rules import QcContext, run_qc_rules, completeness_summary
+from ingest import parse_timestamps
+
+WINDOW_LABELS = {"das1": "Das 1 (TGL 1–10)", "das2": "Das 2 (TGL 11–20)"}
+REQUIRED_COLS = ["NAME", "DATA TIMESTAMP", "RAINFALL DAY MM"]
+
+
+# ============================================================
+# Query Database (engine eksplisit)
+# ============================================================
+
+def _clean_db_frame(df: pd.DataFrame) -> pd.DataFrame:
+    df["DATA TIMESTAMP"] = parse_timestamps(df["RAW_TS"])
+    df["__source_file__"] = "Supabase DB"
+    return df.drop(columns=["RAW_TS"])
+
+
+def query_month_records(engine, year: int, month: int) -> pd.DataFrame:
+    """Record long-format satu bulan dari rainfall_data (kolom NAME, DATA TIMESTAMP, RAINFALL DAY MM, TGL)."""
+    from sqlalchemy import text
+
+    month_str = f"{year}-{str(month).zfill(2)}"
+    query = text("""
+        SELECT 
+            "NAME", 
+            "DATA TIMESTAMP"::text AS "RAW_TS", 
+            "RAINFALL DAY MM"
+        FROM rainfall_data 
+        WHERE TO_CHAR("DATA TIMESTAMP" AT TIME ZONE 'UTC', 'YYYY-MM') = :month_str 
+        ORDER BY "DATA TIMESTAMP" ASC;
+    """)
+    with engine.connect() as conn:
+        df = pd.read_sql(query, conn, params={"month_str": month_str})
+    if df.empty:
+        return pd.DataFrame()
+    df = _clean_db_frame(df)
+    df["TGL"] = df["DATA TIMESTAMP"].dt.day
+    return df
+
+
+def query_timeseries(engine, year: int, month: int, lookback_days: int = 365) -> pd.DataFrame:
+    """Record hingga akhir bulan target dengan lookback `lookback_days` hari (untuk CDD/CWD lintas bulan)."""
+    from sqlalchemy import text
+
+    target_end_dt = pd.Timestamp(year=year, month=month, day=month_end_day(year, month))
+    start_dt = target_end_dt - pd.Timedelta(days=lookback_days)
+    query = text("""
+        SELECT 
+            "NAME", 
+            "DATA TIMESTAMP"::text AS "RAW_TS", 
+            "RAINFALL DAY MM"
+        FROM rainfall_data 
+        WHERE ("DATA TIMESTAMP" AT TIME ZONE 'UTC')::date BETWEEN :start_str AND :end_str
+        ORDER BY "DATA TIMESTAMP" ASC;
+    """)
+    with engine.connect() as conn:
+        df = pd.read_sql(
+            query, conn,
+            params={"start_str": start_dt.strftime("%Y-%m-%d"), "end_str": target_end_dt.strftime("%Y-%m-%d")}
+        )
+    if df.empty:
+        return pd.DataFrame()
+    df = _clean_db_frame(df)
+    df["DATE"] = df["DATA TIMESTAMP"].dt.date
+    return df[["NAME", "RAINFALL DAY MM", "DATA TIMESTAMP", "DATE", "__source_file__"]]
+
+
+# ============================================================
+# Indices & Continuous Run Calculations
+# ============================================================
+
+def current_run_ending_at_last(series: pd.Series, condition_func, last_day: int):
+    """Menghitung run berkesinambungan melintasi dasarian hingga last_day."""
+    if last_day not in series.index:
+        return 0, None, None
+
+    v_last = series.loc[last_day]
+    if pd.isna(v_last) or (not condition_func(v_last)):
+        return 0, None, None
+
+    cur_len = 0
+    cur_start = last_day
+    d = last_day
+    while d in series.index:
+        v = series.loc[d]
+        if pd.isna(v) or (not condition_func(v)):
+            break
+        cur_len += 1
+        cur_start = d
+        d -= 1
+
+    return int(cur_len), int(cur_start), int(last_day)
+
+def longest_run(series: pd.Series, condition_func):
+    max_len = 0
+    max_start = None
+    max_end = None
+    cur_len = 0
+    cur_start = None
+
+    for day, val in series.items():
+        if pd.isna(val):
+            cur_len = 0
+            cur_start = None
+            continue
+
+        if condition_func(val):
+            if cur_len == 0:
+                cur_start = int(day)
+            cur_len += 1
+            if cur_len > max_len:
+                max_len = cur_len
+                max_start = cur_start
+                max_end = int(day)
+        else:
+            cur_len = 0
+            cur_start = None
+
+    return int(max_len), max_start, max_end
+
+def compute_cdd_cwd(wide_num_full: pd.DataFrame, wet_threshold: float = 0.1, dynamic_last_day: int = None):
+    """
+    Menerima matriks bulanan penuh agar CDD/CWD Current bisa dihitung lintas dasarian.
+    """
+    num = wide_num_full.drop(columns=["TGL"]).apply(pd.to_numeric, errors="coerce")
+    num.index = wide_num_full["TGL"].values
+    
+    if dynamic_last_day is not None and dynamic_last_day in num.index:
+        eval_last_day = int(dynamic_last_day)
+    else:
+        eval_last_day = int(wide_num_full["TGL"].max())
+
+    rows = []
+    for station in num.columns:
+        s = num[station]
+
+        cdd_len, cdd_start, cdd_end = longest_run(s, lambda x: float(x) == 0.0)
+        cwd_len, cwd_start, cwd_end = longest_run(s, lambda x: float(x) >= float(wet_threshold))
+
+        # Hitung run lintas dasarian yang berakhir di eval_last_day
+        cdd_cur_len, cdd_cur_start, cdd_cur_end = current_run_ending_at_last(
+            s, lambda x: float(x) == 0.0, eval_last_day
+        )
+        cwd_cur_len, cwd_cur_start, cwd_cur_end = current_run_ending_at_last(
+            s, lambda x: float(x) >= float(wet_threshold), eval_last_day
+        )
+
+        if np.isfinite(s.to_numpy()).any():
+            ch_max = float(np.nanmax(s.to_numpy()))
+            ch_tgl = int(s.idxmax())
+        else:
+            ch_max = np.nan
+            ch_tgl = np.nan
+
+        rows.append({
+            "station": station,
+            "CDD_len": cdd_len, "CDD_start": cdd_start, "CDD_end": cdd_end,
+            "CWD_len": cwd_len, "CWD_start": cwd_start, "CWD_end": cwd_end,
+            "CDD_cur_len": cdd_cur_len, "CDD_cur_start": cdd_cur_start, "CDD_cur_end": cdd_cur_end,
+            "CWD_cur_len": cwd_cur_len, "CWD_cur_start": cwd_cur_start, "CWD_cur_end": cwd_cur_end,
+            "CH_max_mm": ch_max, "CH_max_TGL": ch_tgl,
+            "eval_last_day": eval_last_day
+        })
+
+    return pd.DataFrame(rows)
+
+def join_names(names, max_show=8):
+    names = [str(x) for x in names if pd.notna(x)]
+    if len(names) <= max_show:
+        return ", ".join(names)
+    return ", ".join(names[:max_show]) + f" (+{len(names)-max_show} lagi)"
+
+def to_csv_bytes(df: pd.DataFrame) -> bytes:
+    if df is None:
+        df = pd.DataFrame()
+    return df.to_csv(index=False).encode("utf-8-sig")
+
+def fmt_station_list(df, col_station="station", col_val=None, col_tgl=None):
+    stn = df[col_station].astype(str).tolist()
+    names_str = join_names(stn)
+    if col_val and col_tgl and (col_val in df.columns) and (col_tgl in df.columns):
+        pairs = []
+        for _, r in df.iterrows():
+            tgl = r[col_tgl]
+            tgl_txt = "-" if pd.isna(tgl) else f"TGL {int(tgl)}"
+            pairs.append(f"{r[col_station]} ({tgl_txt})")
+        detail_str = join_names(pairs, max_show=6)
+        return names_str, detail_str
+    return names_str, ""
+
+def dasarian_windows_to_build(year: int, month: int, selected_das: int):
+    last_day = month_end_day(year, month)
+    windows = {}
+    if selected_das >= 1:
+        windows["das1"] = (1, 10)
+    if selected_das >= 2:
+        windows["das2"] = (11, 20)
+    if selected_das >= 3:
+        windows["das3"] = (21, last_day)
+    windows["monthly"] = (1, last_day)
+    return windows
+
+# ============================================================
+# Core Standardization & Output Generators
+# ============================================================
+
+def build_outputs(df_month_full: pd.DataFrame, month_start: int, month_end: int, win_start: int, win_end: int):
+    all_days = np.arange(int(month_start), int(month_end) + 1)
+    win_days = np.arange(int(win_start), int(win_end) + 1)
+
+    df_month_full = df_month_full.copy()
+    df_month_full["NAME"] = normalize_station_name(df_month_full["NAME"])
+    df_month_full["NAME_H"] = df_month_full["NAME"].replace(NAME_MAP)
+    
+    df_month_full["raw"] = pd.to_numeric(df_month_full["RAINFALL DAY MM"], errors="coerce")
+    df_month_full["has_row"] = 1
+
+    df_win = df_month_full[df_month_full["TGL"].between(int(win_start), int(win_end))].copy()
+
+    dup_counts = df_win.groupby(["TGL", "NAME_H"], dropna=False).size().reset_index(name="n_records")
+    qc_duplicates = dup_counts[dup_counts["n_records"] > 1].copy()
+
+    if not qc_duplicates.empty:
+        src_list = df_win.groupby(["TGL", "NAME_H"])["__source_file__"].apply(lambda s: ", ".join(sorted(set(map(str, s))))).reset_index(name="source_files")
+        raw_name_list = df_win.groupby(["TGL", "NAME_H"])["NAME"].apply(lambda s: ", ".join(sorted(set(map(str, s))))).reset_index(name="raw_names")
+        ts_list = df_win.groupby(["TGL", "NAME_H"])["DATA TIMESTAMP"].apply(lambda s: ", ".join(sorted(set(map(str, s.astype(str).head(6)))))).reset_index(name="timestamps_sample")
+        
+        qc_duplicates = (
+            qc_duplicates
+            .merge(raw_name_list, on=["TGL", "NAME_H"], how="left")
+            .merge(src_list, on=["TGL", "NAME_H"], how="left")
+            .merge(ts_list, on=["TGL", "NAME_H"], how="left")
+            .sort_values(["n_records", "TGL", "NAME_H"], ascending=[False, True, True])
+        )
+
+    horizontal_set = set(HORIZONTAL_COLS)
+    map_keys_set = set(map(str, NAME_MAP.keys()))
+    raw_names_set = set(map(str, df_month_full["NAME"].dropna().unique()))
+    ok_direct = raw_names_set & horizontal_set
+    ok_mappable = raw_names_set & map_keys_set
+
+    unknown_raw = sorted(raw_names_set - ok_direct - ok_mappable)
+    qc_unknown_names = (
+        df_month_full[df_month_full["NAME"].isin(unknown_raw)][["NAME", "__source_file__"]]
+        .assign(n=1)
+        .groupby(["NAME"], as_index=False)
+        .agg(count=("n", "sum"), source_files=("__source_file__", lambda s: ", ".join(sorted(set(map(str, s))))))
+        .sort_values(["count", "NAME"], ascending=[False, True])
+    )
+
+    rain_num = df_month_full["raw"].copy()
+    rain_num[df_month_full["raw"].isna()] = np.nan
+    rain_num[df_month_full["raw"] == 9999] = np.nan
+    rain_num[df_month_full["raw"] == 8888] = 0.1
+    rain_num[df_month_full["raw"] == 0] = 0.0
+    df_month_full["rain_num"] = rain_num
+
+    wide_raw = df_month_full.pivot_table(index="TGL", columns="NAME_H", values="raw", aggfunc="first").reindex(index=all_days, columns=HORIZONTAL_COLS)
+    wide_num = df_month_full.pivot_table(index="TGL", columns="NAME_H", values="rain_num", aggfunc="first").reindex(index=all_days, columns=HORIZONTAL_COLS)
+    present = df_month_full.pivot_table(index="TGL", columns="NAME_H", values="has_row", aggfunc="first").reindex(index=all_days, columns=HORIZONTAL_COLS)
+
+    wide_bmkg = pd.DataFrame("x", index=wide_raw.index, columns=wide_raw.columns)
+    row_exists = present.notna()
+    wide_bmkg = wide_bmkg.mask(row_exists & (wide_raw == 0), "-")
+    wide_bmkg = wide_bmkg.mask(row_exists & (wide_raw == 8888), "0")
+    is_pos_measured = row_exists & (wide_raw.notna()) & (wide_raw > 0) & (wide_raw != 8888) & (wide_raw != 9999)
+    wide_bmkg = wide_bmkg.mask(is_pos_measured, wide_raw.astype(float))
+
+    wide_bmkg_out = wide_bmkg.copy()
+    wide_bmkg_out.insert(0, "TGL", wide_bmkg_out.index.astype(int))
+
+    wide_num_out = wide_num.copy()
+    wide_num_out.insert(0, "TGL", wide_num_out.index.astype(int))
+
+    present_win = present.loc[win_days].copy()
+
+    station_summary = pd.DataFrame({
+        "station": HORIZONTAL_COLS,
+        "days_present": present_win.notna().sum(axis=0).astype(int).values,
+        "total_days": len(present_win.index),
+    })
+    station_summary["completeness_pct"] = (station_summary["days_present"] / station_summary["total_days"] * 100).round(1)
+    qc_station = station_summary.sort_values(["completeness_pct", "station"], ascending=[True, True])
+
+    day_summary = pd.DataFrame({
+        "TGL": present_win.index.astype(int),
+        "stations_present": present_win.notna().sum(axis=1).astype(int).values,
+        "total_stations": len(HORIZONTAL_COLS),
+    })
+    day_summary["completeness_pct"] = (day_summary["stations_present"] / day_summary["total_stations"] * 100).round(1)
+    qc_day = day_summary
+
+    mapped_not_in_horizontal = sorted(set(map(str, df_month_full["NAME_H"].dropna().unique())) - horizontal_set)
+    qc_mapped_not_in_header = df_month_full[df_month_full["NAME_H"].isin(mapped_not_in_horizontal)][["NAME", "NAME_H", "__source_file__"]].drop_duplicates().sort_values(["NAME_H", "NAME"])
+
+    last_present_day = present_win.notna().apply(lambda s: s[s].index.max() if s.any() else np.nan)
+    gap_days_since_last = (int(win_end) - last_present_day).where(~last_present_day.isna(), np.nan)
+    empty_all_window = present_win.notna().sum(axis=0) == 0
+
+    qc_gap = pd.DataFrame({
+        "station": HORIZONTAL_COLS,
+        "has_any_record_start_to_end": (~empty_all_window).astype(int).values,
+        "last_record_day_in_window": last_present_day.reindex(HORIZONTAL_COLS).values,
+        "empty_days_since_last_record": gap_days_since_last.reindex(HORIZONTAL_COLS).values
+    })
+
+    last_day_present = present_win.loc[int(win_end)].notna()
+    qc_empty_last_day = pd.DataFrame({
+        "station": HORIZONTAL_COLS,
+        "is_empty_on_last_day": (~last_day_present.reindex(HORIZONTAL_COLS).fillna(False)).astype(int).values,
+        "last_record_day_in_window": last_present_day.reindex(HORIZONTAL_COLS).values
+    })
+    qc_empty_last_day["empty_days_up_to_last_day"] = np.where(
+        qc_empty_last_day["last_record_day_in_window"].isna(),
+        float(win_end - win_start + 1),
+        float(win_end) - qc_empty_last_day["last_record_day_in_window"].astype(float)
+    )
+
+    pre_last_any = present_win.loc[present_win.index < int(win_end)].notna().sum(axis=0) > 0
+    qc_empty_last_day["was_present_before_last_day"] = pre_last_any.reindex(HORIZONTAL_COLS).fillna(False).astype(int).values
+    qc_empty_last_day = qc_empty_last_day[qc_empty_last_day["is_empty_on_last_day"] == 1].copy().sort_values(["empty_days_up_to_last_day", "station"], ascending=[False, True])
+
+    return {
+        "wide_bmkg_out": wide_bmkg_out, "wide_num_out": wide_num_out,
+        "month_start": int(month_start), "month_end": int(month_end),
+        "win_start": int(win_start), "win_end": int(win_end),
+        "qc_station": qc_station, "qc_day": qc_day, "qc_gap": qc_gap, "qc_empty_last_day": qc_empty_last_day,
+        "qc_duplicates": qc_duplicates, "qc_unknown_names": qc_unknown_names, "qc_mapped_not_in_header": qc_mapped_not_in_header,
+        "present_matrix_full": present, "present_matrix_win": present_win,
+    }
+
+def build_dashboard(wide_num_out: pd.DataFrame, rainy_threshold: float, heavy_threshold: float):
+    num = wide_num_out.drop(columns=["TGL"]).apply(pd.to_numeric, errors="coerce")
+    num2 = num.copy()
+    num2.index = wide_num_out["TGL"].values
+
+    station_total = num.sum(axis=0, skipna=True)
+    station_valid_days = num.notna().sum(axis=0)
+    station_rainy_days = (num >= rainy_threshold).sum(axis=0, skipna=True)
+    station_heavy_days = (num >= heavy_threshold).sum(axis=0, skipna=True)
+    station_max = num.max(axis=0, skipna=True)
+    station_tgl_max = num2.apply(lambda col: col.idxmax() if col.notna().any() else pd.NA).astype("Int64")
+
+    station_dash = (
+        pd.DataFrame({
+            "station": num.columns,
+            "total_mm": station_total.values,
+            "valid_days": station_valid_days.values,
+            "rainy_days_ge_thr": station_rainy_days.values,
+            "heavy_days_ge_thr": station_heavy_days.values,
+            "max_mm": station_max.values,
+            "tgl_max": station_tgl_max.values,
+        })
+        .sort_values(["total_mm", "station"], ascending=[False, True])
+        .reset_index(drop=True)
+    )
+
+    day_total = num.sum(axis=1, skipna=True)
+    day_mean = num.mean(axis=1, skipna=True)
+    day_valid_stations = num.notna().sum(axis=1)
+    day_rainy_stations = (num >= rainy_threshold).sum(axis=1, skipna=True)
+    day_heavy_stations = (num >= heavy_threshold).sum(axis=1, skipna=True)
+
+    day_dash = (
+        pd.DataFrame({
+            "TGL": wide_num_out["TGL"].values,
+            "total_mm_all_stations": day_total.values,
+            "mean_mm_across_stations": day_mean.values,
+            "stations_valid": day_valid_stations.values,
+            "stations_rainy_ge_thr": day_rainy_stations.values,
+            "stations_heavy_ge_thr": day_heavy_stations.values,
+        })
+        .sort_values("TGL")
+        .reset_index(drop=True)
+    )
+
+    arr = num.to_numpy()
+    total_mm_all_cells = float(np.nan_to_num(np.nansum(arr)))
+    total_valid_cells = int(np.isfinite(arr).sum())
+    total_cells = int(arr.size)
+    coverage_pct_numeric = round((total_valid_cells / total_cells * 100) if total_cells > 0 else 0, 2)
+
+    wettest_station = station_dash.iloc[0][["station", "total_mm"]].to_dict() if not station_dash.empty else {}
+    wettest_day_idx = day_dash["total_mm_all_stations"].idxmax() if not day_dash.empty and day_dash["total_mm_all_stations"].notna().any() else None
+    wettest_day = day_dash.loc[wettest_day_idx, ["TGL", "total_mm_all_stations"]].to_dict() if wettest_day_idx is not None else {}
+
+    return station_dash, day_dash, {
+        "total_mm_all_cells": total_mm_all_cells,
+        "coverage_pct_numeric": coverage_pct_numeric,
+        "wettest_station": wettest_station,
+        "wettest_day": wettest_day,
+    }
+
+def compute_cdd_cwd_timeseries(df_timeseries: pd.DataFrame, target_year: int, target_month: int, wet_threshold: float = 1.0, eval_until_date=None):
+    """
+    Menghitung CDD dan CWD secara riil (lintas bulan) menggunakan timeseries harian berlanjut.
+    """
+    if df_timeseries.empty:
+        return pd.DataFrame()
+
+    # Preprocessing & Normalisasi Nama Pos Hujan
+    df = df_timeseries.copy()
+    df["NAME_H"] = normalize_station_name(df["NAME"]).replace(NAME_MAP)
+    
+    rain_num = pd.to_numeric(df["RAINFALL DAY MM"], errors="coerce")
+    df["rain_num"] = np.where(rain_num == 9999, np.nan, np.where(rain_num == 8888, 0.1, rain_num))
+
+    # Pivot Table dengan Index Tanggal Riil (YYYY-MM-DD)
+    pivot_num = df.pivot_table(index="DATE", columns="NAME_H", values="rain_num", aggfunc="first").reindex(columns=HORIZONTAL_COLS)
+    pivot_num.index = pd.to_datetime(pivot_num.index)
+    pivot_num = pivot_num.sort_index()
+
+    # Tentukan tanggal evaluasi akhir
+    if eval_until_date is None:
+        eval_until_date = pivot_num.index.max()
+    else:
+        eval_until_date = pd.to_datetime(eval_until_date)
+
+    # Filter matriks hingga tanggal evaluasi
+    pivot_eval = pivot_num.loc[pivot_num.index <= eval_until_date]
+
+    rows = []
+    for station in HORIZONTAL_COLS:
+        if station not in pivot_eval.columns:
+            continue
+            
+        s = pivot_eval[station]
+
+        # 1. CDD Current Lintas Bulan (Hitung mundur dari eval_until_date)
+        cdd_cur_len, cdd_cur_start, cdd_cur_end = 0, None, None
+        if not s.empty and eval_until_date in s.index:
+            v_last = s.loc[eval_until_date]
+            if pd.notna(v_last) and float(v_last) < float(wet_threshold):
+                cdd_cur_end = eval_until_date
+                cur_dt = eval_until_date
+                while cur_dt in s.index:
+                    val = s.loc[cur_dt]
+                    if pd.isna(val) or float(val) >= float(wet_threshold):
+                        break
+                    cdd_cur_len += 1
+                    cdd_cur_start = cur_dt
+                    cur_dt -= pd.Timedelta(days=1)
+
+        # 2. CWD Current Lintas Bulan (Hitung mundur dari eval_until_date)
+        cwd_cur_len, cwd_cur_start, cwd_cur_end = 0, None, None
+        if not s.empty and eval_until_date in s.index:
+            v_last = s.loc[eval_until_date]
+            if pd.notna(v_last) and float(v_last) >= float(wet_threshold):
+                cwd_cur_end = eval_until_date
+                cur_dt = eval_until_date
+                while cur_dt in s.index:
+                    val = s.loc[cur_dt]
+                    if pd.isna(val) or float(val) < float(wet_threshold):
+                        break
+                    cwd_cur_len += 1
+                    cwd_cur_start = cur_dt
+                    cur_dt -= pd.Timedelta(days=1)
+
+        # Filter periode khusus bulan target untuk CH Max harian
+        target_mask = (s.index.year == target_year) & (s.index.month == target_month)
+        s_target = s[target_mask]
+
+        if not s_target.empty and np.isfinite(s_target.to_numpy()).any():
+            ch_max = float(np.nanmax(s_target.to_numpy()))
+            ch_max_dt = s_target.idxmax()
+            ch_tgl = ch_max_dt.day if pd.notna(ch_max_dt) else np.nan
+        else:
+            ch_max, ch_tgl = np.nan, np.nan
+
+        rows.append({
+            "station": station,
+            "CDD_cur_len": cdd_cur_len,
+            "CDD_cur_start_date": cdd_cur_start.strftime("%d %b %Y") if cdd_cur_start else "-",
+            "CWD_cur_len": cwd_cur_len,
+            "CWD_cur_start_date": cwd_cur_start.strftime("%d %b %Y") if cwd_cur_start else "-",
+            "eval_date": eval_until_date.strftime("%d %b %Y"),
+            "CH_max_mm": ch_max,
+            "CH_max_TGL": ch_tgl,
+        })
+
+    return pd.DataFrame(rows)
+
+def _trailing_run(mask: np.ndarray) -> np.ndarray:
+    """Panjang run True yang berakhir di baris terakhir, per kolom (mask [hari, stasiun])."""
+    if mask.shape[0] == 0:
+        return np.zeros(mask.shape[1], dtype=int)
+    broken = ~mask[::-1]
+    return np.where(broken.any(axis=0), broken.argmax(axis=0), mask.shape[0])
+
+def compute_cdd_cwd_range(daily: pd.DataFrame, wet_threshold: float = 1.0) -> pd.DataFrame:
+    """
+    CDD/CWD current dan CH max untuk rentang tanggal bebas (window kustom) dari matriks harian
+    [tanggal, stasiun]: run berakhir di tanggal terakhir rentang, kolom sama dengan
+    compute_cdd_cwd_timeseries (CH_max_TGL = tanggal dalam bulan, CH_max_date = tanggal lengkap).
+    """
+    if daily is None or daily.empty:
+        return pd.DataFrame()
+    v = daily.to_numpy(dtype=np.float64)
+    valid = np.isfinite(v)
+    with np.errstate(invalid="ignore"):
+        cdd = _trailing_run(valid & (v < float(wet_threshold)))
+        cwd = _trailing_run(valid & (v >= float(wet_threshold)))
+    dates = pd.DatetimeIndex(daily.index)
+    eval_date = dates[-1]
+
+    def _start(n):
+        return (eval_date - pd.Timedelta(days=int(n) - 1)).strftime("%d %b %Y") if n > 0 else "-"
+
+    any_valid = valid.any(axis=0)
+    arg = np.where(any_valid, np.nanargmax(np.where(valid, v, -np.inf), axis=0), 0)
+    ch_max = np.where(any_valid, v[arg, np.arange(v.shape[1])], np.nan)
+    ch_dt = dates[arg]
+    return pd.DataFrame({
+        "station": daily.columns,
+        "CDD_cur_len": cdd,
+        "CDD_cur_start_date": [_start(n) for n in cdd],
+        "CWD_cur_len": cwd,
+        "CWD_cur_start_date": [_start(n) for n in cwd],
+        "eval_date": eval_date.strftime("%d %b %Y"),
+        "CH_max_mm": ch_max,
+        "CH_max_TGL": np.where(any_valid, ch_dt.day, np.nan),
+        "CH_max_date": np.where(any_valid, ch_dt.strftime("%Y-%m-%d"), None),
+    })
+
+def run_quality_control(df_month_win: pd.DataFrame, rainy_thr: float = 1.0, heavy_thr: float = 200.0) -> pd.DataFrame:
+    """
+    Memeriksa kontrol kualitas data curah hujan per sel (subset registry qc_rules):
+    1. Data Kosong / Missing Data (NaN, None, 9999)
+    2. Nilai Ekstrim / Anomali (> heavy_thr / 200mm)
+    3. Nilai Negatif (< 0)
+    """
+    if df_month_win.empty:
+        return pd.DataFrame()
+
+    stations = [c for c in HORIZONTAL_COLS if c in df_month_win.columns]
+    ctx = QcContext.from_wide(df_month_win, stations, params={"extreme_abs_mm": heavy_thr})
+    qc_df, _ = run_qc_rules(ctx, enabled=["MISSING_DATA", "EXTREME_VALUE", "INVALID_NEGATIVE"])
+    return qc_df.drop(columns=["SEVERITY"])
+
+def compute_data_completeness_summary(wide_num_win: pd.DataFrame) -> dict:
+    """
+    Menghitung agregasi kelengkapan data nasional/provinsi dan status Pos Completed.
+    """
+    stations = [c for c in HORIZONTAL_COLS if c in wide_num_win.columns]
+    values = wide_num_win[stations].apply(pd.to_numeric, errors="coerce").to_numpy(dtype=float)
+    return completeness_summary(values, stations)
+
+# ============================================================
+# Run satu bulan (semua window)
+# ============================================================
+
+def load_resources(coords_path: str = "coords.csv", fill_gaps: bool = False) -> dict:
+    """
+    Sumber daya Run yang tidak bergantung bulan (koordinat, cube, normal, indeks tetangga, bobot IDW/
+    Thiessen, ambang stasiun, indeks administrasi). app.py menyusun dict yang sama dari getter cache.
+    """
+    from areal import load_or_build_areal_weights
+    from climatology import load_normals
+    from cube import open_cube
+    from gapfill import build_idw_weights
+    from hierarchy import build_admin_index
+    from qc_spatial import build_neighbor_index
+    from qc_thresholds import StationThresholds
+    from rainfall import prepare_station_coordinates
+
+    coords = prepare_station_coordinates(pd.read_csv(coords_path))
+    return {
+        "coords": coords,
+        "cube": open_cube(),
+        "normals": load_normals(),
+        "neighbor_index": build_neighbor_index(coords),
+        "idw_weights": build_idw_weights(coords) if fill_gaps else None,
+        "areal_weights": load_or_build_areal_weights(coords),
+        "station_thresholds": StationThresholds.load(),
+        "admin_index": build_admin_index(coords),
+    }
+
+
+def prepare_month_records(df: pd.DataFrame, year: int, month: int) -> tuple:
+    """Record valid bulan target (kolom TGL, TGL 1..akhir bulan) -> (df_month_full, last_day); ValueError bila kosong."""
+    missing_cols = [c for c in REQUIRED_COLS if c not in df.columns]
+    if missing_cols:
+        raise ValueError(f"Kolom wajib tidak ditemukan: {missing_cols}")
+
+    df = df.copy()
+    df["DATA TIMESTAMP"] = parse_timestamps(df["DATA TIMESTAMP"])
+    df = df[df["DATA TIMESTAMP"].notna()]
+    ts = df["DATA TIMESTAMP"]
+    df_month = df[(ts.dt.year == int(year)) & (ts.dt.month == int(month))].copy()
+    if df_month.empty:
+        raise ValueError(f"Tidak ada baris untuk {year}-{int(month):02d}. Periksa pilihan bulan atau data.")
+
+    df_month["TGL"] = df_month["DATA TIMESTAMP"].dt.day
+    last_day = month_end_day(int(year), int(month))
+    return df_month[df_month["TGL"].between(1, last_day)].copy(), last_day
+
+
+def run_month(df_month_full: pd.DataFrame, daily_matrix: pd.DataFrame, year: int, month: int, das_n: int,
+              resources: dict, rainy_thr: float = 1.0, heavy_thr: float = 20.0, qc_enabled=None,
+              fill_gaps: bool = False, use_filled: bool = False, qc_incremental: bool = False,
+              cdd_timeseries: pd.DataFrame = None, on_stage=None) -> dict:
+    """
+    Satu Run lengkap: setiap window dasarian s.d. das_n + bulanan -> output BMKG/numerik, isian IDW,
+    dashboard, Thiessen, QC, indeks presipitasi, SPI, normal, CDD/CWD, tabel peta; lalu rekap
+    wilayah administrasi. cdd_timeseries (record lookback dari DB) membuat CDD/CWD kontinu lintas
+    bulan; tanpa itu CDD/CWD dihitung dari bulan target. Ambang ekstrem stasiun hanya dibaca
+    (diperbarui lewat `python qc_thresholds.py update`). on_stage(tahap, progres 0..1) dipanggil
+    di setiap tahap (runner job latar belakang). Return dict: meta, windows, prefix_index, wet_pct.
+    """
+    from climatology import attach_normals
+    from digests import StationResultCache, station_month_digests
+    from gapfill import fill_window, mark_filled_bmkg
+    from hierarchy import ADMIN_LEVELS, rollup_windows
+    from indices import compute_precip_indices, station_wet_percentiles
+    from map_layers import build_station_table
+    from prefix_index import PrefixSumIndex
+    from qc_incremental import run_qc_incremental
+    from qc_rules import default_enabled_rules
+    from spi import compute_spi_for_month
+
+    year, month, das_n = int(year), int(month), int(das_n)
+    month_str = f"{year}-{month:02d}"
+    qc_enabled = list(qc_enabled) if qc_enabled is not None else default_enabled_rules()
+    use_filled = bool(use_filled and fill_gaps)
+    last_day = month_end_day(year, month)
+    latest_db_day = int(df_month_full["TGL"].max())
+
+    windows_def = dasarian_windows_to_build(year, month, das_n)
+    windows_out = {}
+    stage = on_stage or (lambda *_: None)
+
+    stage("Prefix-sum, persentil hari basah, SPI", 0.15)
+    # Matriks harian seluruh timeseries (termasuk lookback): basis prefix-sum untuk rentang
+    # kustom dan persentil hari basah per stasiun untuk R95p/R99p
+    prefix_idx = PrefixSumIndex.from_frame(daily_matrix, thresholds={"rainy": rainy_thr, "heavy": heavy_thr})
+    wet_pct = station_wet_percentiles(daily_matrix.to_numpy(dtype=float))
+
+    # SPI bulan target: riwayat panjang dari cube historis, ditimpa data terbaru yang baru diambil;
+    # hanya bulan yang dibutuhkan skala SPI yang dibaca dari cube (parameter gamma sudah di-cache)
+    spi_df = compute_spi_for_month(daily_matrix, year, month, scales=SPI_SCALES, cube=resources.get("cube"))
+    normals = resources.get("normals")
+    idw_weights = resources.get("idw_weights") if fill_gaps else None
+    areal_weights = resources.get("areal_weights")
+
+    # Digest per (stasiun, bulan) + persentil hari basah: kunci cache hasil indeks per stasiun
+    month_digests = station_month_digests(df_month_full).reindex(HORIZONTAL_COLS).fillna("")
+    idx_digests = [
+        f"{d}|{p95:.4f}|{p99:.4f}" for d, p95, p99 in zip(month_digests.to_numpy(), wet_pct[95], wet_pct[99])
+    ]
+    col_pos = pd.Index(HORIZONTAL_COLS).get_indexer
+
+    # Ambang ekstrem historis per stasiun-musim (baca saja; diperbarui dari cube oleh CLI)
+    station_thr = resources.get("station_thresholds")
+
+    for i, (key, (win_start, win_end)) in enumerate(windows_def.items()):
+        stage(f"Window {key} (TGL {win_start}–{win_end}): output, QC, indeks, CDD/CWD", 0.25 + 0.65 * i / len(windows_def))
+        out = build_outputs(df_month_full, month_start=1, month_end=last_day, win_start=win_start, win_end=win_end)
+
+        wide_num_full = out["wide_num_out"].copy()
+        wide_num_win = wide_num_full[wide_num_full["TGL"].between(int(win_start), int(win_end))].copy()
+
+        # Pengisian data kosong (IDW): tabel BMKG diberi tanda '*', indeks hanya memakai nilai terisi bila diminta
+        wide_idx_win = wide_num_win
+        if idw_weights is not None:
+            wide_filled_win, filled_mask = fill_window(wide_num_win, idw_weights)
+            out["wide_bmkg_out"] = mark_filled_bmkg(out["wide_bmkg_out"], wide_filled_win, filled_mask)
+            wide_num_filled = out["wide_num_out"].copy()
+            wide_num_filled.loc[wide_filled_win.index] = wide_filled_win
+            out["wide_num_filled"] = wide_num_filled
+            out["filled_count"] = int(filled_mask.to_numpy().sum())
+            if use_filled:
+                wide_idx_win = wide_filled_win
+
+        dash, daydash, hi = build_dashboard(wide_idx_win, rainy_thr, heavy_thr)
+        if areal_weights is not None:
+            out["areal_daily"], out["areal_summary"] = areal_weights.window_table(wide_idx_win)
+
+        # QC: seluruh aturan registry aktif dalam satu lintasan atas konteks window bersama
+        qc_ctx = QcContext.from_wide(
+            wide_num_win, HORIZONTAL_COLS, year=year, month=month,
+            history=daily_matrix,
+            neighbor_index=resources.get("neighbor_index"),
+            station_thresholds=station_thr,
+            records=df_month_full[df_month_full["TGL"].between(int(win_start), int(win_end))],
+            duplicates=out["qc_duplicates"],
+            unknown_names=out["qc_unknown_names"],
+        )
+        if qc_incremental:
+            out["qc_df"], out["qc_rule_stats"] = run_qc_incremental(qc_ctx, f"{month_str}_{key}", enabled=qc_enabled)
+        else:
+            out["qc_df"], out["qc_rule_stats"] = run_qc_rules(qc_ctx, enabled=qc_enabled)
+
+        # Indeks per stasiun di-cache per digest (stasiun, bulan) + persentilnya; nilai isian IDW
+        # bergantung pada tetangga sehingga selalu dihitung penuh
+        idx_values = wide_idx_win[HORIZONTAL_COLS].to_numpy(dtype=float)
+        if use_filled:
+            precip_idx = compute_precip_indices(idx_values, p95=wet_pct[95], p99=wet_pct[99])
+            out["indices_recomputed"] = len(HORIZONTAL_COLS)
+        else:
+            precip_idx, out["indices_recomputed"] = StationResultCache(f"indices_{month_str}_{key}").compute(
+                HORIZONTAL_COLS, idx_digests,
+                lambda sts: compute_precip_indices(
+                    idx_values[:, col_pos(sts)], p95=wet_pct[95][col_pos(sts)], p99=wet_pct[99][col_pos(sts)], stations=sts
+                ),
+            )
+        dash = dash.merge(precip_idx, on="station", how="left").merge(spi_df, on="station", how="left")
+        dash = attach_normals(dash, normals, key, month, period_days=int(win_end) - int(win_start) + 1)
+
+        # Hitung CDD/CWD Lintas Bulan secara Real Continuous Timeseries
+        if cdd_timeseries is not None:
+            eval_day = min(latest_db_day, last_day) if key == "monthly" else min(int(win_end), latest_db_day)
+            cdd = compute_cdd_cwd_timeseries(
+                cdd_timeseries,
+                target_year=year,
+                target_month=month,
+                wet_threshold=rainy_thr,
+                eval_until_date=pd.Timestamp(year=year, month=month, day=eval_day)
+            )
+        else:
+            cdd = compute_cdd_cwd(wide_num_full, wet_threshold=rainy_thr, dynamic_last_day=latest_db_day)
+
+        label = WINDOW_LABELS.get(key) or {
+            "das3": f"Das 3 (TGL 21–{last_day})",
+            "monthly": f"Bulanan (TGL 1–{last_day})",
+        }[key]
+
+        windows_out[key] = {
+            "key": key,
+            "label": label,
+            "start_day": int(win_start),
+            "end_day": int(win_end),
+            "outputs": out,
+            "station_dash": dash,
+            "day_dash": daydash,
+            "hi": hi,
+            "cdd_cwd_df": cdd,
+            "map_table": build_station_table(
+                resources["coords"],
+                qc_station=out.get("qc_station"),
+                station_dash=dash,
+                cdd_cwd_df=cdd,
+            ),
+        }
+
+    # Rekap wilayah administrasi (kabupaten/kecamatan) seluruh window dalam satu lintasan per level;
+    # memakai nilai terukur agar completeness mencerminkan laporan sebenarnya
+    stage("Rekap wilayah administrasi", 0.92)
+    admin_index = resources.get("admin_index")
+    if admin_index is not None:
+        month_values = wide_num_full[admin_index["stations"]].to_numpy(dtype=float)
+        month_tgl = wide_num_full["TGL"].to_numpy()
+        for level in ADMIN_LEVELS:
+            rolled = rollup_windows(month_values, month_tgl, windows_def, admin_index, level, heavy_thr)
+            for key in windows_out:
+                windows_out[key].setdefault("admin_rollup", {})[level] = rolled[key]
+
+    meta = {
+        "MONTH_STR": month_str,
+        "YEAR": year,
+        "MM": f"{month:02d}",
+        "last_day": int(last_day),
+        "latest_db_day": int(latest_db_day),
+        "das_n": das_n,
+        "rainy_thr": float(rainy_thr),
+        "heavy_thr": float(heavy_thr),
+        "qc_enabled": qc_enabled,
+        "fill_gaps": bool(fill_gaps),
+        "use_filled": use_filled,
+        "eval_date": pd.Timestamp(year=year, month=month, day=int(latest_db_day)),
+    }
+    return {"meta": meta, "windows": windows_out, "prefix_index": prefix_idx, "wet_pct": wet_pct}
+
+
+# ============================================================
+# Produk CSV (nama file = halaman Download)
+# ============================================================
+
+def window_products(bundle: dict, month_str: str, view_key: str, coords: pd.DataFrame = None) -> dict:
+    """{grup: {nama file: DataFrame}} untuk satu window; grup Utama / QC / Ringkasan / Referensi."""
+    outputs = bundle.get("outputs", {}) or {}
+    qc_unmapped = outputs.get("qc_unmapped", outputs.get("qc_mapped_not_in_header", pd.DataFrame()))
+    tag = f"{month_str}_{view_key}"
+
+    main = {
+        f"rain_horizontal_{tag}_format_bmkg.csv": outputs.get("wide_bmkg_out"),
+        f"rain_horizontal_{tag}_numeric.csv": outputs.get("wide_num_out"),
+    }
+    if outputs.get("wide_num_filled") is not None:
+        main[f"rain_horizontal_{tag}_numeric_idw_filled.csv"] = outputs["wide_num_filled"]
+
+    qc = {
+        f"QC_station_completeness_{tag}.csv": outputs.get("qc_station", pd.DataFrame()),
+        f"QC_day_completeness_{tag}.csv": outputs.get("qc_day", pd.DataFrame()),
+        f"QC_unmapped_names_{tag}.csv": qc_unmapped,
+        f"QC_station_empty_gap_{tag}.csv": outputs.get("qc_gap", pd.DataFrame()),
+        f"QC_empty_last_day_{tag}.csv": outputs.get("qc_empty_last_day", pd.DataFrame()),
+        f"QC_duplicates_station_day_{tag}.csv": outputs.get("qc_duplicates", pd.DataFrame()),
+        f"QC_unknown_raw_names_{tag}.csv": outputs.get("qc_unknown_names", pd.DataFrame()),
+    }
+
+    summary = {
+        f"SUMMARY_station_rain_{tag}.csv": bundle.get("station_dash", pd.DataFrame()),
+        f"SUMMARY_day_rain_{tag}.csv": bundle.get("day_dash", pd.DataFrame()),
+        f"SUMMARY_CDD_CWD_CHmax_{tag}.csv": bundle.get("cdd_cwd_df", pd.DataFrame()),
+    }
+    if outputs.get("areal_summary") is not None:
+        summary[f"SUMMARY_areal_thiessen_{tag}.csv"] = outputs["areal_summary"]
+        summary[f"DAILY_areal_thiessen_{tag}.csv"] = outputs.get("areal_daily")
+    for lvl, df in (bundle.get("admin_rollup") or {}).items():
+        summary[f"SUMMARY_admin_{lvl}_{tag}.csv"] = df
+
+    coords = coords if isinstance(coords, pd.DataFrame) else pd.DataFrame()
+    return {"Utama": main, "QC": qc, "Ringkasan": summary, "Referensi": {"STATION_COORDS_MAPPED.csv": coords}}
+
+
+def export_products(result: dict, outdir: str, coords: pd.DataFrame = None, windows=None) -> list:
+    """Menulis semua produk CSV setiap window hasil run_month ke outdir/<YYYY-MM>/; return daftar path."""
+    month_str = result["meta"]["MONTH_STR"]
+    target = os.path.join(outdir, month_str)
+    os.makedirs(target, exist_ok=True)
+    written = []
+    for key, bundle in result["windows"].items():
+        if windows is not None and key not in windows:
+            continue
+        for group in window_products(bundle, month_str, key, coords).values():
+            for fname, df in group.items():
+                if df is None:
+                    continue
+                path = os.path.join(target, fname)
+                with open(path, "wb") as f:
+                    f.write(to_csv_bytes(df if isinstance(df, pd.DataFrame) else pd.DataFrame(df)))
+                written.append(path)
+    return written
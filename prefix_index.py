@@ -0,0 +1,118 @@
+# prefix_index.py
+#
+# Indeks prefix-sum (cumulative sum) atas matriks harian stasiun, sehingga total, jumlah hari
+# valid, rata-rata, dan hitungan hari >= threshold untuk rentang tanggal apa pun (pentad,
+# mingguan, musiman, lintas bulan) dijawab dengan dua lookup baris per stasiun.
+
+import numpy as np
+import pandas as pd
+
+SEASONS = {
+    "DJF": (12, 1, 2),
+    "MAM": (3, 4, 5),
+    "JJA": (6, 7, 8),
+    "SON": (9, 10, 11),
+}
+
+
+class PrefixSumIndex:
+    """
+    C[i] = jumlah nilai hari ke-0 s.d. i-1 (NaN dianggap 0), N[i] = jumlah hari valid.
+    Total rentang [a, b] = C[b+1] - C[a], berlaku vektor untuk semua stasiun sekaligus.
+    """
+
+    def __init__(self, dates: pd.DatetimeIndex, stations, values: np.ndarray, thresholds: dict = None):
+        values = np.asarray(values, dtype=np.float64)
+        valid = np.isfinite(values)
+        filled = np.where(valid, values, 0.0)
+
+        self.dates = pd.DatetimeIndex(dates)
+        self.stations = list(stations)
+        self.start = self.dates[0] if len(self.dates) else None
+        self.end = self.dates[-1] if len(self.dates) else None
+
+        self._values = values
+        n_st = values.shape[1]
+        self._csum = np.vstack([np.zeros((1, n_st)), np.cumsum(filled, axis=0)])
+        self._cvalid = np.vstack([np.zeros((1, n_st), dtype=np.int32), np.cumsum(valid, axis=0, dtype=np.int32)])
+
+        # Hitungan hari >= threshold (mis. hari hujan / hujan lebat) juga di-prefix-sum
+        self.thresholds = dict(thresholds or {})
+        self._cthr = {
+            name: np.vstack([np.zeros((1, n_st), dtype=np.int32), np.cumsum(valid & (filled >= thr), axis=0, dtype=np.int32)])
+            for name, thr in self.thresholds.items()
+        }
+
+    @classmethod
+    def from_frame(cls, wide: pd.DataFrame, thresholds: dict = None) -> "PrefixSumIndex":
+        """Dari matriks harian kontinu (index tanggal, kolom stasiun) mis. hasil build_daily_matrix."""
+        return cls(wide.index, wide.columns, wide.to_numpy(dtype=np.float64), thresholds=thresholds)
+
+    @classmethod
+    def from_cube(cls, cube, start=None, end=None, thresholds: dict = None) -> "PrefixSumIndex":
+        values, _, dates = cube.slice(start, end)
+        return cls(dates, cube.stations, values, thresholds=thresholds)
+
+    # --------------------------------------------------------
+    # Lookup
+    # --------------------------------------------------------
+
+    def _bounds(self, start, end) -> tuple:
+        """Offset baris prefix [i0, i1) untuk rentang inklusif, dipotong ke cakupan indeks."""
+        i0 = int(self.dates.searchsorted(pd.Timestamp(start), side="left"))
+        i1 = int(self.dates.searchsorted(pd.Timestamp(end), side="right"))
+        return i0, max(i0, i1)
+
+    def total(self, start, end) -> np.ndarray:
+        i0, i1 = self._bounds(start, end)
+        return self._csum[i1] - self._csum[i0]
+
+    def valid_days(self, start, end) -> np.ndarray:
+        i0, i1 = self._bounds(start, end)
+        return self._cvalid[i1] - self._cvalid[i0]
+
+    def mean(self, start, end) -> np.ndarray:
+        n = self.valid_days(start, end)
+        with np.errstate(invalid="ignore", divide="ignore"):
+            return np.where(n > 0, self.total(start, end) / n, np.nan)
+
+    def count_ge(self, name: str, start, end) -> np.ndarray:
+        i0, i1 = self._bounds(start, end)
+        c = self._cthr[name]
+        return c[i1] - c[i0]
+
+    def daily_values(self, start, end) -> pd.DataFrame:
+        """Nilai harian asli untuk rentang (untuk maksimum harian & grafik)."""
+        i0, i1 = self._bounds(start, end)
+        return pd.DataFrame(self._values[i0:i1], index=self.dates[i0:i1], columns=self.stations)
+
+    def station_summary(self, start, end) -> pd.DataFrame:
+        """Ringkasan per stasiun untuk rentang apa pun, kolom kompatibel dengan station_dash."""
+        n = self.valid_days(start, end)
+        out = pd.DataFrame({
+            "station": self.stations,
+            "total_mm": np.where(n > 0, self.total(start, end), 0.0),
+            "valid_days": n,
+            "mean_mm": self.mean(start, end),
+        })
+        for name in self.thresholds:
+            out[f"{name}_days_ge_thr"] = self.count_ge(name, start, end)
+        return out
+
+
+def named_ranges(end_date) -> dict:
+    """
+    Rentang standar yang berakhir di end_date: pentad (5 hari), mingguan (7 hari),
+    30 hari, dan musim berjalan (DJF/MAM/JJA/SON) s.d. end_date.
+    """
+    end = pd.Timestamp(end_date).normalize()
+    season = next(k for k, months in SEASONS.items() if end.month in months)
+    first_month = SEASONS[season][0]
+    season_year = end.year - 1 if (season == "DJF" and end.month != 12) else end.year
+
+    return {
+        "pentad": (end - pd.Timedelta(days=4), end),
+        "weekly": (end - pd.Timedelta(days=6), end),
+        "30d": (end - pd.Timedelta(days=29), end),
+        season: (pd.Timestamp(year=season_year, month=first_month, day=1), end),
+    }
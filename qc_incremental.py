@@ -0,0 +1,195 @@
+# qc_incremental.py
+#
+# QC inkremental: flag disimpan per (bulan, window) dengan kunci (stasiun, tanggal, aturan),
+# bersama snapshot matriks window + riwayat harian yang terakhir dievaluasi. Saat Run berikutnya
+# hanya sel yang nilainya berubah (ditambah sel yang terdampak menurut `scope` aturan) yang
+# dievaluasi ulang; flag lain dipakai ulang dari store.
+#
+#   cell    -> sel berubah
+#   day     -> sel berubah + stasiun yang menjadikannya tetangga, pada hari yang sama
+#   station -> seluruh window stasiun yang deret window/riwayatnya berubah
+#   window  -> seluruh window, hanya bila ada perubahan apa pun
+#
+# Aturan dievaluasi penuh bila belum ada di store atau tanda tangannya (parameter, indeks
+# tetangga, ambang stasiun) berubah.
+
+import os
+
+import numpy as np
+import pandas as pd
+
+from config import CACHE_DIR
+from qc_rules import QC_RULES, QcContext, concat_flags, default_enabled_rules, execute_rule, stats_row
+
+DEFAULT_QC_STORE_DIR = os.path.join(CACHE_DIR, "qc_store")
+
+
+def _changed(old: pd.DataFrame, new: pd.DataFrame) -> np.ndarray:
+    """Mask sel yang berbeda (NaN dianggap sama dengan NaN), selaras dengan `new`."""
+    a = old.reindex(index=new.index, columns=new.columns).to_numpy(dtype=np.float64)
+    b = new.to_numpy(dtype=np.float64)
+    return ~((a == b) | (np.isnan(a) & np.isnan(b)))
+
+
+def _records_digest(ctx: QcContext) -> int:
+    parts = [ctx.records, ctx.duplicates, ctx.unknown_names]
+    return int(sum(int(pd.util.hash_pandas_object(p, index=False).sum()) for p in parts if p is not None and not p.empty))
+
+
+def _rule_signature(rule, ctx: QcContext) -> str:
+    """Tanda tangan input non-matriks aturan; bila berubah aturan dievaluasi penuh."""
+    parts = [rule.scope, sorted(ctx.params.items())]
+    if "neighbor_index" in rule.requires and ctx.neighbor_index is not None:
+        nb = ctx.neighbor_index
+        parts.append((nb["k"], nb["radius_km"], tuple(nb["stations"])))
+    if "station_thresholds" in rule.requires and ctx.station_thresholds is not None:
+        parts.append(str(ctx.station_thresholds.last_date))
+    return repr(parts)
+
+
+class QcFlagStore:
+    """Store flag + snapshot untuk satu (bulan, window), disimpan sebagai pickle pandas di cache."""
+
+    def __init__(self, key: str, store_dir: str = DEFAULT_QC_STORE_DIR):
+        self.key = key
+        self.path = os.path.join(store_dir, f"{key}.pkl")
+        self.state = None
+        if os.path.exists(self.path):
+            try:
+                self.state = pd.read_pickle(self.path)
+            except Exception:
+                self.state = None
+
+    def save(self, state: dict):
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        tmp = self.path + ".tmp"
+        pd.to_pickle(state, tmp)
+        os.replace(tmp, self.path)
+        self.state = state
+
+
+def _affected_masks(ctx: QcContext, state: dict) -> dict:
+    """Mask sel terdampak [hari, stasiun] per scope; None berarti evaluasi penuh."""
+    if state is None or state["stations"] != ctx.stations or not np.array_equal(state["tgl"], ctx.tgl):
+        return None
+
+    win_old = pd.DataFrame(state["win_values"], columns=ctx.stations)
+    win_new = pd.DataFrame(ctx.values, columns=ctx.stations)
+    cell = _changed(win_old, win_new)
+
+    st_changed = cell.any(axis=0)
+    if ctx.history is not None and state.get("history") is not None:
+        hist_new = ctx.history.loc[:ctx.win_end] if ctx.win_end is not None else ctx.history
+        st_changed |= _changed(state["history"], hist_new.reindex(columns=ctx.stations)).any(axis=0)
+
+    day = cell.copy()
+    if ctx.neighbor_index is not None and list(ctx.neighbor_index["stations"]) == ctx.stations:
+        idx = ctx.neighbor_index["idx"]
+        nb_changed = cell[:, np.where(idx >= 0, idx, 0)] & (idx >= 0)[None, :, :]
+        day |= nb_changed.any(axis=2)
+
+    any_change = bool(st_changed.any()) or state.get("records_digest") != _records_digest(ctx)
+    return {
+        "cell": cell,
+        "day": day,
+        "station": np.broadcast_to(st_changed[None, :], cell.shape),
+        "window": np.full(cell.shape, any_change),
+    }
+
+
+def _keep_outside(flags: pd.DataFrame, affected: np.ndarray, ctx: QcContext) -> pd.DataFrame:
+    """Flag lama di luar sel terdampak (baris tanpa TGL/stasiun window ikut diganti bila ada dampak)."""
+    if flags is None or flags.empty:
+        return flags
+    d = pd.Index(ctx.tgl).get_indexer(pd.to_numeric(flags["TGL"], errors="coerce"))
+    s = pd.Index(ctx.stations).get_indexer(flags["Station"].astype(str))
+    located = (d >= 0) & (s >= 0)
+    hit = np.full(len(flags), affected.any())
+    hit[located] = affected[d[located], s[located]]
+    return flags[~hit]
+
+
+def _keep_inside(flags: pd.DataFrame, affected: np.ndarray, ctx: QcContext) -> pd.DataFrame:
+    if flags is None or flags.empty:
+        return flags
+    outside = _keep_outside(flags, affected, ctx)
+    return flags.drop(index=outside.index)
+
+
+def run_qc_incremental(ctx: QcContext, key: str, enabled=None, store_dir: str = DEFAULT_QC_STORE_DIR) -> tuple:
+    """
+    Seperti run_qc_rules, tetapi memakai ulang flag dari store untuk sel yang tidak berubah.
+    rule_stats mendapat kolom Mode (penuh / inkremental / dipakai ulang) dan Sel Dievaluasi.
+    """
+    enabled = set(default_enabled_rules() if enabled is None else enabled)
+    store = QcFlagStore(key, store_dir)
+    old_rules = store.state["rules"] if store.state else {}
+    masks = _affected_masks(ctx, store.state)
+    n_cells = ctx.values.size
+
+    parts, stats, new_rules = [], [], {}
+    for code, rule in QC_RULES.items():
+        row = stats_row(rule)
+        row.update({"Mode": "-", "Sel Dievaluasi": 0})
+        if code not in enabled:
+            stats.append(row)
+            continue
+
+        sig = _rule_signature(rule, ctx)
+        prev = old_rules.get(code)
+        full = masks is None or prev is None or prev["sig"] != sig
+
+        if full:
+            res = execute_rule(rule, ctx, row)
+            flags = res if res is not None else concat_flags([])
+            row.update({"Mode": "penuh", "Sel Dievaluasi": n_cells})
+        else:
+            affected = masks[rule.scope]
+            if not affected.any():
+                flags = prev["flags"]
+                row.update({"Status": "ok", "Mode": "dipakai ulang"})
+            else:
+                rows_ = np.nonzero(affected.any(axis=1))[0]
+                cols_ = np.nonzero(affected.any(axis=0))[0]
+                if rule.scope == "cell":
+                    sub = ctx.take(days=rows_, stations=cols_)
+                elif rule.scope == "day":
+                    sub = ctx.take(days=rows_)
+                elif rule.scope == "station":
+                    sub = ctx.take(stations=cols_)
+                else:
+                    sub = ctx
+                res = execute_rule(rule, sub, row)
+                if res is None:
+                    # Aturan gagal: flag lama tetap ditampilkan apa adanya
+                    flags = prev["flags"]
+                else:
+                    fresh = _keep_inside(res, affected, ctx)
+                    flags = concat_flags([_keep_outside(prev["flags"], affected, ctx), fresh])
+                row.update({"Mode": "inkremental", "Sel Dievaluasi": int(sub.values.size)})
+
+        row["Jumlah Flag"] = len(flags)
+        # Aturan yang error tidak disimpan: Run berikutnya mengevaluasinya penuh, bukan memakai ulang
+        # hasil kosong sebagai lolos
+        if not str(row.get("Status", "")).startswith("error"):
+            new_rules[code] = {"sig": sig, "flags": flags}
+        parts.append(flags)
+        stats.append(row)
+
+    if masks is not None and all(r["Mode"] in ("dipakai ulang", "-") for r in stats):
+        # Tidak ada perubahan sama sekali: store tetap valid, tidak perlu ditulis ulang
+        return concat_flags(parts), pd.DataFrame(stats)
+
+    history = None
+    if ctx.history is not None:
+        history = ctx.history.loc[:ctx.win_end] if ctx.win_end is not None else ctx.history
+    store.save({
+        "stations": list(ctx.stations),
+        "tgl": np.asarray(ctx.tgl),
+        "win_values": ctx.values,
+        "history": history,
+        "records_digest": _records_digest(ctx),
+        "rules": new_rules,
+    })
+
+    return concat_flags(parts), pd.DataFrame(stats)
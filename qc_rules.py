@@ -0,0 +1,349 @@
+# qc_rules.py
+#
+# Registry aturan QC. Setiap aturan adalah fungsi vektor atas satu konteks window bersama
+# (matriks nilai, tanggal, riwayat harian, indeks tetangga, ambang stasiun, tabel metadata)
+# yang dideklarasikan dengan kode FLAG, severity, dan status aktif default.
+# run_qc_rules menjalankan semua aturan aktif dalam satu lintasan dan mencatat waktu
+# eksekusi serta jumlah flag per aturan.
+#
+# Menambah aturan baru cukup dengan dekorator:
+#
+#   @qc_rule("KODE_FLAG", severity="warning", label="Deskripsi singkat", requires=("history",))
+#   def _cek_baru(ctx):
+#       ...  # return DataFrame dengan kolom QC_COLUMNS
+
+import time
+
+import numpy as np
+import pandas as pd
+
+from qc_spatial import spatial_buddy_check
+from qc_temporal import level_shift_check, repeated_value_check, zero_run_check
+from qc_thresholds import flag_station_extremes
+
+QC_COLUMNS = ["TGL", "Station", "Nilai", "FLAG", "Keterangan"]
+SEVERITIES = ("error", "warning", "info")
+# Cakupan ketergantungan aturan (dipakai QC inkremental untuk menentukan sel yang perlu dievaluasi ulang):
+#   cell    : hanya sel itu sendiri
+#   day     : sel + tetangga spasial pada hari yang sama
+#   station : seluruh window stasiun itu (bergantung deret waktu stasiun)
+#   window  : seluruh window (metadata / bergantung banyak stasiun & hari)
+SCOPES = ("cell", "day", "station", "window")
+EXTREME_ABS_MM = 200.0
+
+
+class QcContext:
+    """Konteks bersama satu window QC; atribut opsional bernilai None bila tidak tersedia."""
+
+    def __init__(self, values, stations, tgl, dates=None, history: pd.DataFrame = None,
+                 neighbor_index: dict = None, station_thresholds=None, records: pd.DataFrame = None,
+                 duplicates: pd.DataFrame = None, unknown_names: pd.DataFrame = None, params: dict = None):
+        self.values = np.asarray(values, dtype=np.float64)      # [hari, stasiun]
+        self.stations = [str(s) for s in stations]
+        self.tgl = np.asarray(tgl)
+        self.dates = pd.DatetimeIndex(dates) if dates is not None else None
+        self.history = history
+        self.neighbor_index = neighbor_index
+        self.station_thresholds = station_thresholds
+        self.records = records
+        self.duplicates = duplicates
+        self.unknown_names = unknown_names
+        self.params = {"extreme_abs_mm": EXTREME_ABS_MM}
+        self.params.update(params or {})
+
+    @classmethod
+    def from_wide(cls, wide_num_win: pd.DataFrame, stations, year: int = None, month: int = None, **kwargs):
+        """Konteks dari wide_num_out (kolom TGL + stasiun) hasil build_outputs."""
+        tgl = wide_num_win["TGL"].astype(int).to_numpy()
+        dates = None
+        if year is not None and month is not None:
+            dates = pd.Timestamp(year=int(year), month=int(month), day=1) + pd.to_timedelta(tgl - 1, unit="D")
+        values = wide_num_win.reindex(columns=list(stations))
+        try:
+            values = values.to_numpy(dtype=np.float64)
+        except (TypeError, ValueError):
+            values = values.apply(pd.to_numeric, errors="coerce").to_numpy(dtype=np.float64)
+        values = np.where(values == 9999, np.nan, values)      # kode BMKG data tidak ada
+        return cls(values, stations, tgl, dates=dates, **kwargs)
+
+    def take(self, days=None, stations=None) -> "QcContext":
+        """Sub-konteks untuk indeks baris hari dan/atau indeks kolom stasiun tertentu."""
+        d = slice(None) if days is None else np.asarray(days)
+        s = slice(None) if stations is None else np.asarray(stations)
+        st_names = self.stations if stations is None else [self.stations[i] for i in s]
+        history = self.history
+        if history is not None and stations is not None:
+            history = history.reindex(columns=st_names)
+        return QcContext(
+            self.values[d][:, s], st_names, self.tgl[d],
+            dates=self.dates[d] if self.dates is not None else None,
+            history=history,
+            neighbor_index=self.neighbor_index if stations is None else None,
+            station_thresholds=self.station_thresholds,
+            records=self.records, duplicates=self.duplicates, unknown_names=self.unknown_names,
+            params=self.params,
+        )
+
+    @property
+    def win_start(self):
+        return self.dates.min() if self.dates is not None and len(self.dates) else None
+
+    @property
+    def win_end(self):
+        return self.dates.max() if self.dates is not None and len(self.dates) else None
+
+
+class QcRule:
+    def __init__(self, code: str, func, severity: str, label: str, enabled: bool = True, requires=(),
+                 scope: str = "cell"):
+        if severity not in SEVERITIES:
+            raise ValueError(f"Severity tidak dikenal: {severity}")
+        if scope not in SCOPES:
+            raise ValueError(f"Scope tidak dikenal: {scope}")
+        self.code = code
+        self.func = func
+        self.severity = severity
+        self.label = label
+        self.enabled = enabled
+        self.requires = tuple(requires)
+        self.scope = scope
+
+    def missing_inputs(self, ctx: QcContext) -> list:
+        return [name for name in self.requires if getattr(ctx, name, None) is None]
+
+
+QC_RULES = {}
+
+
+def qc_rule(code: str, severity: str = "warning", label: str = "", enabled: bool = True, requires=(),
+            scope: str = "cell"):
+    """Dekorator pendaftaran aturan QC ke QC_RULES (urutan deklarasi = urutan eksekusi)."""
+    def _register(func):
+        QC_RULES[code] = QcRule(code, func, severity, label or code, enabled, requires, scope)
+        return func
+    return _register
+
+
+def default_enabled_rules() -> list:
+    return [code for code, rule in QC_RULES.items() if rule.enabled]
+
+
+def _cell_flags(ctx: QcContext, mask: np.ndarray, flag: str, keterangan, nilai=None) -> pd.DataFrame:
+    d_idx, s_idx = np.nonzero(mask)
+    return pd.DataFrame({
+        "TGL": ctx.tgl[d_idx],
+        "Station": np.asarray(ctx.stations)[s_idx],
+        "Nilai": ctx.values[d_idx, s_idx] if nilai is None else nilai,
+        "FLAG": flag,
+        "Keterangan": keterangan,
+    }, columns=QC_COLUMNS)
+
+
+# ============================================================
+# Aturan per sel
+# ============================================================
+
+@qc_rule("MISSING_DATA", severity="warning", label="Data kosong / 9999")
+def _missing_data(ctx):
+    return _cell_flags(ctx, ~np.isfinite(ctx.values), "MISSING_DATA",
+                       "Data harian tidak terisi / hilang (Missing Value)", nilai="KOSONG / 9999")
+
+
+@qc_rule("INVALID_NEGATIVE", severity="error", label="Nilai negatif")
+def _invalid_negative(ctx):
+    with np.errstate(invalid="ignore"):
+        mask = ctx.values < 0
+    return _cell_flags(ctx, mask, "INVALID_NEGATIVE", "Nilai curah hujan negatif")
+
+
+@qc_rule("EXTREME_VALUE", severity="warning", label="Melebihi batas absolut")
+def _extreme_value(ctx):
+    thr = float(ctx.params["extreme_abs_mm"])
+    with np.errstate(invalid="ignore"):
+        mask = ctx.values > thr
+    return _cell_flags(ctx, mask, "EXTREME_VALUE", f"Curah hujan sangat tinggi (> {thr:g} mm)")
+
+
+@qc_rule("EXTREME_STATION", severity="warning", label="Melebihi ambang historis stasiun",
+         requires=("station_thresholds", "dates"))
+def _extreme_station(ctx):
+    return flag_station_extremes(ctx.values, ctx.dates, ctx.tgl, ctx.stations, ctx.station_thresholds)
+
+
+# ============================================================
+# Aturan rekaman mentah / metadata
+# ============================================================
+
+@qc_rule("INVALID_FORMAT", severity="error", label="Format nilai tidak valid", requires=("records",),
+         scope="window")
+def _invalid_format(ctx):
+    rec = ctx.records
+    raw = rec["RAINFALL DAY MM"]
+    text = raw.astype(str).str.strip()
+    bad = raw.notna() & (text != "") & pd.to_numeric(raw, errors="coerce").isna()
+    rec = rec[bad]
+    return pd.DataFrame({
+        "TGL": rec["TGL"].to_numpy(),
+        "Station": rec["NAME"].astype(str).to_numpy(),
+        "Nilai": text[bad].to_numpy(),
+        "FLAG": "INVALID_FORMAT",
+        "Keterangan": "Format karakter tidak valid",
+    }, columns=QC_COLUMNS)
+
+
+@qc_rule("DUPLICATE_RECORD", severity="warning", label="Lebih dari satu record per pos-hari",
+         requires=("duplicates",), scope="window")
+def _duplicate_record(ctx):
+    dup = ctx.duplicates
+    if dup.empty:
+        return pd.DataFrame(columns=QC_COLUMNS)
+    return pd.DataFrame({
+        "TGL": dup["TGL"].to_numpy(),
+        "Station": dup["NAME_H"].astype(str).to_numpy(),
+        "Nilai": dup["n_records"].to_numpy(),
+        "FLAG": "DUPLICATE_RECORD",
+        "Keterangan": [f"{n} record untuk pos-hari yang sama; dipakai record pertama" for n in dup["n_records"]],
+    }, columns=QC_COLUMNS)
+
+
+@qc_rule("UNKNOWN_STATION", severity="warning", label="Nama pos tidak dikenal", requires=("unknown_names",),
+         scope="window")
+def _unknown_station(ctx):
+    unk = ctx.unknown_names
+    if unk.empty:
+        return pd.DataFrame(columns=QC_COLUMNS)
+    return pd.DataFrame({
+        "TGL": np.nan,
+        "Station": unk["NAME"].astype(str).to_numpy(),
+        "Nilai": unk["count"].to_numpy(),
+        "FLAG": "UNKNOWN_STATION",
+        "Keterangan": "Nama pos tidak ada di header maupun NAME_MAP; record diabaikan",
+    }, columns=QC_COLUMNS)
+
+
+# ============================================================
+# Aturan spasial & temporal
+# ============================================================
+
+@qc_rule("SPATIAL_OUTLIER", severity="warning", label="Buddy check tetangga", requires=("neighbor_index",),
+         scope="day")
+def _spatial_outlier(ctx):
+    if list(ctx.neighbor_index["stations"]) != ctx.stations:
+        return pd.DataFrame(columns=QC_COLUMNS)
+    return spatial_buddy_check(ctx.values, ctx.neighbor_index, tgl=ctx.tgl)
+
+
+@qc_rule("REPEATED_VALUE", severity="warning", label="Nilai identik berulang", requires=("history", "dates"),
+         scope="station")
+def _repeated_value(ctx):
+    return repeated_value_check(ctx.history, ctx.win_start, ctx.win_end)
+
+
+@qc_rule("SUSPECT_ZERO_RUN", severity="info", label="Deret nol mencurigakan", requires=("history", "dates"),
+         scope="station")
+def _suspect_zero_run(ctx):
+    return zero_run_check(ctx.history, ctx.win_start, ctx.win_end)
+
+
+@qc_rule("LEVEL_SHIFT", severity="warning", label="Pergeseran level vs tetangga",
+         requires=("history", "dates", "neighbor_index"), scope="window")
+def _level_shift(ctx):
+    return level_shift_check(ctx.history, ctx.win_start, ctx.win_end, ctx.neighbor_index)
+
+
+# ============================================================
+# Runner
+# ============================================================
+
+def stats_row(rule: QcRule) -> dict:
+    return {"FLAG": rule.code, "Aturan": rule.label, "Severity": rule.severity, "Status": "nonaktif",
+            "Jumlah Flag": 0, "Waktu (ms)": 0.0}
+
+
+def execute_rule(rule: QcRule, ctx: QcContext, row: dict) -> pd.DataFrame:
+    """Menjalankan satu aturan dengan pencatatan status & waktu ke `row`; return flag (+SEVERITY) atau None."""
+    missing = rule.missing_inputs(ctx)
+    if missing:
+        row["Status"] = "dilewati (tanpa " + ", ".join(missing) + ")"
+        return None
+
+    t0 = time.perf_counter()
+    try:
+        res = rule.func(ctx)
+        row["Status"] = "ok"
+    except Exception as e:
+        res = None
+        row["Status"] = f"error: {e}"
+    row["Waktu (ms)"] = round((time.perf_counter() - t0) * 1000.0, 2)
+
+    if res is None:
+        return None
+    return res.assign(SEVERITY=rule.severity)
+
+
+def concat_flags(parts) -> pd.DataFrame:
+    parts = [p for p in parts if p is not None and not p.empty]
+    if not parts:
+        return pd.DataFrame(columns=QC_COLUMNS + ["SEVERITY"])
+    return pd.concat(parts, ignore_index=True)
+
+
+def run_qc_rules(ctx: QcContext, enabled=None) -> tuple:
+    """
+    Menjalankan aturan aktif (default: yang enabled=True) dalam urutan registry.
+    Return (qc_df, rule_stats): qc_df skema QC_COLUMNS + SEVERITY (kolom tambahan aturan
+    dipertahankan); rule_stats per aturan berisi severity, status, jumlah flag, dan waktu (ms).
+    """
+    enabled = set(default_enabled_rules() if enabled is None else enabled)
+    parts, stats = [], []
+
+    for code, rule in QC_RULES.items():
+        row = stats_row(rule)
+        if code in enabled:
+            res = execute_rule(rule, ctx, row)
+            if res is not None:
+                row["Jumlah Flag"] = len(res)
+                parts.append(res)
+        stats.append(row)
+
+    return concat_flags(parts), pd.DataFrame(stats)
+
+
+def completeness_summary(values: np.ndarray, stations) -> dict:
+    """Kelengkapan window per pos (vektor): NaN / 9999 dihitung missing."""
+    v = np.asarray(values, dtype=np.float64)
+    num_days = v.shape[0]
+    if num_days == 0 or v.shape[1] == 0:
+        return {
+            "total_stations": 0,
+            "completed_stations_count": 0,
+            "incomplete_stations_count": 0,
+            "total_expected_records": 0,
+            "total_real_records": 0,
+            "overall_completeness_pct": 0.0,
+            "station_breakdown": pd.DataFrame()
+        }
+
+    missing = (~np.isfinite(v) | (v == 9999)).sum(axis=0)
+    real = num_days - missing
+    completed = missing == 0
+    df_summary = pd.DataFrame({
+        "Station": list(stations),
+        "Expected": num_days,
+        "Real": real,
+        "Missing": missing,
+        "Completeness_Pct": np.round(real / num_days * 100, 1),
+        "Status": np.where(completed, "COMPLETED", "INCOMPLETE"),
+    })
+
+    tot_exp = int(num_days * len(df_summary))
+    tot_real = int(real.sum())
+    return {
+        "total_stations": len(df_summary),
+        "completed_stations_count": int(completed.sum()),
+        "incomplete_stations_count": int((~completed).sum()),
+        "total_expected_records": tot_exp,
+        "total_real_records": tot_real,
+        "overall_completeness_pct": round(tot_real / tot_exp * 100, 1) if tot_exp > 0 else 0.0,
+        "station_breakdown": df_summary
+    }
@@ -0,0 +1,114 @@
+# qc_spatial.py
+#
+# QC konsistensi spasial (buddy check). Indeks tetangga (k-terdekat dalam radius, jarak
+# haversine) dibangun sekali dari koordinat stasiun, lalu setiap hari dalam window dibandingkan
+# dengan median/MAD tetangganya menggunakan operasi array [hari, stasiun, tetangga].
+
+import warnings
+
+import numpy as np
+import pandas as pd
+
+EARTH_RADIUS_KM = 6371.0088
+
+DEFAULT_K = 8
+DEFAULT_RADIUS_KM = 40.0
+MIN_NEIGHBORS = 3
+Z_THRESHOLD = 4.0        # |robust z| minimal untuk dianggap outlier
+MIN_DIFF_MM = 40.0       # selisih absolut minimal terhadap median tetangga
+MIN_SCALE_MM = 5.0       # batas bawah skala MAD agar tetangga yang seragam kering tidak memicu flag berlebihan
+DRY_NEIGHBOR_MM = 20.0   # pos melapor 0 padahal median tetangga >= nilai ini -> outlier kering
+
+
+def haversine_matrix(lat, lon) -> np.ndarray:
+    """Matriks jarak antar titik (km), NaN bila koordinat salah satu titik kosong."""
+    lat = np.radians(np.asarray(lat, dtype=np.float64))
+    lon = np.radians(np.asarray(lon, dtype=np.float64))
+    dlat = lat[:, None] - lat[None, :]
+    dlon = lon[:, None] - lon[None, :]
+    a = np.sin(dlat / 2) ** 2 + np.cos(lat[:, None]) * np.cos(lat[None, :]) * np.sin(dlon / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(np.clip(a, 0.0, 1.0)))
+
+
+def build_neighbor_index(coords: pd.DataFrame, k: int = DEFAULT_K, radius_km: float = DEFAULT_RADIUS_KM) -> dict:
+    """
+    Indeks tetangga dari hasil prepare_station_coordinates (urutan HORIZONTAL_COLS).
+    Return dict: stations, idx [n, k] (indeks kolom tetangga, -1 = kosong), dist_km [n, k].
+    """
+    stations = coords["station"].astype(str).tolist()
+    dist = haversine_matrix(coords["lat"], coords["lon"])
+    np.fill_diagonal(dist, np.nan)
+    dist = np.where(np.isfinite(dist) & (dist <= radius_km), dist, np.inf)
+
+    k = min(int(k), max(len(stations) - 1, 0))
+    order = np.argsort(dist, axis=1, kind="stable")[:, :k]
+    nb_dist = np.take_along_axis(dist, order, axis=1)
+    nb_idx = np.where(np.isfinite(nb_dist), order, -1)
+
+    return {
+        "stations": stations,
+        "idx": nb_idx.astype(np.int32),
+        "dist_km": np.where(np.isfinite(nb_dist), nb_dist, np.nan),
+        "k": k,
+        "radius_km": float(radius_km),
+    }
+
+
+def neighbor_stats(values: np.ndarray, neighbor_index: dict) -> tuple:
+    """Median, MAD, dan jumlah tetangga valid per sel [hari, stasiun]."""
+    v = np.asarray(values, dtype=np.float64)
+    idx = neighbor_index["idx"]
+    nb = v[:, np.where(idx >= 0, idx, 0)]                 # [hari, stasiun, k]
+    nb = np.where((idx >= 0)[None, :, :], nb, np.nan)
+
+    n_nb = np.isfinite(nb).sum(axis=2)
+    with warnings.catch_warnings():
+        warnings.simplefilter("ignore", category=RuntimeWarning)
+        med = np.nanmedian(nb, axis=2)
+        mad = np.nanmedian(np.abs(nb - med[:, :, None]), axis=2)
+    return med, mad, n_nb
+
+
+def spatial_buddy_check(values: np.ndarray, neighbor_index: dict, tgl=None,
+                        z_thr: float = Z_THRESHOLD, min_diff_mm: float = MIN_DIFF_MM,
+                        min_neighbors: int = MIN_NEIGHBORS) -> pd.DataFrame:
+    """
+    Menandai SPATIAL_OUTLIER untuk seluruh sel window sekaligus:
+      - basah terisolasi: nilai jauh di atas median tetangga (robust z & selisih absolut)
+      - kering terisolasi: melapor 0 padahal median tetangga >= DRY_NEIGHBOR_MM
+    Skema kolom mengikuti run_quality_control (TGL, Station, Nilai, FLAG, Keterangan).
+    """
+    v = np.asarray(values, dtype=np.float64)
+    stations = neighbor_index["stations"]
+    tgl = np.arange(1, v.shape[0] + 1) if tgl is None else np.asarray(tgl)
+
+    med, mad, n_nb = neighbor_stats(v, neighbor_index)
+    scale = np.maximum(1.4826 * np.nan_to_num(mad), MIN_SCALE_MM)
+    with np.errstate(invalid="ignore"):
+        z = (v - med) / scale
+        enough = np.isfinite(v) & (n_nb >= min_neighbors)
+        wet_out = enough & (z > z_thr) & ((v - med) >= min_diff_mm)
+        dry_out = enough & (v == 0) & (med >= DRY_NEIGHBOR_MM)
+
+    d_idx, s_idx = np.nonzero(wet_out | dry_out)
+    if len(d_idx) == 0:
+        return pd.DataFrame(columns=["TGL", "Station", "Nilai", "FLAG", "Keterangan",
+                                     "neighbor_median_mm", "robust_z", "n_neighbors"])
+
+    is_wet = wet_out[d_idx, s_idx]
+    nb_med = med[d_idx, s_idx]
+    keterangan = np.where(
+        is_wet,
+        [f"Jauh di atas median {n} tetangga ({m:.1f} mm)" for n, m in zip(n_nb[d_idx, s_idx], nb_med)],
+        [f"Kering sendiri, median {n} tetangga {m:.1f} mm" for n, m in zip(n_nb[d_idx, s_idx], nb_med)],
+    )
+    return pd.DataFrame({
+        "TGL": tgl[d_idx],
+        "Station": np.asarray(stations)[s_idx],
+        "Nilai": v[d_idx, s_idx],
+        "FLAG": "SPATIAL_OUTLIER",
+        "Keterangan": keterangan,
+        "neighbor_median_mm": nb_med.round(1),
+        "robust_z": z[d_idx, s_idx].round(2),
+        "n_neighbors": n_nb[d_idx, s_idx],
+    })
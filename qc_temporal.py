@@ -0,0 +1,183 @@
+# qc_temporal.py
+#
+# QC konsistensi temporal atas matriks harian [hari, stasiun] termasuk lookback:
+#   - REPEATED_VALUE   : nilai > 0 identik beberapa hari berturut-turut (gauge macet / copy-paste)
+#   - SUSPECT_ZERO_RUN : deret 0 panjang yang sangat tidak mungkin untuk peluang hari basah stasiun
+#   - LEVEL_SHIFT      : rasio terhadap median tetangga berubah drastis dibanding periode sebelumnya
+# Semua cek memakai satu primitif run-length vektor (run_lengths).
+
+import numpy as np
+import pandas as pd
+
+from qc_spatial import neighbor_stats
+
+MIN_REPEAT_DAYS = 4          # nilai identik >= 4 hari berurutan
+MIN_ZERO_RUN = 10            # minimal panjang deret 0 (satu dasarian)
+ZERO_RUN_MAX_PROB = 0.01     # flag bila peluang deret kering sepanjang itu < 1%
+WET_DAY_MM = 1.0
+MIN_HISTORY_DAYS = 30        # minimal hari valid musim yang sama untuk estimasi peluang basah
+SHIFT_LOOKBACK_DAYS = 60
+SHIFT_FACTOR = 3.0           # perubahan rasio stasiun/tetangga >= 3x (atau <= 1/3)
+SHIFT_MIN_NEIGHBOR_MM = 20.0
+
+QC_COLUMNS = ["TGL", "Station", "Nilai", "FLAG", "Keterangan"]
+
+
+def run_lengths(mask: np.ndarray) -> np.ndarray:
+    """Panjang run True yang berakhir di tiap sel, per kolom (0 bila sel False)."""
+    mask = np.asarray(mask, dtype=bool)
+    c = np.cumsum(mask, axis=0, dtype=np.int32)
+    base = np.maximum.accumulate(np.where(mask, 0, c), axis=0)
+    return c - base
+
+
+def _run_end_records(run_len: np.ndarray, mask: np.ndarray, in_win: np.ndarray, min_len: int):
+    """Sel akhir run (dalam window) yang panjang totalnya >= min_len: return (indeks hari, indeks stasiun)."""
+    nxt = np.vstack([mask[1:], np.zeros((1, mask.shape[1]), dtype=bool)])
+    last_win_day = np.zeros_like(in_win)
+    last_win_day[np.nonzero(in_win)[0][-1]] = True
+    is_end = mask & (~nxt | last_win_day[:, None]) & in_win[:, None] & (run_len >= min_len)
+    return np.nonzero(is_end)
+
+
+def _prepare(history: pd.DataFrame, win_start, win_end):
+    """Potong riwayat s.d. win_end; None bila window tidak punya hari."""
+    win_start, win_end = pd.Timestamp(win_start), pd.Timestamp(win_end)
+    hist = history.loc[:win_end]
+    if hist.empty:
+        return None
+    dates = pd.DatetimeIndex(hist.index)
+    in_win = np.asarray((dates >= win_start) & (dates <= win_end))
+    if not in_win.any():
+        return None
+    v = hist.to_numpy(dtype=np.float64)
+    return {
+        "dates": dates, "stations": np.asarray(hist.columns.astype(str)), "v": v, "valid": np.isfinite(v),
+        "in_win": in_win, "win_start": win_start, "win_end": win_end,
+    }
+
+
+def _frame(records) -> pd.DataFrame:
+    if not records:
+        return pd.DataFrame(columns=QC_COLUMNS)
+    return pd.DataFrame(records, columns=QC_COLUMNS)
+
+
+def repeated_value_check(history: pd.DataFrame, win_start, win_end) -> pd.DataFrame:
+    """REPEATED_VALUE: nilai > trace identik >= MIN_REPEAT_DAYS hari berturut-turut."""
+    p = _prepare(history, win_start, win_end)
+    if p is None:
+        return _frame([])
+    dates, stations, v, valid = p["dates"], p["stations"], p["v"], p["valid"]
+
+    prev = np.vstack([np.full((1, v.shape[1]), np.nan), v[:-1]])
+    same = valid & (v > 0.1) & (v == prev)
+    same_len = run_lengths(same) + 1            # run perbandingan k -> k+1 hari identik
+    same_len = np.where(same, same_len, 0)
+    records = []
+    for d, s in zip(*_run_end_records(same_len, same, p["in_win"], MIN_REPEAT_DAYS)):
+        n = int(same_len[d, s])
+        start = dates[d - n + 1]
+        records.append({
+            "TGL": int(dates[d].day), "Station": stations[s], "Nilai": float(v[d, s]),
+            "FLAG": "REPEATED_VALUE",
+            "Keterangan": f"Nilai {v[d, s]:g} mm identik {n} hari berturut-turut (sejak {start:%d %b %Y})",
+        })
+    return _frame(records)
+
+
+def zero_run_check(history: pd.DataFrame, win_start, win_end) -> pd.DataFrame:
+    """SUSPECT_ZERO_RUN: deret 0 yang sangat tidak mungkin untuk peluang hari basah musiman stasiun."""
+    p = _prepare(history, win_start, win_end)
+    if p is None:
+        return _frame([])
+    dates, stations, v, valid, in_win = p["dates"], p["stations"], p["v"], p["valid"], p["in_win"]
+
+    zero = valid & (v == 0)
+    zero_len = run_lengths(zero)
+    months = dates.month.to_numpy()
+    m = p["win_end"].month
+    season = np.isin(months, [(m - 2) % 12 + 1, m, m % 12 + 1]) & ~in_win
+    n_hist = (valid & season[:, None]).sum(axis=0)
+    n_wet = (valid & season[:, None] & (v >= WET_DAY_MM)).sum(axis=0)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        p_wet = np.where(n_hist >= MIN_HISTORY_DAYS, n_wet / n_hist, np.nan)
+
+    records = []
+    for d, s in zip(*_run_end_records(zero_len, zero, in_win, MIN_ZERO_RUN)):
+        n = int(zero_len[d, s])
+        if not np.isfinite(p_wet[s]):
+            continue
+        prob = (1.0 - p_wet[s]) ** n
+        if prob >= ZERO_RUN_MAX_PROB:
+            continue
+        start = dates[d - n + 1]
+        records.append({
+            "TGL": int(dates[d].day), "Station": stations[s], "Nilai": 0.0,
+            "FLAG": "SUSPECT_ZERO_RUN",
+            "Keterangan": (
+                f"{n} hari berturut-turut 0 mm sejak {start:%d %b %Y}; peluang hari basah musim ini "
+                f"{p_wet[s] * 100:.0f}% (peluang deret kering {prob:.1e})"
+            ),
+        })
+    return _frame(records)
+
+
+def level_shift_check(history: pd.DataFrame, win_start, win_end, neighbor_index: dict = None) -> pd.DataFrame:
+    """LEVEL_SHIFT: rasio stasiun/median tetangga di window vs SHIFT_LOOKBACK_DAYS hari sebelumnya."""
+    p = _prepare(history, win_start, win_end)
+    if p is None or neighbor_index is None or list(neighbor_index["stations"]) != list(p["stations"]):
+        return _frame([])
+    dates, stations, v, valid, in_win = p["dates"], p["stations"], p["v"], p["valid"], p["in_win"]
+    win_start = p["win_start"]
+
+    before = np.asarray((dates >= win_start - pd.Timedelta(days=SHIFT_LOOKBACK_DAYS)) & (dates < win_start))
+    if not before.any():
+        return _frame([])
+    # Median tetangga hanya untuk hari yang dipakai (lookback + window), bukan seluruh riwayat
+    used = before | in_win
+    v, valid, before, in_win = v[used], valid[used], before[used], in_win[used]
+    med, _, n_nb = neighbor_stats(v, neighbor_index)
+
+    def _ratio(sel):
+        both = valid[sel] & np.isfinite(med[sel])
+        st_sum = np.where(both, v[sel], 0.0).sum(axis=0)
+        nb_sum = np.where(both, med[sel], 0.0).sum(axis=0)
+        frac = both.sum(axis=0) / max(int(sel.sum()), 1)
+        with np.errstate(invalid="ignore", divide="ignore"):
+            r = np.where((nb_sum >= SHIFT_MIN_NEIGHBOR_MM) & (frac >= 0.8), st_sum / nb_sum, np.nan)
+        return r
+
+    r_before, r_win = _ratio(before), _ratio(in_win)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        change = r_win / r_before
+    shifted = np.isfinite(change) & (r_before > 0) & ((change >= SHIFT_FACTOR) | (change <= 1.0 / SHIFT_FACTOR))
+    records = []
+    for s in np.nonzero(shifted)[0]:
+        records.append({
+            "TGL": int(win_start.day), "Station": stations[s], "Nilai": float(round(r_win[s], 2)),
+            "FLAG": "LEVEL_SHIFT",
+            "Keterangan": (
+                f"Rasio terhadap median tetangga {r_before[s]:.2f} -> {r_win[s]:.2f} "
+                f"({change[s]:.1f}x) dibanding {SHIFT_LOOKBACK_DAYS} hari sebelumnya"
+            ),
+        })
+    return _frame(records)
+
+
+def temporal_checks(history: pd.DataFrame, win_start, win_end, neighbor_index: dict = None) -> pd.DataFrame:
+    """
+    Cek temporal untuk window [win_start, win_end] memakai matriks harian kontinu `history`
+    (index tanggal, kolom stasiun, mis. build_daily_matrix dari timeseries lookback 365 hari).
+    Run yang dimulai sebelum window tetap dihitung panjang penuhnya.
+    Return tabel flag dengan skema run_quality_control (TGL = hari dalam bulan).
+    """
+    parts = [
+        repeated_value_check(history, win_start, win_end),
+        zero_run_check(history, win_start, win_end),
+        level_shift_check(history, win_start, win_end, neighbor_index),
+    ]
+    parts = [df for df in parts if not df.empty]
+    if not parts:
+        return _frame([])
+    return pd.concat(parts, ignore_index=True)
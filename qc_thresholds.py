@@ -0,0 +1,226 @@
+# qc_thresholds.py
+#
+# Ambang ekstrem robust per stasiun per musim (DJF/MAM/JJA/SON) dari catatan historis.
+# Disimpan sebagai histogram hari basah berbin log (uint32 [musim, stasiun, bin]) sehingga
+# bisa diperbarui secara inkremental dengan hari-hari baru tanpa membaca ulang seluruh riwayat.
+# Ambang = Q99 + EXTENSION_FACTOR * (Q99 - median) hari basah (robust terhadap outlier tunggal),
+# dengan batas bawah MIN_THRESHOLD_MM.
+#
+#   python qc_thresholds.py build    # dari cube historis
+#   python qc_thresholds.py update   # hari baru dari cube (cron, setelah cube.py append)
+#
+# Aplikasi hanya membaca file ambang; pembaruan dilakukan dari data cube (bukan upload yang
+# belum tervalidasi) oleh satu proses CLI agar tidak ada penulis bersamaan.
+
+import argparse
+import os
+
+import numpy as np
+import pandas as pd
+
+from config import CACHE_DIR
+
+DEFAULT_THRESHOLDS_PATH = os.path.join(CACHE_DIR, "qc", "station_thresholds.npz")
+
+SEASON_OF_MONTH = np.array([0, 0, 1, 1, 1, 2, 2, 2, 3, 3, 3, 0])   # Jan..Des -> DJF, MAM, JJA, SON
+SEASON_NAMES = ["DJF", "MAM", "JJA", "SON"]
+WET_DAY_MM = 1.0
+BIN_EDGES_MM = np.concatenate([[WET_DAY_MM], np.geomspace(1.05, 2000.0, 255)])
+UPPER_QUANTILE = 0.99
+EXTENSION_FACTOR = 1.0
+MIN_WET_DAYS = 30
+MIN_THRESHOLD_MM = 50.0
+SETTLE_DAYS = 30          # hanya hari yang sudah "mengendap" (>= 30 hari lalu) ditambahkan inkremental
+
+
+def season_index(dates) -> np.ndarray:
+    return SEASON_OF_MONTH[pd.DatetimeIndex(dates).month.to_numpy() - 1]
+
+
+class StationThresholds:
+    """Histogram hari basah per (musim, stasiun) + tanggal terakhir yang sudah masuk."""
+
+    def __init__(self, stations, counts: np.ndarray = None, last_date=None):
+        self.stations = [str(s) for s in stations]
+        n_bins = len(BIN_EDGES_MM) - 1
+        self.counts = counts if counts is not None else np.zeros((4, len(self.stations), n_bins), dtype=np.uint32)
+        self.last_date = pd.Timestamp(last_date) if last_date is not None else None
+        self._thr = None
+
+    # --------------------------------------------------------
+    # Akumulasi
+    # --------------------------------------------------------
+
+    def add(self, daily: pd.DataFrame) -> int:
+        """Menambahkan hari-hari dari matriks harian (kolom = self.stations) ke histogram."""
+        daily = daily.reindex(columns=self.stations)
+        if daily.empty:
+            return 0
+        v = daily.to_numpy(dtype=np.float64)
+        season = np.broadcast_to(season_index(daily.index)[:, None], v.shape)
+        st_idx = np.broadcast_to(np.arange(v.shape[1])[None, :], v.shape)
+
+        wet = np.isfinite(v) & (v >= WET_DAY_MM)
+        b = np.clip(np.searchsorted(BIN_EDGES_MM, v[wet], side="right") - 1, 0, self.counts.shape[2] - 1)
+        np.add.at(self.counts, (season[wet], st_idx[wet], b), 1)
+
+        self.last_date = max(filter(None, [self.last_date, pd.Timestamp(daily.index.max())]))
+        self._thr = None
+        return int(wet.sum())
+
+    def update_incremental(self, daily: pd.DataFrame, today=None) -> int:
+        """
+        Tambahkan hari yang sudah melewati SETTLE_DAYS, hanya sepanjang rentang kontinu yang dimulai
+        tepat di last_date + 1 hari. Bila matriks mulai lebih lambat (ada celah), tidak ada yang
+        ditambahkan agar watermark tidak melompati hari yang belum pernah masuk histogram.
+        """
+        today = pd.Timestamp(today) if today is not None else pd.Timestamp.today().normalize()
+        settled_until = today - pd.Timedelta(days=SETTLE_DAYS)
+        days = pd.DatetimeIndex(daily.index).normalize()
+        sel = days <= settled_until
+        if self.last_date is not None:
+            sel &= days > self.last_date
+        if not sel.any():
+            return 0
+        days = days[sel]
+        start = self.last_date + pd.Timedelta(days=1) if self.last_date is not None else days[0]
+        n_contig = int(np.cumprod(days == pd.date_range(start, periods=len(days), freq="D")).sum())
+        if n_contig == 0:
+            return 0
+        return self.add(daily.loc[sel].iloc[:n_contig])
+
+    # --------------------------------------------------------
+    # Ambang
+    # --------------------------------------------------------
+
+    def quantile(self, q: float) -> np.ndarray:
+        """Kuantil hari basah [musim, stasiun] dari histogram (interpolasi log di dalam bin)."""
+        c = self.counts.astype(np.float64)
+        cw = np.cumsum(c, axis=2)
+        n = cw[..., -1]
+        target = q * n
+        pos = np.minimum((cw < target[..., None]).sum(axis=2), c.shape[2] - 1)
+        before = np.where(pos > 0, np.take_along_axis(cw, np.maximum(pos - 1, 0)[..., None], axis=2)[..., 0], 0.0)
+        in_bin = np.take_along_axis(c, pos[..., None], axis=2)[..., 0]
+        with np.errstate(invalid="ignore", divide="ignore"):
+            frac = np.clip((target - before) / in_bin, 0.0, 1.0)
+        lo, hi = np.log(BIN_EDGES_MM[pos]), np.log(BIN_EDGES_MM[pos + 1])
+        return np.where(n > 0, np.exp(lo + frac * (hi - lo)), np.nan)
+
+    def thresholds(self) -> np.ndarray:
+        """Ambang [musim, stasiun] dalam mm (NaN bila hari basah < MIN_WET_DAYS)."""
+        if self._thr is None:
+            q_hi, q50 = self.quantile(UPPER_QUANTILE), self.quantile(0.5)
+            thr = np.maximum(q_hi + EXTENSION_FACTOR * (q_hi - q50), MIN_THRESHOLD_MM)
+            n = self.counts.sum(axis=2)
+            self._thr = np.where(n >= MIN_WET_DAYS, thr, np.nan)
+        return self._thr
+
+    def lookup(self, dates, stations=None) -> np.ndarray:
+        """Ambang per sel [hari, stasiun] untuk tanggal-tanggal yang diberikan (satu gather vektor)."""
+        thr = self.thresholds()
+        if stations is not None:
+            pos = {s: i for i, s in enumerate(self.stations)}
+            idx = np.array([pos.get(str(s), -1) for s in stations])
+            thr = np.where(idx >= 0, thr[:, np.where(idx >= 0, idx, 0)], np.nan)
+        return thr[season_index(dates)]
+
+    def summary(self) -> pd.DataFrame:
+        thr = self.thresholds()
+        out = pd.DataFrame({"station": self.stations})
+        for i, name in enumerate(SEASON_NAMES):
+            out[f"thr_{name}_mm"] = thr[i].round(1)
+            out[f"n_wet_{name}"] = self.counts[i].sum(axis=1)
+        return out
+
+    # --------------------------------------------------------
+    # Persistensi
+    # --------------------------------------------------------
+
+    def save(self, path: str = DEFAULT_THRESHOLDS_PATH):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp = path + ".tmp.npz"
+        np.savez_compressed(
+            tmp,
+            stations=np.array(self.stations),
+            counts=self.counts,
+            last_date=np.array(str(self.last_date.date()) if self.last_date is not None else ""),
+        )
+        os.replace(tmp, path)
+
+    @classmethod
+    def load(cls, path: str = DEFAULT_THRESHOLDS_PATH):
+        if not os.path.exists(path):
+            return None
+        with np.load(path, allow_pickle=False) as z:
+            last = str(z["last_date"])
+            return cls([str(s) for s in z["stations"]], counts=z["counts"].copy(), last_date=last or None)
+
+
+def flag_station_extremes(values: np.ndarray, dates, tgl, stations, store: StationThresholds) -> pd.DataFrame:
+    """Flag EXTREME_STATION: nilai melebihi ambang historis stasiun-musim (satu perbandingan vektor)."""
+    v = np.asarray(values, dtype=np.float64)
+    thr = store.lookup(dates, stations)
+    with np.errstate(invalid="ignore"):
+        hit = np.isfinite(v) & np.isfinite(thr) & (v > thr)
+    d_idx, s_idx = np.nonzero(hit)
+    seasons = np.asarray(SEASON_NAMES)[season_index(dates)]
+    return pd.DataFrame({
+        "TGL": np.asarray(tgl)[d_idx],
+        "Station": np.asarray(stations)[s_idx],
+        "Nilai": v[d_idx, s_idx],
+        "FLAG": "EXTREME_STATION",
+        "Keterangan": [
+            f"Melebihi ambang historis stasiun musim {seasons[d]} ({thr[d, s]:.1f} mm)" for d, s in zip(d_idx, s_idx)
+        ],
+    }, columns=["TGL", "Station", "Nilai", "FLAG", "Keterangan"])
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Bangun ambang ekstrem per stasiun-musim dari cube historis.")
+    sub = parser.add_subparsers(dest="cmd", required=True)
+    p_build = sub.add_parser("build", help="Bangun ulang histogram dari seluruh cube")
+    p_build.add_argument("--cube", default=None)
+    p_build.add_argument("--out", default=DEFAULT_THRESHOLDS_PATH)
+    p_update = sub.add_parser("update", help="Tambahkan hari mengendap setelah tanggal terakhir dari cube")
+    p_update.add_argument("--cube", default=None)
+    p_update.add_argument("--path", default=DEFAULT_THRESHOLDS_PATH)
+    p_show = sub.add_parser("show", help="Tampilkan ambang per stasiun")
+    p_show.add_argument("--path", default=DEFAULT_THRESHOLDS_PATH)
+    args = parser.parse_args(argv)
+
+    if args.cmd == "show":
+        store = StationThresholds.load(args.path)
+        if store is None:
+            print(f"Belum ada ambang di {args.path}")
+            return 1
+        print(store.summary().to_string(index=False))
+        return 0
+
+    from cube import DEFAULT_CUBE_DIR, open_cube
+    cube = open_cube(args.cube or DEFAULT_CUBE_DIR)
+    if cube is None:
+        print("Cube historis belum ada. Jalankan: python cube.py build --start YYYY-MM-DD")
+        return 1
+    if args.cmd == "update":
+        store = StationThresholds.load(args.path)
+        if store is None:
+            print(f"Belum ada ambang di {args.path}. Jalankan: python qc_thresholds.py build")
+            return 1
+        start = store.last_date + pd.Timedelta(days=1) if store.last_date is not None else None
+        n = store.update_incremental(cube.to_frame(start=start))
+        if n > 0:
+            store.save(args.path)
+        print(f"{n} hari basah ditambahkan (s.d. {store.last_date:%Y-%m-%d}).")
+        return 0
+
+    store = StationThresholds(cube.stations)
+    settled_until = pd.Timestamp.today().normalize() - pd.Timedelta(days=SETTLE_DAYS)
+    n = store.add(cube.to_frame(end=settled_until))
+    store.save(args.out)
+    print(f"{n} hari basah dimasukkan (s.d. {store.last_date:%Y-%m-%d}); disimpan ke {args.out}")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
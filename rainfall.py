@@ -0,0 +1,123 @@
+# rainfall.py
+#
+# Primitif data curah hujan tanpa dependensi Streamlit / database, sehingga bisa dipakai
+# bersama oleh aplikasi, job CLI, dan modul analisis (cube, indeks, QC).
+
+import numpy as np
+import pandas as pd
+
+from config import HORIZONTAL_COLS, NAME_MAP
+
+# Kode BMKG per sel (stasiun x hari), disimpan sebagai uint8
+CODE_NO_ROW = 0     # tidak ada record            -> tampil "x", numerik NaN
+CODE_MEASURED = 1   # nilai terukur (> 0)         -> tampil angka
+CODE_ZERO = 2       # 0                           -> tampil "-", numerik 0.0
+CODE_TRACE = 3      # 8888 (trace)                -> tampil "0", numerik 0.1
+CODE_MISSING = 4    # record ada tapi 9999/kosong -> tampil "x", numerik NaN
+
+
+def month_end_day(year: int, month: int) -> int:
+    month_start = pd.Timestamp(year=year, month=month, day=1)
+    month_end = (month_start + pd.offsets.MonthEnd(1)).normalize()
+    return int(month_end.day)
+
+
+def normalize_station_name(s: pd.Series) -> pd.Series:
+    return s.astype(str).str.strip().str.replace(r"\s+", " ", regex=True)
+
+
+def map_station_name(s: pd.Series) -> pd.Series:
+    """Normalisasi spasi lalu petakan alias nama ke nama header HORIZONTAL_COLS (per nilai unik)."""
+    codes, uniques = pd.factorize(s, use_na_sentinel=False)
+    mapped = normalize_station_name(pd.Series(uniques)).replace(NAME_MAP).to_numpy(dtype=object)
+    return pd.Series(mapped[codes], index=s.index)
+
+
+def prepare_station_coordinates(coord_raw: pd.DataFrame) -> pd.DataFrame:
+    c = coord_raw.copy()
+    req = ["POS HUJAN ID", "NAME", "CURRENT LATITUDE", "CURRENT LONGITUDE", "CURRENT ELEVATION M"]
+    missing = [x for x in req if x not in c.columns]
+    if missing:
+        raise ValueError(f"Kolom wajib pada coords.csv tidak ditemukan: {missing}")
+
+    c = c.rename(columns={
+        "POS HUJAN ID": "pos_id",
+        "NAME": "name_raw",
+        "CURRENT LATITUDE": "lat_raw",
+        "CURRENT LONGITUDE": "lon_raw",
+        "CURRENT ELEVATION M": "elev_m",
+    })
+
+    c["name_raw"] = normalize_station_name(c["name_raw"])
+    c["station"] = c["name_raw"].replace(NAME_MAP)
+    
+    c["lat"] = pd.to_numeric(c["lat_raw"], errors="coerce")
+    c["lon"] = pd.to_numeric(c["lon_raw"], errors="coerce")
+    c["elev_m"] = pd.to_numeric(c["elev_m"], errors="coerce")
+
+    c["qc_coord_ok"] = c["lat"].notna() & c["lon"].notna()
+    c["qc_in_bounds_ntb"] = c["lat"].between(-11.5, -7.0) & c["lon"].between(115.0, 119.5)
+
+    dup_key = c[["lat", "lon"]].round(5).astype(str).agg(",".join, axis=1)
+    c["qc_dup_latlon"] = dup_key.duplicated(keep=False) & c["qc_coord_ok"]
+
+    base = pd.DataFrame({"station": HORIZONTAL_COLS})
+    out = base.merge(
+        c[["station", "pos_id", "lat", "lon", "elev_m", "name_raw", "qc_coord_ok", "qc_in_bounds_ntb", "qc_dup_latlon"]],
+        on="station",
+        how="left"
+    )
+
+    out["qc_flag"] = np.where(out["lat"].notna() & out["lon"].notna(), "OK", "MISSING_COORD")
+    out.loc[(out["qc_flag"] == "OK") & (out["qc_in_bounds_ntb"] == False), "qc_flag"] = "OUT_OF_BOUNDS"
+    out.loc[(out["qc_flag"] == "OK") & (out["qc_dup_latlon"] == True), "qc_flag"] = "DUP_LATLON"
+
+    return out
+
+
+def encode_raw_rainfall(raw, dtype=np.float32) -> tuple:
+    """
+    Mengubah nilai mentah 'RAINFALL DAY MM' menjadi pasangan (nilai numerik, kode BMKG uint8)
+    mengikuti aturan tampilan BMKG: 9999/kosong -> NaN, 8888 -> 0.1, 0 -> 0.0.
+    Nilai yang dikembalikan mengasumsikan record ada (kode CODE_NO_ROW tidak pernah dihasilkan).
+    """
+    raw = np.asarray(pd.to_numeric(pd.Series(raw), errors="coerce"), dtype=np.float64)
+
+    is_missing = np.isnan(raw) | (raw == 9999)
+    is_trace = raw == 8888
+    is_zero = raw == 0
+
+    values = np.where(is_missing, np.nan, np.where(is_trace, 0.1, raw)).astype(dtype)
+
+    codes = np.full(raw.shape, CODE_MEASURED, dtype=np.uint8)
+    codes[is_zero] = CODE_ZERO
+    codes[is_trace] = CODE_TRACE
+    codes[is_missing] = CODE_MISSING
+    return values, codes
+
+
+def build_daily_matrix(df_long: pd.DataFrame, start=None, end=None) -> pd.DataFrame:
+    """
+    Pivot data long-format menjadi matriks numerik harian kontinu (index tanggal, kolom HORIZONTAL_COLS).
+    Hari tanpa record tetap muncul sebagai baris NaN sehingga posisi baris = offset hari.
+    """
+    if df_long is None or df_long.empty:
+        return pd.DataFrame(columns=HORIZONTAL_COLS, dtype=float)
+
+    if "DATE" in df_long.columns:
+        dates = pd.to_datetime(df_long["DATE"], errors="coerce")
+    else:
+        dates = pd.to_datetime(df_long["DATA TIMESTAMP"], errors="coerce").dt.normalize()
+
+    values, _ = encode_raw_rainfall(df_long["RAINFALL DAY MM"], dtype=np.float64)
+    tmp = pd.DataFrame({
+        "DATE": dates.values,
+        "NAME_H": map_station_name(df_long["NAME"]).values,
+        "rain_num": values,
+    }).dropna(subset=["DATE"])
+
+    wide = tmp.pivot_table(index="DATE", columns="NAME_H", values="rain_num", aggfunc="first")
+    start = pd.Timestamp(start) if start is not None else tmp["DATE"].min()
+    end = pd.Timestamp(end) if end is not None else tmp["DATE"].max()
+    full_idx = pd.date_range(start, end, freq="D")
+    return wide.reindex(index=full_idx, columns=HORIZONTAL_COLS)
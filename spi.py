@@ -0,0 +1,246 @@
+# spi.py
+#
+# Standardized Precipitation Index (SPI) per stasiun untuk skala 1/3/6 bulan.
+# Distribusi gamma (dengan probabilitas nol) di-fit per stasiun x bulan kalender secara vektor
+# (estimator MLE pendekatan Thom), lalu parameter disimpan di disk per periode dasar sehingga
+# update bulanan cukup mengevaluasi CDF tanpa fitting ulang.
+
+import os
+import warnings
+
+import numpy as np
+import pandas as pd
+
+from config import CACHE_DIR, SPI_BASE_PERIOD, SPI_SCALES
+
+DEFAULT_SPI_CACHE_DIR = os.path.join(CACHE_DIR, "spi")
+MIN_VALID_FRAC = 0.8     # minimal fraksi hari valid agar total bulanan dianggap sah
+MIN_FIT_SAMPLES = 10     # minimal jumlah tahun bernilai > 0 untuk fitting per bulan kalender
+
+# Batas kelas McKee: sisi basah inklusif (>= 1.0), sisi kering eksklusif (-1.0 sudah "Kering"),
+# sehingga nilai kontinu di antara -0.99 dan -1.0 tidak jatuh ke celah pembulatan
+SPI_CLASSES = [
+    (2.0, "Amat Basah"),
+    (1.5, "Sangat Basah"),
+    (1.0, "Basah"),
+    (-1.0, "Normal"),
+    (-1.5, "Kering"),
+    (-2.0, "Sangat Kering"),
+    (-np.inf, "Amat Kering"),
+]
+
+
+def monthly_totals(daily: pd.DataFrame, min_valid_frac: float = MIN_VALID_FRAC) -> pd.DataFrame:
+    """Total bulanan per stasiun dari matriks harian; NaN bila hari valid < min_valid_frac."""
+    daily = daily.sort_index()
+    totals = daily.resample("MS").sum(min_count=1)
+    n_valid = daily.notna().resample("MS").sum()
+    days_in_month = totals.index.days_in_month.to_numpy()[:, None]
+    return totals.where(n_valid.to_numpy() / days_in_month >= min_valid_frac)
+
+
+def effective_base_period(monthly: pd.DataFrame, base_period=SPI_BASE_PERIOD) -> tuple:
+    """Memotong periode dasar ke tahun kalender yang tercakup penuh oleh data bulanan."""
+    if monthly.empty:
+        return tuple(base_period)
+    return base_period_for_span(monthly.index.min(), monthly.index.max(), base_period)
+
+
+def base_period_for_span(first, last, base_period=SPI_BASE_PERIOD) -> tuple:
+    """Seperti effective_base_period, dari tanggal awal/akhir riwayat (tanpa membentuk data bulanan)."""
+    first, last = pd.Timestamp(first), pd.Timestamp(last)
+    first_full = first.year if first.month == 1 else first.year + 1
+    last_full = last.year if last.month == 12 else last.year - 1
+    return max(int(base_period[0]), first_full), min(int(base_period[1]), last_full)
+
+
+def fit_gamma_params(arr: np.ndarray, min_samples: int = MIN_FIT_SAMPLES) -> tuple:
+    """
+    Fit gamma bercampur-nol secara vektor. arr berbentuk [tahun, 12, stasiun] (NaN = tidak ada).
+    Return (alpha, beta, q) masing-masing [12, stasiun]; q = probabilitas nilai nol.
+    """
+    valid = np.isfinite(arr)
+    pos = valid & (arr > 0)
+    n_valid = valid.sum(axis=0)
+    n_pos = pos.sum(axis=0)
+
+    xp = np.where(pos, arr, np.nan)
+    with warnings.catch_warnings(), np.errstate(invalid="ignore", divide="ignore"):
+        warnings.simplefilter("ignore", category=RuntimeWarning)
+        mean = np.nanmean(xp, axis=0)
+        mean_log = np.nanmean(np.log(xp), axis=0)
+        a = np.log(mean) - mean_log
+        alpha = (1.0 + np.sqrt(1.0 + 4.0 * a / 3.0)) / (4.0 * a)
+        beta = mean / alpha
+        q = (n_valid - n_pos) / n_valid
+
+    ok = (n_pos >= min_samples) & (a > 0) & np.isfinite(alpha) & np.isfinite(beta)
+    return np.where(ok, alpha, np.nan), np.where(ok, beta, np.nan), np.where(ok, q, np.nan)
+
+
+def spi_from_params(x: np.ndarray, alpha: np.ndarray, beta: np.ndarray, q: np.ndarray) -> np.ndarray:
+    """Evaluasi SPI = Phi^-1(q + (1-q) * G(x; alpha, beta)) secara vektor."""
+    from scipy.special import gammainc, ndtri   # scipy baru dimuat saat SPI pertama dihitung
+
+    x = np.asarray(x, dtype=np.float64)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        g = np.where(x > 0, gammainc(alpha, np.where(x > 0, x, 0.0) / beta), 0.0)
+        h = q + (1.0 - q) * g
+    h = np.clip(h, 1e-6, 1.0 - 1e-6)
+    out = ndtri(h)
+    return np.where(np.isfinite(x) & np.isfinite(alpha), out, np.nan)
+
+
+def classify_spi(v) -> str:
+    if pd.isna(v):
+        return "-"
+    for lower, label in SPI_CLASSES:
+        if v >= lower if lower > 0 else v > lower:
+            return label
+    return SPI_CLASSES[-1][1]
+
+
+class SpiEngine:
+    """
+    Pengelola parameter gamma per skala untuk satu periode dasar.
+    File cache: <cache_dir>/gamma_<tahun0>-<tahun1>_s<skala>.npz berisi stations, alpha, beta, q.
+    """
+
+    def __init__(self, base_period=SPI_BASE_PERIOD, cache_dir: str = DEFAULT_SPI_CACHE_DIR):
+        self.base_period = tuple(int(y) for y in base_period)
+        self.cache_dir = cache_dir
+        self._params = {}
+
+    def _cache_path(self, scale: int) -> str:
+        b0, b1 = self.base_period
+        return os.path.join(self.cache_dir, f"gamma_{b0}-{b1}_s{int(scale)}.npz")
+
+    def _load(self, scale: int):
+        if scale in self._params:
+            return self._params[scale]
+        path = self._cache_path(scale)
+        if not os.path.exists(path):
+            return None
+        with np.load(path, allow_pickle=False) as z:
+            params = {
+                "stations": [str(s) for s in z["stations"]],
+                "alpha": z["alpha"], "beta": z["beta"], "q": z["q"],
+            }
+        self._params[scale] = params
+        return params
+
+    def _save(self, scale: int, params: dict):
+        os.makedirs(self.cache_dir, exist_ok=True)
+        path = self._cache_path(scale)
+        tmp = path + ".tmp.npz"
+        np.savez(tmp, stations=np.array(params["stations"]), alpha=params["alpha"], beta=params["beta"], q=params["q"])
+        os.replace(tmp, path)
+        self._params[scale] = params
+
+    def _base_array(self, acc: pd.DataFrame) -> np.ndarray:
+        """Susun nilai akumulasi periode dasar menjadi [tahun, 12, stasiun]."""
+        b0, b1 = self.base_period
+        base = acc[(acc.index.year >= b0) & (acc.index.year <= b1)]
+        arr = np.full((b1 - b0 + 1, 12, acc.shape[1]), np.nan)
+        arr[base.index.year - b0, base.index.month - 1, :] = base.to_numpy(dtype=np.float64)
+        return arr
+
+    def missing_stations(self, stations, scale: int) -> list:
+        """Stasiun yang parameternya untuk skala ini belum ada di cache (perlu fitting)."""
+        cached = self._load(scale)
+        known = set(cached["stations"]) if cached else set()
+        return [str(s) for s in stations if str(s) not in known]
+
+    def params_for(self, acc: pd.DataFrame, scale: int) -> dict:
+        """Parameter untuk seluruh kolom acc; stasiun yang belum ada di cache di-fit lalu disimpan."""
+        stations = [str(c) for c in acc.columns]
+        cached = self._load(scale)
+        known = set(cached["stations"]) if cached else set()
+        missing = [s for s in stations if s not in known]
+
+        if missing:
+            sub = acc[missing]
+            alpha, beta, q = fit_gamma_params(self._base_array(sub))
+            if cached:
+                cached = {
+                    "stations": cached["stations"] + missing,
+                    "alpha": np.hstack([cached["alpha"], alpha]),
+                    "beta": np.hstack([cached["beta"], beta]),
+                    "q": np.hstack([cached["q"], q]),
+                }
+            else:
+                cached = {"stations": missing, "alpha": alpha, "beta": beta, "q": q}
+            self._save(scale, cached)
+
+        pos = {s: i for i, s in enumerate(cached["stations"])}
+        idx = np.array([pos[s] for s in stations], dtype=np.intp)
+        return {"alpha": cached["alpha"][:, idx], "beta": cached["beta"][:, idx], "q": cached["q"][:, idx]}
+
+    def spi(self, monthly: pd.DataFrame, scale: int) -> pd.DataFrame:
+        """Deret SPI (index bulan, kolom stasiun) untuk satu skala."""
+        acc = monthly.rolling(int(scale), min_periods=int(scale)).sum()
+        p = self.params_for(acc, scale)
+        m = acc.index.month.to_numpy() - 1
+        vals = spi_from_params(acc.to_numpy(dtype=np.float64), p["alpha"][m], p["beta"][m], p["q"][m])
+        return pd.DataFrame(vals, index=acc.index, columns=acc.columns)
+
+
+def compute_spi_for_month(daily: pd.DataFrame, year: int, month: int, scales=SPI_SCALES,
+                          base_period=SPI_BASE_PERIOD, cache_dir: str = DEFAULT_SPI_CACHE_DIR,
+                          cube=None) -> pd.DataFrame:
+    """
+    SPI seluruh stasiun untuk bulan target pada tiap skala (kolom SPI_1, SPI_3, ...).
+    `daily` adalah matriks harian berindeks tanggal (mis. timeseries terbaru); `cube` (opsional)
+    memberi riwayat panjang di bawahnya (nilai `daily` menang). Hanya bulan hingga bulan target yang
+    dipakai, dan dari cube hanya potongan yang diperlukan yang dibaca: max(scales) bulan terakhir
+    untuk evaluasi, ditambah periode dasar bila ada stasiun yang parameternya belum di-cache.
+    """
+    target = pd.Timestamp(year=int(year), month=int(month), day=1)
+    target_end = target + pd.offsets.MonthBegin(1) - pd.Timedelta(days=1)
+    cols = daily.columns if cube is None else daily.columns.union(pd.Index(cube.stations))
+    out = pd.DataFrame({"station": [str(c) for c in cols]})
+
+    def _monthly(start, end) -> pd.DataFrame:
+        d = daily[(daily.index >= start) & (daily.index <= end)]
+        if cube is not None:
+            d = d.combine_first(cube.to_frame(start=start, end=end))
+        return monthly_totals(d.reindex(columns=cols))
+
+    def _nan():
+        for s in scales:
+            out[f"SPI_{s}"] = np.nan
+        return out
+
+    # Rentang riwayat (tanpa membaca data) menentukan periode dasar efektif & kunci cache parameter
+    firsts = [daily.index.min()] + ([pd.Timestamp(cube.start)] if cube is not None else [])
+    lasts = [daily.index.max()] + ([pd.Timestamp(cube.end)] if cube is not None else [])
+    firsts, lasts = [t for t in firsts if pd.notna(t)], [t for t in lasts if pd.notna(t)]
+    if not firsts:
+        return _nan()
+    first, last = min(firsts), min(max(lasts), target_end)
+
+    s_max = max(int(s) for s in scales)
+    monthly = _monthly(target - pd.DateOffset(months=s_max - 1), target_end)
+    if monthly.empty or target not in monthly.index:
+        return _nan()
+
+    b0, b1 = base_period_for_span(first.to_period("M").start_time, last.to_period("M").start_time, base_period)
+    if b1 - b0 + 1 < MIN_FIT_SAMPLES:
+        # Riwayat terlalu pendek untuk periode dasar yang sah (mis. cube belum dibangun)
+        return _nan()
+
+    engine = SpiEngine((b0, b1), cache_dir=cache_dir)
+    m = target.month - 1
+    base = None
+    for s in scales:
+        acc = monthly.rolling(int(s), min_periods=int(s)).sum()
+        if engine.missing_stations(acc.columns, s):
+            # Cache miss: stasiun baru di-fit dari deret periode dasar (dibaca sekali untuk semua skala)
+            if base is None:
+                base = _monthly(pd.Timestamp(year=b0, month=1, day=1) - pd.DateOffset(months=s_max - 1),
+                                pd.Timestamp(year=b1, month=12, day=31))
+            engine.params_for(base.rolling(int(s), min_periods=int(s)).sum(), s)
+        # Cache hit: hanya evaluasi CDF
+        p = engine.params_for(acc, s)
+        out[f"SPI_{s}"] = spi_from_params(acc.loc[target].to_numpy(dtype=np.float64), p["alpha"][m], p["beta"][m], p["q"][m])
+    return out
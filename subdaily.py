@@ -0,0 +1,151 @@
+# subdaily.py
+#
+# Ingest data ARG (automatic rain gauge) sub-harian, mis. akumulasi per 10 menit, tanpa Streamlit.
+# Format CSV sama dengan upload vertikal kecuali kolom nilai "RAINFALL MM" (curah hujan per interval).
+#
+# Setiap chunk diagregasi langsung ke hari pengamatan BMKG (batas 07:00 waktu setempat, lihat
+# config.OBS_DAY_CUTOFF_HOUR) dengan groupby vektor -> jumlah, maksimum interval, jumlah observasi
+# per (pos, hari), ditambah bitmap slot interval yang sudah terisi untuk membuang duplikat lintas
+# chunk/file. Hanya ringkasan ini yang disimpan, sehingga baris mentah (~144x volume data harian)
+# tidak pernah dimaterialisasi utuh. Hasil akhirnya record harian long-format
+# berkolom sama dengan upload vertikal (DATA TIMESTAMP = tanggal D jam 07:00) ditambah
+# kelengkapan per hari, siap digabung ke build_outputs.
+
+import numpy as np
+import pandas as pd
+
+from config import ARG_INTERVAL_MINUTES, ARG_MIN_COMPLETENESS_PCT, OBS_DAY_CUTOFF_HOUR
+from ingest import CHUNK_ROWS, stream_ingest
+
+ARG_VALUE_COL = "RAINFALL MM"
+ARG_REQUIRED_COLS = ["NAME", "DATA TIMESTAMP", ARG_VALUE_COL]
+DAILY_COLS = ["POS HUJAN ID", "NAME", "DATA TIMESTAMP", "RAINFALL DAY MM",
+              "RAINFALL SUM MM", "MAX INTERVAL MM", "n_obs", "n_dup", "completeness_pct"]
+
+
+def observation_day(ts: pd.Series, cutoff_hour: int = OBS_DAY_CUTOFF_HOUR) -> pd.Series:
+    """Timestamp akhir interval -> tanggal hari pengamatan: (D-1 07:00, D 07:00] -> D."""
+    return (ts - pd.Timedelta(hours=cutoff_hour)).dt.ceil("D")
+
+
+class SubDailyAggregator:
+    """
+    Sink streaming (write(chunk) / close()) untuk stream_ingest: agregasi harian per chunk.
+
+    Setiap observasi dipetakan ke slot interval di dalam hari pengamatannya; slot yang sudah terisi
+    dicatat sebagai bitmap (kata uint64) per (pos, hari), sehingga duplikat di dalam chunk, lintas
+    batas chunk, maupun dari ekspor ARG yang tumpang tindih dibuang (observasi pertama menang) dan
+    dihitung di n_dup, bukan dijumlahkan dua kali. Hanya ringkasan per (pos, hari) yang disimpan.
+    """
+
+    def __init__(self, interval_minutes: int = ARG_INTERVAL_MINUTES,
+                 min_completeness: float = ARG_MIN_COMPLETENESS_PCT, cutoff_hour: int = OBS_DAY_CUTOFF_HOUR):
+        self.interval = pd.Timedelta(minutes=interval_minutes)
+        self.expected = 24 * 60 / float(interval_minutes)
+        self.n_slots = int(np.ceil(self.expected))
+        self.mask_cols = [f"m{k}" for k in range((self.n_slots + 63) // 64)]
+        self.min_completeness = float(min_completeness)
+        self.cutoff_hour = int(cutoff_hour)
+        self.state = None
+        self._file_state = None
+
+    # Hook per file untuk stream_ingest: file yang gagal di tengah dibuang utuh
+    def begin_file(self):
+        self._file_state = self.state
+
+    def commit_file(self):
+        self._file_state = self.state
+
+    def rollback_file(self):
+        self.state = self._file_state
+
+    def write(self, chunk: pd.DataFrame):
+        ts = chunk["DATA TIMESTAMP"]
+        keep = ts.notna().to_numpy()
+        if not keep.any():
+            return
+        c = chunk.loc[keep]
+        ts = c["DATA TIMESTAMP"]
+        day = observation_day(ts, self.cutoff_hour)
+        offset = (ts - (day - pd.Timedelta(days=1) + pd.Timedelta(hours=self.cutoff_hour))) / self.interval
+        slot = np.clip(np.ceil(offset.to_numpy(dtype=np.float64)).astype(np.int64) - 1, 0, self.n_slots - 1)
+        v = pd.to_numeric(c[ARG_VALUE_COL], errors="coerce").to_numpy(dtype=np.float64)
+        rows = pd.DataFrame({
+            "NAME": c["NAME"].to_numpy(),
+            "DAY": day.to_numpy(),
+            "slot": slot,
+            "pos": c["POS HUJAN ID"].to_numpy() if "POS HUJAN ID" in c.columns else None,
+        })
+
+        # Duplikat: slot berulang di chunk ini, atau slot yang sudah terisi dari chunk/file sebelumnya
+        word = slot // 64
+        bit = np.left_shift(np.uint64(1), (slot % 64).astype(np.uint64))
+        dup = rows.duplicated(["NAME", "DAY", "slot"]).to_numpy().copy()
+        if self.state is not None:
+            at = self.state.index.get_indexer(pd.MultiIndex.from_arrays([rows["NAME"], rows["DAY"]]))
+            masks = self.state[self.mask_cols].to_numpy(dtype=np.uint64)
+            seen = masks[np.maximum(at, 0), word] & bit
+            dup |= (at >= 0) & (seen != 0)
+
+        rows["v"] = np.where(dup, np.nan, v)
+        rows["obs"] = ~dup & np.isfinite(v)
+        rows["dup"] = dup
+        for k, col in enumerate(self.mask_cols):
+            rows[col] = np.where(~dup & (word == k), bit, np.uint64(0))
+        part = rows.groupby(["NAME", "DAY"], sort=False).agg(
+            pos=("pos", "first"), sum_mm=("v", "sum"), max_mm=("v", "max"), n_obs=("obs", "sum"),
+            n_dup=("dup", "sum"), **{col: (col, "sum") for col in self.mask_cols}
+        )
+        self.state = part if self.state is None else self._merge(self.state, part)
+
+    def _merge(self, old: pd.DataFrame, new: pd.DataFrame) -> pd.DataFrame:
+        """Menggabungkan ringkasan (pos, hari); bitmap slot saling lepas sehingga OR = jumlah."""
+        both = pd.concat([old, new])
+        return both.groupby(level=["NAME", "DAY"], sort=False).agg(
+            pos=("pos", "first"), sum_mm=("sum_mm", "sum"), max_mm=("max_mm", "max"), n_obs=("n_obs", "sum"),
+            n_dup=("n_dup", "sum"), **{col: (col, "sum") for col in self.mask_cols}
+        )
+
+    def close(self) -> pd.DataFrame:
+        """Record harian long-format (DAILY_COLS), atau None bila tidak ada observasi valid."""
+        if self.state is None:
+            return None
+        agg = self.state.reset_index().sort_values(["NAME", "DAY"], kind="stable").reset_index(drop=True)
+        # Satu observasi per slot: n_obs tidak pernah melebihi jumlah slot, kelebihan terlihat di n_dup
+        completeness = 100.0 * agg["n_obs"].to_numpy(dtype=np.float64) / self.expected
+        total = agg["sum_mm"].to_numpy(dtype=np.float64)
+        return pd.DataFrame({
+            "POS HUJAN ID": agg["pos"],
+            "NAME": agg["NAME"],
+            "DATA TIMESTAMP": agg["DAY"] + pd.Timedelta(hours=self.cutoff_hour),
+            "RAINFALL DAY MM": np.where(completeness >= self.min_completeness, np.round(total, 1), np.nan),
+            "RAINFALL SUM MM": np.round(total, 1),
+            "MAX INTERVAL MM": agg["max_mm"],
+            "n_obs": agg["n_obs"].astype(int),
+            "n_dup": agg["n_dup"].astype(int),
+            "completeness_pct": np.round(completeness, 1),
+        })[DAILY_COLS]
+
+
+def stream_subdaily(files, chunksize: int = CHUNK_ROWS, on_progress=None,
+                    interval_minutes: int = ARG_INTERVAL_MINUTES) -> tuple:
+    """Upload ARG -> (record harian atau None, laporan per file seperti stream_ingest)."""
+    agg = SubDailyAggregator(interval_minutes=interval_minutes)
+    report = stream_ingest(files, [agg], chunksize=chunksize, on_progress=on_progress, required=ARG_REQUIRED_COLS)
+    return agg.close(), report
+
+
+def completeness_summary(daily: pd.DataFrame, min_completeness: float = ARG_MIN_COMPLETENESS_PCT) -> pd.DataFrame:
+    """
+    Ringkasan per pos: jumlah hari, rata-rata kelengkapan, hari di bawah ambang (tanpa nilai harian),
+    dan observasi duplikat yang dibuang (ekspor tumpang tindih / interval tidak sesuai konfigurasi).
+    """
+    if daily is None or daily.empty:
+        return pd.DataFrame(columns=["NAME", "n_hari", "completeness_mean_pct", "n_hari_tidak_lengkap", "n_obs_duplikat"])
+    g = daily.assign(incomplete=daily["completeness_pct"] < min_completeness).groupby("NAME")
+    return pd.DataFrame({
+        "n_hari": g.size(),
+        "completeness_mean_pct": g["completeness_pct"].mean().round(1),
+        "n_hari_tidak_lengkap": g["incomplete"].sum().astype(int),
+        "n_obs_duplikat": g["n_dup"].sum().astype(int),
+    }).reset_index()
@@ -0,0 +1,126 @@
+# surface.py
+#
+# Permukaan curah hujan grid (IDW) untuk layer peta. Bobot stasiun -> sel grid (k donor
+# terdekat per sel) dihitung sekali per set koordinat; setiap ganti metrik / window cukup
+# satu gather-jumlah berbobot [sel, k] + lookup colormap, lalu dikodekan ke PNG (zlib, tanpa
+# dependensi gambar) untuk BitmapLayer pydeck.
+
+import base64
+import struct
+import zlib
+
+import numpy as np
+import pandas as pd
+
+from qc_spatial import EARTH_RADIUS_KM
+
+# Batas grid NTB (lon_min, lat_min, lon_max, lat_max) dan resolusi (derajat, ~1.1 km)
+NTB_BOUNDS = (115.75, -9.15, 119.40, -7.95)
+GRID_RES_DEG = 0.01
+GRID_K = 8
+GRID_POWER = 2.0
+GRID_RADIUS_KM = 25.0     # sel tanpa stasiun dalam radius ini transparan
+
+
+def build_grid_weights(coords: pd.DataFrame, bounds=NTB_BOUNDS, res_deg: float = GRID_RES_DEG,
+                       k: int = GRID_K, power: float = GRID_POWER, radius_km: float = GRID_RADIUS_KM) -> dict:
+    """
+    Bobot IDW stasiun -> grid dari hasil prepare_station_coordinates (urutan HORIZONTAL_COLS).
+    Baris grid berurutan utara -> selatan (baris 0 = lintang maksimum) sesuai orientasi gambar.
+    Return dict: stations, idx [sel, k] int32 (-1 = kosong), w [sel, k] float32, shape (ny, nx), bounds.
+    """
+    lon0, lat0, lon1, lat1 = bounds
+    lons = np.arange(lon0 + res_deg / 2, lon1, res_deg)
+    lats = np.arange(lat1 - res_deg / 2, lat0, -res_deg)
+    ny, nx = len(lats), len(lons)
+
+    st_lat = np.radians(pd.to_numeric(coords["lat"], errors="coerce").to_numpy(dtype=np.float64))
+    st_lon = np.radians(pd.to_numeric(coords["lon"], errors="coerce").to_numpy(dtype=np.float64))
+    g_lat = np.radians(np.repeat(lats, nx))
+    g_lon = np.radians(np.tile(lons, ny))
+
+    a = (np.sin((g_lat[:, None] - st_lat[None, :]) / 2) ** 2
+         + np.cos(g_lat[:, None]) * np.cos(st_lat[None, :]) * np.sin((g_lon[:, None] - st_lon[None, :]) / 2) ** 2)
+    dist = 2 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(np.clip(a, 0.0, 1.0)))
+    dist = np.where(np.isfinite(dist) & (dist <= radius_km), dist, np.inf)
+
+    k = min(int(k), dist.shape[1])
+    order = np.argpartition(dist, k - 1, axis=1)[:, :k]
+    d = np.take_along_axis(dist, order, axis=1)
+    ok = np.isfinite(d)
+    w = np.where(ok, 1.0 / np.maximum(d, 0.1) ** power, 0.0)
+
+    return {
+        "stations": coords["station"].astype(str).tolist(),
+        "idx": np.where(ok, order, -1).astype(np.int32),
+        "w": w.astype(np.float32),
+        "shape": (ny, nx),
+        "bounds": (float(lon0), float(lat1 - ny * res_deg), float(lon0 + nx * res_deg), float(lat1)),
+    }
+
+
+def interpolate_grid(values, grid: dict) -> np.ndarray:
+    """Nilai stasiun (urutan grid['stations']) -> grid [ny, nx]; NaN bila tidak ada donor bernilai."""
+    v = np.asarray(values, dtype=np.float64)
+    idx, w = grid["idx"], grid["w"]
+    nb = v[np.where(idx >= 0, idx, 0)]
+    have = (idx >= 0) & np.isfinite(nb)
+    wv = np.where(have, w, 0.0)
+    den = wv.sum(axis=1)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        out = np.where(den > 0, (wv * np.where(have, nb, 0.0)).sum(axis=1) / den, np.nan)
+    return out.reshape(grid["shape"])
+
+
+def colormap_lut(n: int = 256, alpha: int = 190) -> np.ndarray:
+    """LUT RGBA uint8 [n, 4] gradasi biru -> merah (sama dengan warna titik peta)."""
+    t = np.linspace(0.0, 1.0, n)
+    lut = np.empty((n, 4), dtype=np.uint8)
+    lut[:, 0] = (60 + 180 * t).astype(np.uint8)
+    lut[:, 1] = (80 + 60 * (1 - t)).astype(np.uint8)
+    lut[:, 2] = (220 - 180 * t).astype(np.uint8)
+    lut[:, 3] = alpha
+    return lut
+
+
+def apply_colormap(values, vmin: float, vmax: float, lut: np.ndarray, nan_rgba=(0, 0, 0, 0)) -> np.ndarray:
+    """Nilai -> RGBA uint8 lewat indeks LUT (tanpa loop Python)."""
+    v = np.asarray(values, dtype=np.float64)
+    span = (vmax - vmin) if (np.isfinite(vmax) and np.isfinite(vmin) and vmax > vmin) else np.nan
+    with np.errstate(invalid="ignore"):
+        t = np.clip((v - vmin) / span, 0.0, 1.0)
+    ok = np.isfinite(t)
+    pos = np.where(ok, np.round(t * (len(lut) - 1)), 0).astype(np.intp)
+    rgba = lut[pos]
+    rgba[~ok] = nan_rgba
+    return rgba
+
+
+def encode_png(rgba: np.ndarray) -> bytes:
+    """Encoder PNG RGBA 8-bit minimal (filter 0 per baris, zlib)."""
+    rgba = np.ascontiguousarray(rgba, dtype=np.uint8)
+    h, w = rgba.shape[:2]
+    raw = np.hstack([np.zeros((h, 1), dtype=np.uint8), rgba.reshape(h, w * 4)]).tobytes()
+
+    def chunk(tag: bytes, data: bytes) -> bytes:
+        return struct.pack(">I", len(data)) + tag + data + struct.pack(">I", zlib.crc32(tag + data) & 0xFFFFFFFF)
+
+    return (
+        b"\x89PNG\r\n\x1a\n"
+        + chunk(b"IHDR", struct.pack(">IIBBBBB", w, h, 8, 6, 0, 0, 0))
+        + chunk(b"IDAT", zlib.compress(raw, 6))
+        + chunk(b"IEND", b"")
+    )
+
+
+def surface_image(values, grid: dict, vmin: float = None, vmax: float = None, lut: np.ndarray = None) -> str:
+    """Data URI PNG permukaan IDW untuk BitmapLayer (image) dengan bounds grid['bounds']."""
+    surf = interpolate_grid(values, grid)
+    v = np.asarray(values, dtype=np.float64)
+    finite = v[np.isfinite(v)]
+    if vmin is None:
+        vmin = float(finite.min()) if finite.size else np.nan
+    if vmax is None:
+        vmax = float(finite.max()) if finite.size else np.nan
+    rgba = apply_colormap(surf, vmin, vmax, lut if lut is not None else colormap_lut())
+    return "data:image/png;base64," + base64.b64encode(encode_png(rgba)).decode("ascii")